@@ -0,0 +1,119 @@
+import math
+import time
+
+"""
+Sends commands for every CAN bus of the Pi3Hat in one transport cycle, and keeps per-bus statistics.
+
+The transport hands back the replies of every bus together, so the only latency measured here is that
+of the whole cycle. The round-trip time of each bus alone is measured by measure_bus_latency() in
+Swerve/Diagnostics.py (python swerve_diag.py latency).
+
+The Pi3Hat talks to all of its buses at the same time within a single cycle() call, so
+putting the commands for every bus in one cycle makes a fan-out (like stopping all eight
+motors) take one bus time instead of one per motor.
+"""
+class BusDispatcher:
+    def __init__(self, transport, servo_bus_map: dict, frame_time: float = 0.0002, history: int = 256):
+        """
+        Constructs a bus dispatcher.
+
+        :param transport (moteus.Transport): The transport to send the commands through.
+        :param servo_bus_map (dict): Bus number to list of servo ids, the same as for Pi3HatRouter.
+        :param frame_time (float): Estimated time one command frame and its reply occupy a bus, in seconds. Only used for the utilization estimate.
+        :param history (int): How many cycle latencies to keep.
+        """
+        self.transport = transport
+        self.frame_time = frame_time
+        self.history = history
+        self.bus_of = {
+            servo_id: bus
+            for bus, servo_ids in servo_bus_map.items()
+            for servo_id in servo_ids
+        }
+        self.buses = sorted(servo_bus_map)
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """
+        Clears all per-bus statistics.
+        """
+        self.start_time = time.monotonic()
+        self.cycles = 0
+        self.frames = {bus: 0 for bus in self.buses}
+        self.bytes = {bus: 0 for bus in self.buses}
+        self.replies = {bus: 0 for bus in self.buses}
+        self._latencies = [0.0] * self.history
+        self._latency_index = 0
+        self._latency_count = 0
+
+    def group_by_bus(self, commands) -> dict:
+        """
+        Groups commands by the bus their destination servo is on.
+
+        :param commands (list): moteus.Command objects.
+
+        :return dict: Bus number to the list of commands for that bus. Commands for unknown servos go under bus None.
+        """
+        groups = {}
+        for command in commands:
+            groups.setdefault(self.bus_of.get(command.destination), []).append(command)
+        return groups
+
+    async def cycle(self, commands, **kwargs):
+        """
+        Sends the commands for every bus in a single transport cycle.
+
+        :param commands (list): moteus.Command objects, for any mix of buses.
+        :param kwargs: Passed on to transport.cycle() (request_attitude, ...).
+
+        :return list: The results of the cycle.
+        """
+        frames = self.frames
+        command_bytes = self.bytes
+        for command in commands:
+            bus = self.bus_of.get(command.destination)
+            if bus is not None:
+                frames[bus] += 1
+                command_bytes[bus] += len(command.data)
+
+        start = time.perf_counter()
+        results = await self.transport.cycle(commands, **kwargs)
+        latency = time.perf_counter() - start
+
+        self.cycles += 1
+        self._latencies[self._latency_index] = latency
+        self._latency_index = (self._latency_index + 1) % self.history
+        if self._latency_count < self.history:
+            self._latency_count += 1
+
+        for result in results:
+            bus = self.bus_of.get(result.id)
+            if bus is not None:
+                self.replies[bus] += 1
+
+        return results
+
+    def stats(self) -> dict:
+        """
+        Gives per-bus statistics since the last reset_stats().
+
+        :return dict: Bus number to its frame, command byte and reply counts and estimated utilization (0 to 1), and under
+            "cycle" the number of cycles and the latency percentiles of a whole cycle (every bus together) in seconds.
+        """
+        elapsed = max(time.monotonic() - self.start_time, 1e-9)
+        stats = {}
+        for bus in self.buses:
+            stats[bus] = {
+                "frames": self.frames[bus],
+                "bytes": self.bytes[bus],
+                "replies": self.replies[bus],
+                "utilization": self.frames[bus] * self.frame_time / elapsed,
+            }
+        latencies = sorted(self._latencies[:self._latency_count])
+        stats["cycle"] = {
+            "cycles": self.cycles,
+            "latency_p50": latencies[len(latencies) // 2] if latencies else math.nan,
+            "latency_p99": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] if latencies else math.nan,
+            "latency_max": latencies[-1] if latencies else math.nan,
+        }
+        return stats
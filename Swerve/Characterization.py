@@ -0,0 +1,313 @@
+import asyncio
+import math
+from collections import namedtuple
+import numpy as np
+import Utils.Constants as Constants
+
+"""
+Drivetrain characterization: scripted sweeps of every servo at once, and offline fits of the
+motor and chassis models that tune the limits and gains of a robot profile.
+
+A sweep program runs quasistatic sweeps (a slow velocity ramp up and back down, so torque is
+mostly friction and drag) and dynamic sweeps (a velocity step with the limits lifted, so torque is
+mostly acceleration), first on the four drive motors with the modules pointing forward, then on the
+four steer motors with the wheels held. Every tick sends all eight commands in one batched cycle
+with query replies, and the replies go into preallocated arrays of a SweepLog.
+
+fit_sweeps() then fits torque = kS * sign(v) + kV * v + kA * a for all eight motors at once, as
+one batch of least squares problems, and takes the top speed and acceleration each motor reached.
+tuned_profile() turns that into motor limits, a watchdog timeout, drive feedforward gains and
+chassis limits.
+
+Example usage:
+    log = await run_sweeps(swerve_drive)  # the robot drives about 3 m forward and back
+    log.save("sweeps/practice.npz")
+    fit = fit_sweeps(SweepLog.load("sweeps/practice.npz"))
+    profile = tuned_profile(swerve_drive.profile, fit)
+"""
+
+# One step of a sweep program. motors is "drive", "steer" or "rest", kind is "quasistatic", "dynamic" or "rest",
+# and velocity is the top of the ramp or the height of the step, signed.
+Sweep = namedtuple("Sweep", ["name", "motors", "kind", "velocity", "duration"])
+
+def _velocity(sweep: Sweep, t: float, ramp_rate: float) -> float:
+    # The commanded velocity t seconds into a sweep.
+    if sweep.kind == "quasistatic":
+        # Up to the top at ramp_rate and back down, so the robot ends at rest.
+        return math.copysign(min(ramp_rate * t, ramp_rate * (sweep.duration - t), abs(sweep.velocity)), sweep.velocity)
+    if sweep.kind == "dynamic":
+        return sweep.velocity if t < Constants.SWEEP_STEP_DURATION else 0.0
+    return 0.0
+
+
+def default_program() -> list:
+    """
+    Gives the default sweep program: quasistatic and dynamic sweeps both ways, of the drive and then of the steer motors.
+    """
+    program = []
+    for motors, ramp_rate, top, step in (
+            ("drive", Constants.SWEEP_DRIVE_RAMP_RATE, Constants.SWEEP_DRIVE_MAX_VELOCITY, Constants.SWEEP_DRIVE_STEP_VELOCITY),
+            ("steer", Constants.SWEEP_STEER_RAMP_RATE, Constants.SWEEP_STEER_MAX_VELOCITY, Constants.SWEEP_STEER_STEP_VELOCITY)):
+        for sign, direction in ((1.0, "forward"), (-1.0, "backward")):
+            program.append(Sweep("rest", "rest", "rest", 0.0, Constants.SWEEP_REST_DURATION))
+            program.append(Sweep(f"{motors} quasistatic {direction}", motors, "quasistatic", sign * top, 2.0 * top / ramp_rate))
+        for sign, direction in ((1.0, "forward"), (-1.0, "backward")):
+            program.append(Sweep("rest", "rest", "rest", 0.0, Constants.SWEEP_REST_DURATION))
+            # Held for SWEEP_STEP_DURATION, then commanded back to 0, so the stop is in the log too.
+            program.append(Sweep(f"{motors} dynamic {direction}", motors, "dynamic", sign * step, 2.0 * Constants.SWEEP_STEP_DURATION))
+    program.append(Sweep("rest", "rest", "rest", 0.0, Constants.SWEEP_REST_DURATION))
+    return program
+
+
+class SweepLog:
+    """
+    The telemetry of a sweep program, one row per tick, in preallocated arrays.
+
+    Motor columns are the drive then the steer motor of each module, the same order as a telemetry file.
+    """
+
+    def __init__(self, capacity: int, motor_ids: list, program: list):
+        """
+        :param capacity (int): How many ticks the log holds.
+        :param motor_ids (list): The id of every motor column.
+        :param program (list): The Sweeps that were run, sweep[i] of a row is an index into it.
+        """
+        self.motor_ids = list(motor_ids)
+        self.program = list(program)
+        self.count = 0
+        motors = len(self.motor_ids)
+        self.time = np.zeros(capacity)
+        self.sweep = np.zeros(capacity, dtype=np.int16)
+        self.command = np.full((capacity, motors), np.nan)  # commanded velocity, rev/s
+        self.position = np.full((capacity, motors), np.nan)  # revolutions
+        self.velocity = np.full((capacity, motors), np.nan)  # rev/s
+        self.torque = np.full((capacity, motors), np.nan)  # Nm
+        self.fault = np.zeros((capacity, motors), dtype=np.uint8)
+
+    def record(self, sweep_index: int, now: float, motors: list, commands: list) -> None:
+        """
+        Records one tick: the commanded velocity and the telemetry snapshot of every motor.
+        """
+        row = self.count
+        self.time[row] = now
+        self.sweep[row] = sweep_index
+        for column, (motor, command) in enumerate(zip(motors, commands)):
+            snapshot = motor.snapshot
+            self.command[row, column] = command
+            self.position[row, column] = snapshot.position
+            self.velocity[row, column] = snapshot.velocity
+            self.torque[row, column] = snapshot.torque
+            self.fault[row, column] = snapshot.fault
+        self.count += 1
+
+    def is_drive(self) -> np.ndarray:
+        """
+        Gives which motor columns are drive motors.
+        """
+        return np.arange(len(self.motor_ids)) % 2 == 0
+
+    def mask(self, kind: str = None) -> np.ndarray:
+        """
+        Gives which samples (rows x motor columns) come from a sweep of that motor, and of that kind if given.
+        """
+        motors = np.array([sweep.motors for sweep in self.program])[self.sweep[:self.count]]
+        kinds = np.array([sweep.kind for sweep in self.program])[self.sweep[:self.count]]
+        is_drive = self.is_drive()
+        swept = np.where(is_drive[None, :], (motors == "drive")[:, None], (motors == "steer")[:, None])
+        if kind is not None:
+            swept &= (kinds == kind)[:, None]
+        return swept & (self.fault[:self.count] == 0)
+
+    def save(self, path: str) -> None:
+        """
+        Saves the log to a .npz file.
+        """
+        n = self.count
+        np.savez_compressed(
+            path, motor_ids=np.array(self.motor_ids), time=self.time[:n], sweep=self.sweep[:n], command=self.command[:n],
+            position=self.position[:n], velocity=self.velocity[:n], torque=self.torque[:n], fault=self.fault[:n],
+            program=np.array([tuple(str(value) for value in sweep) for sweep in self.program]))
+
+    @classmethod
+    def load(cls, path: str) -> "SweepLog":
+        """
+        Loads a log saved by save().
+        """
+        with np.load(path) as data:
+            program = [Sweep(name, motors, kind, float(velocity), float(duration))
+                       for name, motors, kind, velocity, duration in data["program"]]
+            log = cls(len(data["time"]), data["motor_ids"].tolist(), program)
+            for name in ("time", "sweep", "command", "position", "velocity", "torque", "fault"):
+                getattr(log, name)[:] = data[name]
+        log.count = len(log.time)
+        return log
+
+
+def _sweep_command(motor, position: float, velocity: float):
+    # A position mode command with the moteus limits lifted, so the sweep finds what the motor can do.
+    # Built directly, without command suppression: every tick must carry a command and a query.
+    return motor.motor.make_position(position=position, velocity=velocity, accel_limit=math.nan, velocity_limit=math.nan,
+                                     watchdog_timeout=motor.watchdog_timeout, query=True)
+
+
+async def run_sweeps(swerve_drive, program: list = None, rate_hz: float = Constants.LOOP_RATE_HZ, sleep=asyncio.sleep) -> SweepLog:
+    """
+    Runs a sweep program on every servo of a drive at once, and records the telemetry of every tick.
+
+    The drive sweeps move the robot: with the default program about 3 m forward and back again.
+
+    :param swerve_drive (SwerveDrive): An initialized drive.
+    :param program (list): The Sweeps to run. default_program() if not given.
+    :param rate_hz (float): The tick rate, in Hz.
+    :param sleep (coroutine function): Waits a number of seconds. Replace it to run against a simulated clock faster than real time.
+
+    :return SweepLog: The recorded telemetry.
+    """
+    program = default_program() if program is None else program
+    period = 1.0 / rate_hz
+    ticks = [int(math.ceil(sweep.duration / period)) for sweep in program]
+    modules = swerve_drive.modules
+    motors = [motor for module in modules for motor in (module.drive, module.steer)]
+    log = SweepLog(sum(ticks), [motor.motor.id for motor in motors], program)
+    ramp_rates = {"drive": Constants.SWEEP_DRIVE_RAMP_RATE, "steer": Constants.SWEEP_STEER_RAMP_RATE, "rest": 0.0}
+
+    steer_targets = None
+    next_time = swerve_drive.clock()
+    try:
+        for sweep_index, (sweep, count) in enumerate(zip(program, ticks)):
+            if sweep.motors != "steer" or steer_targets is None:
+                # Point every wheel forward, from wherever the steer sweeps left it.
+                for module in modules:
+                    module.steer_controller.reset_target()
+                steer_targets = [module.steer_controller.target_for(0.0) for module in modules]
+
+            for tick in range(count):
+                velocity = _velocity(sweep, tick * period, ramp_rates[sweep.motors])
+                commands = []
+                command_velocities = []
+                for module, steer_target in zip(modules, steer_targets):
+                    if sweep.motors == "steer":
+                        commands.append(_sweep_command(module.steer, math.nan, velocity))
+                        commands.append(_sweep_command(module.drive, math.nan, 0.0))
+                        command_velocities.extend((0.0, velocity))
+                    else:
+                        drive_velocity = velocity if sweep.motors == "drive" else 0.0
+                        commands.append(_sweep_command(module.steer, steer_target, 0.0))
+                        commands.append(_sweep_command(module.drive, math.nan, drive_velocity))
+                        command_velocities.extend((drive_velocity, 0.0))
+
+                await swerve_drive.cycle(commands)
+                log.record(sweep_index, swerve_drive.clock(), motors, command_velocities)
+
+                next_time += period
+                await sleep(max(0.0, next_time - swerve_drive.clock()))
+    finally:
+        for motor in motors:
+            motor.invalidate_command_cache()
+        await swerve_drive.stop()
+    return log
+
+
+def fit_sweeps(log: SweepLog) -> dict:
+    """
+    Fits the model of every motor from a sweep log, all motors at once.
+
+    :param log (SweepLog): The sweeps, from run_sweeps() or SweepLog.load().
+
+    :return dict: "motors", motor id to {"ks", "kv", "ka", "max_velocity", "max_accel", "saturated", "samples"}, and
+        "period", the 99th percentile tick period in seconds. saturated is whether the motor fell behind the quasistatic
+        ramp, so max_velocity is its top speed rather than the top of the ramp.
+    """
+    n = log.count
+    time = log.time[:n]
+    velocity = log.velocity[:n]
+    torque = log.torque[:n]
+    command = log.command[:n]
+    swept = log.mask() & np.isfinite(velocity) & np.isfinite(torque)
+
+    # Ticks whose reply did not change the timestamp would divide by zero, so differentiate over the tick times.
+    accel = np.gradient(np.nan_to_num(velocity), time, axis=0)
+
+    # One least squares problem per motor, solved together through the normal equations.
+    features = np.stack((np.sign(velocity), velocity, accel), axis=-1)  # ticks x motors x 3
+    features = np.where(swept[..., None], np.nan_to_num(features), 0.0)
+    targets = np.where(swept, np.nan_to_num(torque), 0.0)
+    normal = np.einsum("tmi,tmj->mij", features, features) + 1e-9 * np.eye(3)
+    moments = np.einsum("tmi,tm->mi", features, targets)
+    gains = np.linalg.solve(normal, moments[..., None])[..., 0]  # motors x 3
+
+    quasistatic = log.mask("quasistatic") & np.isfinite(velocity)
+    dynamic = log.mask("dynamic") & np.isfinite(velocity)
+    speed = np.where(quasistatic, np.abs(np.nan_to_num(velocity)), 0.0)
+    # Only samples where the ramp asked for more than the motor gave count towards saturation.
+    behind = quasistatic & (np.abs(np.nan_to_num(velocity)) < Constants.SWEEP_SATURATION * np.abs(np.nan_to_num(command)))
+    behind &= np.abs(np.nan_to_num(command)) >= 0.5 * np.max(np.where(quasistatic, np.abs(np.nan_to_num(command)), 0.0), axis=0)
+
+    periods = np.diff(time)
+    fit = {"period": float(np.percentile(periods, 99)) if len(periods) else Constants.LOOP_PERIOD, "motors": {}}
+    for column, motor_id in enumerate(log.motor_ids):
+        ks, kv, ka = (float(value) for value in gains[column])
+        fit["motors"][motor_id] = {
+            "ks": ks,
+            "kv": kv,
+            "ka": ka,
+            "max_velocity": float(np.percentile(speed[quasistatic[:, column], column], 99)) if quasistatic[:, column].any() else math.nan,
+            "max_accel": float(np.percentile(np.abs(accel[dynamic[:, column], column]), 99)) if dynamic[:, column].any() else math.nan,
+            "saturated": bool(np.count_nonzero(behind[:, column]) > 0.1 * max(1, np.count_nonzero(quasistatic[:, column]))),
+            "samples": int(np.count_nonzero(swept[:, column])),
+        }
+    return fit
+
+
+def tuned_profile(profile, fit: dict, margin: float = Constants.TUNING_MARGIN):
+    """
+    Gives a copy of a robot profile with the limits and gains from a fit.
+
+    - accel_limit and steer_accel_limit: margin times the lowest acceleration any drive (steer) motor reached in the dynamic sweeps.
+    - velocity_limit and steer_velocity_limit: margin times the lowest top speed, only if the motors saturated during
+      the quasistatic sweeps. A sweep that never reached the top speed says nothing about it, so the limit is kept.
+    - watchdog_timeout: TUNING_WATCHDOG_PERIODS times the 99th percentile tick period.
+    - drive_ks, drive_kv and drive_ka: the mean over the drive motors.
+    - max_speed, chassis_accel_limit and chassis_angular_accel_limit: from the fitted drive limits and the module positions.
+
+    :param profile (RobotProfile): The profile the sweeps were run with.
+    :param fit (dict): The result of fit_sweeps().
+    :param margin (float): The fraction of what the motors reached to use as a limit.
+
+    :return RobotProfile: The tuned profile. The profile given is not changed.
+    """
+    from Utils.RobotProfile import RobotProfile
+
+    data = profile.to_dict()
+    limits = data["limits"]
+    motors = fit["motors"]
+    drive_fits = [motors[module.drive_id] for module in profile.modules if module.drive_id in motors]
+    steer_fits = [motors[module.steer_id] for module in profile.modules if module.steer_id in motors]
+
+    fitted = set()
+    for fits, accel_key, velocity_key in ((drive_fits, "accel_limit", "velocity_limit"),
+                                          (steer_fits, "steer_accel_limit", "steer_velocity_limit")):
+        accels = [motor["max_accel"] for motor in fits if math.isfinite(motor["max_accel"])]
+        if accels:
+            limits[accel_key] = margin * min(accels)
+            fitted.add(accel_key)
+        if fits and all(motor["saturated"] for motor in fits):
+            limits[velocity_key] = margin * min(motor["max_velocity"] for motor in fits)
+            fitted.add(velocity_key)
+
+    limits["watchdog_timeout"] = max(Constants.TUNING_MIN_WATCHDOG, Constants.TUNING_WATCHDOG_PERIODS * fit["period"])
+
+    if drive_fits:
+        data["gains"]["drive_ks"] = max(0.0, float(np.mean([motor["ks"] for motor in drive_fits])))
+        data["gains"]["drive_kv"] = max(0.0, float(np.mean([motor["kv"] for motor in drive_fits])))
+        data["gains"]["drive_ka"] = max(0.0, float(np.mean([motor["ka"] for motor in drive_fits])))
+
+    # The chassis can go as fast and accelerate as hard as its wheels.
+    if "velocity_limit" in fitted:
+        data["drivetrain"]["max_speed"] = limits["velocity_limit"] * profile.meters_per_drive_rev
+    if "accel_limit" in fitted:
+        limits["chassis_accel_limit"] = limits["accel_limit"] * profile.meters_per_drive_rev
+        radius = max(math.hypot(module.x, module.y) for module in profile.modules)
+        limits["chassis_angular_accel_limit"] = limits["chassis_accel_limit"] / radius
+
+    return RobotProfile.from_dict(data, source=profile.source)
@@ -0,0 +1,284 @@
+import asyncio
+import math
+import time
+import Utils.Constants as Constants
+
+"""
+Pit diagnostics of a swerve drive: a live view of every servo, per-module health checks and
+per-bus round-trip latency, all through the same SwerveDrive and SwerveMotor code the robot drives with.
+
+Every tick is one SwerveDrive.sync_all(), a single cycle for every servo at once, so the four buses are queried (and
+the four modules checked) concurrently rather than one servo or module after another.
+
+The health checks of every module run side by side:
+    encoders     at rest, every servo replies every tick, without faults, with a steady position,
+                 no velocity, and its temperature and voltage in range
+    steer sweep  the steer reaches each of Constants.DIAG_STEER_ANGLES within its tolerance and timeout
+    drive spin   the wheels, pointing forward, reach Constants.DIAG_DRIVE_SPEED in the right direction
+
+Example usage:
+    await swerve_drive.initialize_modules()
+    report = await run_health_checks(swerve_drive)  # the wheels move, put the robot on blocks
+    latency = await measure_bus_latency(swerve_drive)
+"""
+
+
+class _Pacer:
+    # Sleeps until the next tick of a fixed rate, without drifting.
+    def __init__(self, clock, rate_hz: float, sleep):
+        self.clock = clock
+        self.period = 1.0 / rate_hz
+        self.sleep = sleep
+        self.next_time = clock()
+
+    async def wait(self) -> None:
+        self.next_time += self.period
+        await self.sleep(max(0.0, self.next_time - self.clock()))
+
+
+def _motors(swerve_drive) -> list:
+    # (module name, "drive" or "steer", SwerveMotor) of every motor, in telemetry order.
+    return [(profile.name, role, motor)
+            for profile, module in zip(swerve_drive.profile.modules, swerve_drive.modules)
+            for role, motor in (("drive", module.drive), ("steer", module.steer))]
+
+
+def motor_rows(swerve_drive) -> list:
+    """
+    Gives the last known state of every motor, from the telemetry snapshots. Does not go to the bus.
+
+    :return list: A dict per motor: id, module, role, bus, position (rev), velocity (rev/s), torque (Nm), temperature (°C), voltage (V), fault, mode and age (s).
+    """
+    now = swerve_drive.clock()
+    rows = []
+    for name, role, motor in _motors(swerve_drive):
+        snapshot = motor.snapshot
+        rows.append({
+            "id": motor.motor.id,
+            "module": name,
+            "role": role,
+            "bus": swerve_drive.dispatcher.bus_of.get(motor.motor.id),
+            "position": snapshot.position,
+            "velocity": snapshot.velocity,
+            "torque": snapshot.torque,
+            "temperature": snapshot.temperature,
+            "voltage": snapshot.voltage,
+            "fault": snapshot.fault,
+            "mode": None if snapshot.mode is None else int(snapshot.mode),
+            "age": snapshot.age(now),
+        })
+    return rows
+
+
+async def measure_bus_latency(swerve_drive, cycles: int = Constants.DIAG_LATENCY_CYCLES) -> dict:
+    """
+    Measures the round-trip time of query cycles, on each bus alone and on every bus at once.
+
+    :param swerve_drive (SwerveDrive): An initialized drive.
+    :param cycles (int): How many query cycles to time per bus.
+
+    :return dict: Bus number (and "all" for every bus in one cycle) to its servos, cycles, replies out of expected, and mean, p50, p99 and max latency in seconds.
+    """
+    commands = [command for module in swerve_drive.modules for command in module.make_query_commands()]
+    groups = swerve_drive.dispatcher.group_by_bus(commands)
+    groups.pop(None, None)
+    groups = dict(sorted(groups.items()))
+    groups["all"] = commands
+
+    latency = {}
+    for bus, bus_commands in groups.items():
+        times = []
+        replies = 0
+        for _ in range(cycles):
+            start = time.perf_counter()
+            results = await swerve_drive.cycle(bus_commands)
+            times.append(time.perf_counter() - start)
+            replies += sum(1 for result in results if result.id != -1)
+        times.sort()
+        latency[bus] = {
+            "servos": sorted(command.destination for command in bus_commands),
+            "cycles": cycles,
+            "replies": replies,
+            "expected": cycles * len(bus_commands),
+            "mean": sum(times) / len(times),
+            "p50": times[len(times) // 2],
+            "p99": times[min(len(times) - 1, int(0.99 * len(times)))],
+            "max": times[-1],
+        }
+    return latency
+
+
+def _stopped_problem(swerve_drive, index: int) -> list:
+    # Why a module failed a check if the fault manager stopped it during the check.
+    fault_manager = swerve_drive.fault_manager
+    if fault_manager.should_command(index):
+        return []
+    cause = fault_manager.last_faults[index] or ("another module" if fault_manager.escalated else "a fault")
+    return [f"stopped by the fault manager ({cause})"]
+
+
+def _result(problems: list, **values) -> dict:
+    return {"passed": not problems, "problems": problems, **values}
+
+
+async def check_encoders(swerve_drive, duration: float = Constants.DIAG_REST_DURATION,
+                         rate_hz: float = Constants.DIAG_RATE_HZ, sleep=asyncio.sleep) -> dict:
+    """
+    Watches every servo at rest with query-only cycles.
+
+    :return dict: Module name to its result: passed, problems, and per motor role the replies, position noise (rev), peak velocity (rev/s), temperature and voltage.
+    """
+    motors = _motors(swerve_drive)
+    ticks = max(1, int(math.ceil(duration * rate_hz)))
+    positions = {id(motor): [] for _, _, motor in motors}
+    velocities = {id(motor): [] for _, _, motor in motors}
+    faults = {id(motor): 0 for _, _, motor in motors}
+
+    pacer = _Pacer(swerve_drive.clock, rate_hz, sleep)
+    for _ in range(ticks):
+        replied = {result.id for result in await swerve_drive.sync_all(request_attitude=False)}
+        for _, _, motor in motors:
+            if motor.motor.id in replied:
+                snapshot = motor.snapshot
+                positions[id(motor)].append(snapshot.position)
+                velocities[id(motor)].append(snapshot.velocity)
+                faults[id(motor)] = faults[id(motor)] or snapshot.fault
+        await pacer.wait()
+
+    results = {}
+    for name, role, motor in motors:
+        problems = results.setdefault(name, _result([]))["problems"]
+        position = positions[id(motor)]
+        velocity = velocities[id(motor)]
+        snapshot = motor.snapshot
+        label = f"{role} {motor.motor.id}"
+        if len(position) < ticks:
+            problems.append(f"{label} replied to {len(position)} of {ticks} queries")
+        finite = all(math.isfinite(value) for value in position + velocity)
+        if not finite:
+            problems.append(f"{label} reported a position or velocity that is not a number")
+        noise = max(position) - min(position) if position and finite else math.nan
+        peak_velocity = max(abs(value) for value in velocity) if velocity and finite else math.nan
+        if noise > Constants.DIAG_ENCODER_NOISE:
+            problems.append(f"{label} position wandered {noise:.4f} rev at rest")
+        if peak_velocity > Constants.DIAG_REST_VELOCITY:
+            problems.append(f"{label} reported {peak_velocity:.3f} rev/s at rest")
+        if faults[id(motor)]:
+            problems.append(f"{label} reported fault {faults[id(motor)]}")
+        if snapshot.temperature > Constants.MAX_MOTOR_TEMPERATURE:
+            problems.append(f"{label} is at {snapshot.temperature:.0f} °C")
+        if snapshot.voltage < Constants.MIN_BUS_VOLTAGE:
+            problems.append(f"{label} sees {snapshot.voltage:.1f} V")
+        results[name][role] = {"replies": len(position), "expected": ticks, "noise": noise, "peak_velocity": peak_velocity,
+                               "temperature": snapshot.temperature, "voltage": snapshot.voltage}
+
+    for result in results.values():
+        result["passed"] = not result["problems"]
+    return results
+
+
+async def check_steer_sweep(swerve_drive, angles: tuple = Constants.DIAG_STEER_ANGLES,
+                            tolerance: float = Constants.DIAG_STEER_TOLERANCE, timeout: float = Constants.DIAG_STEER_TIMEOUT,
+                            rate_hz: float = Constants.DIAG_RATE_HZ, sleep=asyncio.sleep) -> dict:
+    """
+    Steers every module through a list of angles, with the wheels held, and times how long each takes to settle.
+
+    :return dict: Module name to its result: passed, problems, and the settle time (s, None if it did not settle) and final error (rev) at each angle.
+    """
+    modules = swerve_drive.modules
+    names = [profile.name for profile in swerve_drive.profile.modules]
+    settle_times = {name: [] for name in names}
+    errors = {name: [] for name in names}
+    ticks = max(1, int(math.ceil(timeout * rate_hz)))
+
+    pacer = _Pacer(swerve_drive.clock, rate_hz, sleep)
+    for angle in angles:
+        start = swerve_drive.clock()
+        settled = [None] * len(modules)
+        for _ in range(ticks):
+            for module in modules:
+                module.set_target(0.0, math.radians(angle))
+            await swerve_drive.sync_all(request_attitude=False)
+            now = swerve_drive.clock()
+            for index, module in enumerate(modules):
+                error = abs(module.steer_controller.target - module.steer_controller.position)
+                if settled[index] is None and error <= tolerance:
+                    settled[index] = now - start
+            if all(time is not None for time in settled):
+                break
+            await pacer.wait()
+
+        for name, module, settle_time in zip(names, modules, settled):
+            settle_times[name].append(settle_time)
+            errors[name].append(abs(module.steer_controller.target - module.steer_controller.position))
+
+    results = {}
+    for index, name in enumerate(names):
+        problems = _stopped_problem(swerve_drive, index) or [f"steer did not reach {angle:.0f}° within {timeout:.1f} s (off by {error * 360.0:.1f}°)"
+                    for angle, settle_time, error in zip(angles, settle_times[name], errors[name]) if settle_time is None]
+        results[name] = _result(problems, angles=list(angles), settle_times=settle_times[name], errors=errors[name])
+    return results
+
+
+async def check_drive_spin(swerve_drive, speed: float = Constants.DIAG_DRIVE_SPEED, duration: float = Constants.DIAG_DRIVE_DURATION,
+                           tolerance: float = Constants.DIAG_DRIVE_TOLERANCE, rate_hz: float = Constants.DIAG_RATE_HZ,
+                           sleep=asyncio.sleep) -> dict:
+    """
+    Drives every wheel forward at a speed, with the modules pointing forward, and compares the measured wheel speed over the second half.
+
+    :return dict: Module name to its result: passed, problems, the commanded and mean measured speed (m/s) and the error as a fraction of the speed.
+    """
+    modules = swerve_drive.modules
+    names = [profile.name for profile in swerve_drive.profile.modules]
+    ticks = max(2, int(math.ceil(duration * rate_hz)))
+    measured = {name: [] for name in names}
+
+    pacer = _Pacer(swerve_drive.clock, rate_hz, sleep)
+    for tick in range(ticks):
+        for module in modules:
+            module.set_target(speed, 0.0)
+        await swerve_drive.sync_all(request_attitude=False)
+        if tick >= ticks // 2:
+            for name, module in zip(names, modules):
+                measured[name].append(module.speed)
+        await pacer.wait()
+
+    results = {}
+    for index, name in enumerate(names):
+        mean = sum(measured[name]) / len(measured[name])
+        error = abs(mean - speed) / abs(speed) if speed else math.nan
+        # A module the fault manager stopped was not driven, so its speed says nothing.
+        problems = _stopped_problem(swerve_drive, index)
+        if not problems and mean * speed < 0.0:
+            problems.append(f"wheel turned backwards ({mean:.2f} m/s), is the drive motor inverted?")
+        elif not problems and not error <= tolerance:
+            problems.append(f"wheel reached {mean:.2f} of {speed:.2f} m/s")
+        results[name] = _result(problems, speed=speed, measured=mean, error=error)
+    return results
+
+
+async def run_health_checks(swerve_drive, motion: bool = True, rate_hz: float = Constants.DIAG_RATE_HZ, sleep=asyncio.sleep) -> dict:
+    """
+    Runs the health checks of every module side by side, and stops the drive afterwards.
+
+    :param swerve_drive (SwerveDrive): An initialized drive.
+    :param motion (bool): Also run the steer sweep and drive spin, which move the wheels. Only the encoder check if False.
+    :param rate_hz (float): The tick rate, in Hz.
+    :param sleep (coroutine function): Waits a number of seconds.
+
+    :return dict: Module name to {"passed", and the result of each check by name}.
+    """
+    checks = [("encoders", check_encoders)]
+    if motion:
+        checks += [("steer_sweep", check_steer_sweep), ("drive_spin", check_drive_spin)]
+
+    report = {profile.name: {"passed": True} for profile in swerve_drive.profile.modules}
+    try:
+        # One after the other: every check already runs on all modules at once, and they share the bus.
+        for check, function in checks:
+            for name, result in (await function(swerve_drive, rate_hz=rate_hz, sleep=sleep)).items():
+                report[name][check] = result
+                report[name]["passed"] = report[name]["passed"] and result["passed"]
+    finally:
+        await swerve_drive.stop()
+    return report
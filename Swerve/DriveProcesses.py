@@ -0,0 +1,332 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import signal
+import struct
+import time
+from collections import namedtuple
+import Utils.Constants as Constants
+from Utils.Controller import Controller, ControllerSnapshot
+from Utils.Realtime import freeze_gc, make_realtime, unfreeze_gc
+from Utils.SharedRing import SharedRing
+from Utils.TelemetryRecorder import MAGIC as TELEMETRY_MAGIC, MODULE_COUNT, RECORD_STRUCT, TelemetryRecorder
+
+"""
+Runs the drive as separate processes, so nothing but the servo I/O shares a core with the control loop.
+
+    input       reads the joystick and publishes controller snapshots
+    control     the control loop: controller snapshot in, bus cycle, telemetry out. Pinned to RT_CPU under SCHED_FIFO
+    estimation  odometry from the telemetry, publishes the robot pose
+    logging     copies the telemetry into the telemetry file
+
+They only share SharedRings of fixed records (no pickling per tick): the input ring of controller
+snapshots, the telemetry ring (the same records as the telemetry file) and the pose ring.
+Everything is started and stopped by run_processes(), which is what main.py --processes runs.
+"""
+
+MAX_AXES = 8
+MAX_BUTTONS = 16
+
+# A controller snapshot: timestamp, axis count, button count, axes, buttons.
+INPUT_STRUCT = struct.Struct(f"<dBB{MAX_AXES}f{MAX_BUTTONS}B")
+# A pose estimate: timestamp, x (meters), y (meters), heading (radians).
+POSE_STRUCT = struct.Struct("<dddd")
+
+# Where the motor positions and the yaw are in a telemetry record, see TelemetryRecorder.record_drive().
+_POSITION_INDEX = 4 + 2 * MODULE_COUNT
+_YAW_INDEX = -1
+
+# The shared memory names of the rings of one run.
+RingNames = namedtuple("RingNames", ["input", "telemetry", "pose"])
+
+
+class SharedController:
+    """
+    A stand-in for Controller in the control process, giving the latest snapshot published by the input process.
+    """
+
+    def __init__(self, ring: SharedRing):
+        self.ring = ring
+        self.snapshot = ControllerSnapshot((), (), 0.0)
+
+    def start(self, rate_hz: float = None):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_snapshot(self) -> ControllerSnapshot:
+        record = self.ring.latest()
+        if record is None:
+            return self.snapshot
+        if record[0] != self.snapshot.timestamp:
+            axis_count, button_count = record[1], record[2]
+            self.snapshot = ControllerSnapshot(record[3:3 + axis_count], record[3 + MAX_AXES:3 + MAX_AXES + button_count], record[0])
+        return self.snapshot
+
+    def get_axis(self, axis):
+        axes = self.get_snapshot().axes
+        return axes[axis] if axis < len(axes) else 0.0
+
+    def get_button(self, button):
+        buttons = self.get_snapshot().buttons
+        return bool(buttons[button]) if button < len(buttons) else False
+
+
+def _ignore_interrupt():
+    # Ctrl+C reaches every process of the group; only run_processes() handles it, and stops the others in order.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _load_profile(profile_path: str):
+    from Utils.RobotProfile import RobotProfile, load_profile
+    return load_profile(profile_path) if profile_path else RobotProfile.default()
+
+
+def input_process(names: RingNames, stop_event, rate_hz: float = Constants.CONTROLLER_RATE_HZ) -> None:
+    """
+    Reads the joystick at rate_hz and publishes every snapshot to the input ring.
+    """
+    _ignore_interrupt()
+    ring = SharedRing.attach(names.input, INPUT_STRUCT)
+    controller = Controller()
+    values = [0.0, 0, 0] + [0.0] * MAX_AXES + [0] * MAX_BUTTONS
+
+    period = 1.0 / rate_hz
+    next_read = time.monotonic()
+    try:
+        while not stop_event.is_set():
+            snapshot = controller.get_snapshot()
+            if snapshot.timestamp:
+                axes = snapshot.axes[:MAX_AXES]
+                buttons = snapshot.buttons[:MAX_BUTTONS]
+                values[0], values[1], values[2] = snapshot.timestamp, len(axes), len(buttons)
+                values[3:3 + len(axes)] = axes
+                values[3 + MAX_AXES:3 + MAX_AXES + len(buttons)] = buttons
+                ring.write(*values)
+
+            next_read += period
+            delay = next_read - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_read = time.monotonic()
+    finally:
+        ring.close()
+
+
+def control_process(names: RingNames, stop_event, profile_path: str = None, simulate: bool = False,
+                    rt_cpu: int = Constants.RT_CPU, rt_priority: int = Constants.RT_PRIORITY,
+                    metrics_port: int = Constants.METRICS_PORT, fast_path: bool = Constants.FAST_PATH) -> None:
+    """
+    Runs the control loop: drives from the input ring and records every tick into the telemetry ring.
+    Stops every motor once stop_event is set.
+
+    :param fast_path (bool): Run the drive on its fast path and freeze the garbage collector once it is up (see SwerveDrive).
+    """
+    _ignore_interrupt()
+    for problem in make_realtime(rt_cpu, rt_priority):
+        print(f"Control process: {problem}")
+    asyncio.run(_control(names, stop_event, profile_path, simulate, metrics_port, fast_path))
+
+
+async def _control(names: RingNames, stop_event, profile_path: str, simulate: bool, metrics_port: int,
+                   fast_path: bool) -> None:
+    from Swerve.SwerveDrive import SwerveDrive
+    from Utils.ControlLoop import ControlLoop
+    from Utils.Profiler import MetricsServer
+
+    input_ring = SharedRing.attach(names.input, INPUT_STRUCT)
+    telemetry_ring = SharedRing.attach(names.telemetry, RECORD_STRUCT)
+    profile = _load_profile(profile_path)
+    transport = None
+    if simulate:
+        from Swerve.SimTransport import SimTransport
+        transport = SimTransport.from_profile(profile)
+
+    swerve_drive = SwerveDrive(transport=transport, controller=SharedController(input_ring), profile=profile,
+                               steer_offset_path=None if simulate else Constants.STEER_OFFSET_PATH,
+                               feedforward_path=None if simulate else Constants.FEEDFORWARD_PATH, fast_path=fast_path)
+    try:
+        await swerve_drive.initialize_modules()
+        if not simulate:
+            await swerve_drive.verify_servo_config()
+        recorder = TelemetryRecorder(None, telemetry_ring.capacity, buffer=telemetry_ring.buffer)
+        metrics_server = await MetricsServer.start(port=metrics_port) if metrics_port else None
+
+        async def tick(dt):
+            if stop_event.is_set():
+                control_loop.stop()
+                return
+            await swerve_drive.teleop_periodic(dt)
+            recorder.record_drive(swerve_drive, dt, control_loop.last_jitter, control_loop.last_tick_time)
+
+        gc_period = 0
+        if swerve_drive.fast_path:
+            freeze_gc()
+            gc_period = Constants.GC_COLLECT_PERIOD
+        control_loop = ControlLoop(tick, Constants.LOOP_RATE_HZ, gc_period=gc_period)
+        try:
+            await control_loop.run()
+        finally:
+            if swerve_drive.fast_path:
+                unfreeze_gc()
+            if metrics_server is not None:
+                metrics_server.close()
+            print(f"Control loop stats: {control_loop.stats()}")
+            print(f"Fault stats: {swerve_drive.fault_manager.stats()}")
+    finally:
+        await swerve_drive.stop()
+        input_ring.close()
+        telemetry_ring.close()
+
+
+def estimation_process(names: RingNames, stop_event, profile_path: str = None, steer_offsets: list = None) -> None:
+    """
+    Runs odometry over every telemetry record, and publishes the pose estimate to the pose ring.
+
+    Module positions go through the same SteerController unwrapping and ModuleModel coupling compensation
+    as SwerveModule.getPosition(), so the pose matches the one of swerve_drive_periodic() in a single process.
+
+    :param steer_offsets (list): The steer offset of each module in revolutions, the ones the control process uses.
+    """
+    _ignore_interrupt()
+    from wpimath.geometry import Pose2d, Rotation2d
+    from wpimath.kinematics import SwerveModulePosition
+    import wpimath.estimator as estimator
+    from Swerve.ModuleModel import ModuleModel
+    from Swerve.SteerController import SteerController
+
+    profile = _load_profile(profile_path)
+    if steer_offsets is None:
+        steer_offsets = [module.steer_offset for module in profile.modules]
+    telemetry_ring = SharedRing.attach(names.telemetry, RECORD_STRUCT)
+    pose_ring = SharedRing.attach(names.pose, POSE_STRUCT)
+    meters_per_drive_rev = profile.meters_per_drive_rev
+    steer_controllers = [SteerController(offset) for offset in steer_offsets]
+    # Only wheel_position() is used, which needs the coupling ratio and no feedforward.
+    model = ModuleModel(coupling_ratio=profile.coupling_ratio)
+
+    pose_estimator = None
+    cursor = 0
+    try:
+        while not stop_event.is_set():
+            records, cursor = telemetry_ring.read_new(cursor)
+            pose = None
+            for record in records:
+                positions = record[_POSITION_INDEX:_POSITION_INDEX + 2 * MODULE_COUNT]
+                if any(math.isnan(position) for position in positions):
+                    continue  # no reply from every motor yet
+                for i, steer_controller in enumerate(steer_controllers):
+                    steer_controller.update(positions[2 * i + 1])
+                module_positions = tuple(
+                    SwerveModulePosition(model.wheel_position(positions[2 * i], steer_controller.position) * meters_per_drive_rev,
+                                         Rotation2d(steer_controller.angle()))
+                    for i, steer_controller in enumerate(steer_controllers))
+                heading = Rotation2d(record[_YAW_INDEX])
+                if pose_estimator is None:
+                    pose_estimator = estimator.SwerveDrive4PoseEstimator(
+                        profile.kinematics, heading, module_positions, Pose2d(0.0, 0.0, Rotation2d.fromDegrees(0.0)),
+                        (0.02, 0.02, math.radians(5)), (0.3, 0.3, math.radians(10)))
+                pose = pose_estimator.updateWithTime(record[0], heading, module_positions)
+                timestamp = record[0]
+            if pose is not None:
+                pose_ring.write(timestamp, pose.X(), pose.Y(), pose.rotation().radians())
+            time.sleep(Constants.ESTIMATION_PERIOD)
+    finally:
+        telemetry_ring.close()
+        pose_ring.close()
+
+
+def logging_process(names: RingNames, stop_event, telemetry_path: str = Constants.TELEMETRY_PATH,
+                    capacity: int = Constants.TELEMETRY_CAPACITY) -> None:
+    """
+    Copies every telemetry record into the telemetry file, until stop_event is set and the ring is drained.
+    """
+    _ignore_interrupt()
+    telemetry_ring = SharedRing.attach(names.telemetry, RECORD_STRUCT)
+    recorder = TelemetryRecorder(telemetry_path, capacity)
+    cursor = 0
+    try:
+        while True:
+            stopping = stop_event.is_set()
+            count = telemetry_ring.count
+            for index in range(max(cursor, count - telemetry_ring.capacity), count):
+                data = telemetry_ring.read_raw(index)
+                if data is not None:
+                    recorder.record_raw(data)
+            cursor = count
+            if stopping:
+                break
+            time.sleep(Constants.LOGGING_PERIOD)
+    finally:
+        recorder.close()
+        telemetry_ring.close()
+
+
+def run_processes(profile_path: str = None, simulate: bool = False, rt_cpu: int = Constants.RT_CPU,
+                  rt_priority: int = Constants.RT_PRIORITY, metrics_port: int = Constants.METRICS_PORT,
+                  duration: float = None, fast_path: bool = Constants.FAST_PATH) -> None:
+    """
+    Starts the input, control, estimation and logging processes and waits until the control process ends,
+    Ctrl+C is pressed or duration runs out. Then stops them all, the control process first, so the motors are stopped.
+
+    :param profile_path (str): Robot profile for every process, the values in Utils/Constants.py if not given.
+    :param simulate (bool): Drive a SimTransport instead of the Pi3Hat.
+    :param rt_cpu (int): The CPU to pin the control process to, None to not pin it.
+    :param rt_priority (int): The SCHED_FIFO priority of the control process, None to leave it at normal priority.
+    :param metrics_port (int): UDP port of the control process for swerve_metrics.py, 0 to not serve metrics.
+    :param duration (float): Stop after this many seconds, None to run until interrupted.
+    :param fast_path (bool): Run the control process on the fast path of the drive (see main.py --fast-path).
+    """
+    from Swerve.SteerController import load_steer_offsets
+
+    profile = _load_profile(profile_path)
+    offsets = {} if simulate else load_steer_offsets(Constants.STEER_OFFSET_PATH)
+    steer_offsets = [offsets.get(module.steer_id, module.steer_offset) for module in profile.modules]
+
+    prefix = f"swerve-{os.getpid()}"
+    names = RingNames(f"{prefix}-input", f"{prefix}-telemetry", f"{prefix}-pose")
+    rings = [
+        SharedRing.create(names.input, INPUT_STRUCT, Constants.INPUT_RING_CAPACITY),
+        SharedRing.create(names.telemetry, RECORD_STRUCT, Constants.TELEMETRY_RING_CAPACITY, magic=TELEMETRY_MAGIC),
+        SharedRing.create(names.pose, POSE_STRUCT, Constants.POSE_RING_CAPACITY),
+    ]
+
+    # Spawned rather than forked, so no process inherits the threads or open devices of another.
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    control = context.Process(target=control_process, name="control",
+                              args=(names, stop_event, profile_path, simulate, rt_cpu, rt_priority, metrics_port, fast_path))
+    others = [
+        context.Process(target=input_process, name="input", args=(names, stop_event)),
+        context.Process(target=estimation_process, name="estimation", args=(names, stop_event, profile_path, steer_offsets)),
+        context.Process(target=logging_process, name="logging", args=(names, stop_event)),
+    ]
+
+    pose_ring = rings[2]
+    try:
+        for process in others + [control]:
+            process.start()
+        end = None if duration is None else time.monotonic() + duration
+        while control.is_alive() and (end is None or time.monotonic() < end):
+            control.join(0.5)
+    except KeyboardInterrupt:
+        print("Program interrupted by user. Stopping all modules.")
+    finally:
+        stop_event.set()
+        for process in [control] + others:
+            if process.pid is None:
+                continue
+            process.join(5.0)
+            if process.is_alive():
+                print(f"The {process.name} process did not stop, terminating it.")
+                process.terminate()
+                process.join()
+
+        pose = pose_ring.latest()
+        if pose is not None:
+            print(f"Final pose: x={pose[1]:.3f} m, y={pose[2]:.3f} m, heading={math.degrees(pose[3]):.1f} deg")
+        for ring in rings:
+            ring.close()
@@ -0,0 +1,186 @@
+import moteus
+import Utils.Constants as Constants
+
+"""
+Classifies motor faults from the query replies of every transport cycle, and decides how the drive reacts.
+
+A fault on a module is first treated as transient: the module keeps being commanded every tick,
+up to a retry budget of bad ticks within a window of recent ticks, so a fault that comes and goes
+uses up the budget as well as one that stays. After that the module is degraded: both of its motors are
+stopped (which also clears moteus faults) while the other modules keep driving. A degraded module stays
+degraded until it has a number of clean ticks in a row, and every fault it has in the meantime counts
+towards escalation: if the fault persists, it is escalated to a coordinated stop of every module.
+The drive recovers once no module is degraded.
+"""
+
+TIMEOUT = "timeout"
+FAULT = "fault"
+OVER_TEMPERATURE = "over_temperature"
+UNDERVOLTAGE = "undervoltage"
+FAULT_CLASSES = (TIMEOUT, FAULT, OVER_TEMPERATURE, UNDERVOLTAGE)
+
+HEALTHY = "healthy"
+RETRYING = "retrying"
+DEGRADED = "degraded"
+
+
+class FaultManager:
+    def __init__(self,
+                 module_count: int,
+                 retry_budget: int = Constants.FAULT_RETRY_BUDGET,
+                 window_ticks: int = Constants.FAULT_WINDOW_TICKS,
+                 escalation_ticks: int = Constants.FAULT_ESCALATION_TICKS,
+                 recovery_ticks: int = Constants.FAULT_RECOVERY_TICKS,
+                 max_temperature: float = Constants.MAX_MOTOR_TEMPERATURE,
+                 min_voltage: float = Constants.MIN_BUS_VOLTAGE):
+        """
+        Constructs a fault manager.
+
+        :param module_count (int): How many swerve modules there are.
+        :param retry_budget (int): How many bad ticks within window_ticks a module is retried for before it is degraded.
+        :param window_ticks (int): How many of the last ticks of a module its bad ticks are counted over.
+        :param escalation_ticks (int): How many bad ticks a degraded module can have before every module is stopped.
+        :param recovery_ticks (int): How many clean ticks in a row a module needs to become healthy again.
+        :param max_temperature (float): Controller temperature above which a motor is over temperature, in degrees C.
+        :param min_voltage (float): Bus voltage below which a motor is undervoltage, in volts.
+        """
+        self.module_count = module_count
+        self.retry_budget = retry_budget
+        self.window_ticks = window_ticks
+        self.escalation_ticks = escalation_ticks
+        self.recovery_ticks = recovery_ticks
+        self.max_temperature = max_temperature
+        self.min_voltage = min_voltage
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clears every module state and counter.
+        """
+        self.states = [HEALTHY] * self.module_count
+        # A ring of the last window_ticks ticks of every module, True for a bad tick, and how many of them are bad.
+        self.history = [[False] * self.window_ticks for _ in range(self.module_count)]
+        self.history_index = [0] * self.module_count
+        self.bad_ticks = [0] * self.module_count
+        self.good_ticks = [0] * self.module_count  # clean ticks in a row
+        self.degraded_faults = [0] * self.module_count  # bad ticks since the module was degraded
+        self.last_faults = [None] * self.module_count
+        self.escalated = False
+        self.counters = {fault_class: 0 for fault_class in FAULT_CLASSES}
+        self.counters.update({"transport_errors": 0, "retries": 0, "degradations": 0, "escalations": 0})
+
+    def classify(self, result) -> str:
+        """
+        Classifies the query reply of one motor.
+
+        :param result (moteus.Result): The reply of the motor, or None if it did not reply.
+
+        :return str: The fault class (TIMEOUT, FAULT, OVER_TEMPERATURE or UNDERVOLTAGE), or None if the motor is fine.
+        """
+        if result is None:
+            return TIMEOUT
+
+        values = result.values
+        if values.get(moteus.Register.FAULT, 0) or values.get(moteus.Register.MODE) == moteus.Mode.FAULT:
+            return FAULT
+        if values.get(moteus.Register.TEMPERATURE, 0.0) > self.max_temperature:
+            return OVER_TEMPERATURE
+        if values.get(moteus.Register.VOLTAGE, self.min_voltage) < self.min_voltage:
+            return UNDERVOLTAGE
+        return None
+
+    def check_cycle(self, modules, results_by_id: dict, commanded_ids) -> None:
+        """
+        Classifies the replies of every module from one transport cycle and updates the module states.
+
+        :param modules (list): Every SwerveModule, in module order.
+        :param results_by_id (dict): Query results of the cycle, keyed by motor id.
+        :param commanded_ids (set): The ids of the motors that were sent a command in the cycle. Only these are expected to reply.
+        """
+        for index, module in enumerate(modules):
+            fault = None
+            checked = False
+            for motor in (module.steer, module.drive):
+                if motor.motor.id in commanded_ids:
+                    checked = True
+                    fault = fault or self.classify(results_by_id.get(motor.motor.id))
+            if checked:
+                self._update_module(index, fault)
+        self._update_escalation()
+
+    def record_transport_error(self, error: Exception) -> None:
+        """
+        Records a transport cycle that raised instead of returning, as a timeout of every module.
+
+        :param error (Exception): What the transport raised.
+        """
+        self.counters["transport_errors"] += 1
+        for index in range(self.module_count):
+            self._update_module(index, TIMEOUT)
+        self._update_escalation()
+
+    def should_command(self, index: int) -> bool:
+        """
+        Checks whether a module should get its normal commands this tick.
+
+        :return bool: False if the module, or the whole drive, should be held in its safe (stopped) state.
+        """
+        return not self.escalated and self.states[index] != DEGRADED
+
+    def stats(self) -> dict:
+        """
+        Gives the fault counters and the current state of every module.
+        """
+        return {
+            "counters": dict(self.counters),
+            "modules": list(self.states),
+            "last_faults": list(self.last_faults),
+            "escalated": self.escalated,
+        }
+
+    def _update_module(self, index: int, fault: str) -> None:
+        history = self.history[index]
+        position = self.history_index[index]
+        bad = fault is not None
+        self.bad_ticks[index] += bad - history[position]
+        history[position] = bad
+        self.history_index[index] = (position + 1) % self.window_ticks
+
+        if not bad:
+            self.good_ticks[index] += 1
+            if self.states[index] == RETRYING:
+                self.states[index] = HEALTHY
+            elif self.states[index] == DEGRADED and self.good_ticks[index] >= self.recovery_ticks:
+                self.states[index] = HEALTHY
+                self.degraded_faults[index] = 0
+                # The module earned a fresh retry budget.
+                history[:] = [False] * self.window_ticks
+                self.bad_ticks[index] = 0
+            return
+
+        self.counters[fault] += 1
+        self.last_faults[index] = fault
+        self.good_ticks[index] = 0
+
+        if self.states[index] == DEGRADED:
+            self.degraded_faults[index] += 1
+        elif self.bad_ticks[index] <= self.retry_budget:
+            self.states[index] = RETRYING
+            self.counters["retries"] += 1
+        else:
+            self.states[index] = DEGRADED
+            self.counters["degradations"] += 1
+            print(f"Swerve module {index} degraded after {self.bad_ticks[index]} bad ticks in the last {self.window_ticks} ({fault}), stopping it.")
+
+    def _update_escalation(self) -> None:
+        persistent = any(
+            state == DEGRADED and degraded_faults > self.escalation_ticks
+            for state, degraded_faults in zip(self.states, self.degraded_faults))
+
+        if persistent and not self.escalated:
+            self.escalated = True
+            self.counters["escalations"] += 1
+            print(f"Persistent swerve fault, stopping all modules. Faults: {self.last_faults}")
+        elif self.escalated and DEGRADED not in self.states:
+            self.escalated = False
+            print("Swerve faults cleared, resuming.")
@@ -0,0 +1,101 @@
+import math
+import Utils.Constants as Constants
+
+"""
+Heading hold: keeps the robot facing the same way while the driver is not turning.
+
+Without it, a swerve drive slowly rotates while translating (uneven wheel slip, steer lag), and the
+driver has to correct with the turn stick. Once the turn input is released and the chassis has stopped
+turning, the heading at that moment becomes the target, and a PID controller on the IMU yaw turns
+the robot back to it. Touching the turn stick again hands rotation back to the driver.
+
+The controller works on the raw IMU yaw, not the field heading, so reset_heading() does not move the target.
+
+Example usage:
+    heading_controller = HeadingController.from_profile(swerve_drive.profile)
+    omega = heading_controller.hold(turn_input, omega, swerve_drive.yaw, dt)  # every tick
+"""
+
+
+class HeadingController:
+    def __init__(self,
+                 kp: float = Constants.HEADING_KP,
+                 ki: float = Constants.HEADING_KI,
+                 kd: float = Constants.HEADING_KD,
+                 max_omega: float = Constants.HEADING_HOLD_MAX_OMEGA,
+                 capture_rate: float = Constants.HEADING_HOLD_CAPTURE_RATE):
+        """
+        Constructs a heading controller, with no target yet.
+
+        :param kp (float): rad/s of correction per radian of heading error.
+        :param ki (float): rad/s of correction per radian second of accumulated heading error.
+        :param kd (float): rad/s of correction per rad/s of turn rate, damping the correction.
+        :param max_omega (float): The largest correction, in rad/s.
+        :param capture_rate (float): The chassis must be turning slower than this, in rad/s, before the heading is captured.
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.max_omega = max_omega
+        self.capture_rate = capture_rate
+        self.reset()
+
+    @classmethod
+    def from_profile(cls, profile) -> "HeadingController":
+        """
+        Constructs a heading controller with the heading gains of a robot profile.
+        """
+        return cls(profile.heading_kp, profile.heading_ki, profile.heading_kd)
+
+    def reset(self) -> None:
+        """
+        Forgets the target, e.g. after the drive was stopped or a path turned the robot. The next hold() captures a new one.
+        """
+        self.target = None  # radians of raw IMU yaw, None while the driver is turning
+        self.integral = 0.0
+        self.last_yaw = None
+
+    def calculate(self, yaw: float, dt: float) -> float:
+        """
+        Gives the turn speed towards the target for one tick.
+
+        :param yaw (float): The current IMU yaw, in radians.
+        :param dt (float): The time since the last update in seconds.
+
+        :return float: The turn speed in rad/s, counterclockwise, at most max_omega either way.
+        """
+        error = math.remainder(self.target - yaw, 2.0 * math.pi)
+        # Derivative on the measurement, so capturing a new target does not kick.
+        rate = 0.0
+        if self.last_yaw is not None and dt > 0.0:
+            rate = math.remainder(yaw - self.last_yaw, 2.0 * math.pi) / dt
+        self.last_yaw = yaw
+
+        if self.ki > 0.0:
+            # Clamped so the integral alone can never ask for more than max_omega (anti-windup).
+            limit = self.max_omega / self.ki
+            self.integral = min(max(self.integral + error * dt, -limit), limit)
+
+        omega = self.kp * error + self.ki * self.integral - self.kd * rate
+        return min(max(omega, -self.max_omega), self.max_omega)
+
+    def hold(self, turn_input: float, omega: float, yaw: float, dt: float) -> float:
+        """
+        Gives the turn speed to command this tick: the driver's while they turn, the heading hold's otherwise.
+
+        :param turn_input (float): The driver's turn input, after the deadband. 0 when the stick is released.
+        :param omega (float): The turn speed the driver's input asks for this tick (e.g. after acceleration limiting), in rad/s.
+        :param yaw (float): The current IMU yaw, in radians.
+        :param dt (float): The time since the last update in seconds.
+
+        :return float: The turn speed in rad/s.
+        """
+        if turn_input != 0.0 or (self.target is None and abs(omega) > self.capture_rate):
+            # The driver is turning, or the chassis is still coming to a stop after they let go.
+            if self.target is not None:
+                self.reset()
+            return omega
+
+        if self.target is None:
+            self.target = yaw
+        return self.calculate(yaw, dt)
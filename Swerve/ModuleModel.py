@@ -0,0 +1,278 @@
+import json
+import math
+import os
+import Utils.Constants as Constants
+
+"""
+A model of one swerve module's drive, applied to every drive command before it is sent.
+
+Two corrections, so the moteus PID only has to close the remaining error:
+
+Coupling compensation. In most modules the drive gearing runs through the steer axis, so turning
+the module turns the wheel even with the drive motor held still: coupling_ratio drive motor
+revolutions per module revolution. The drive velocity target gets coupling_ratio times the measured
+steer velocity added, and the measured wheel speed and distance have it taken out again.
+
+Feedforward. The torque the drive needs at a velocity (static friction, viscous drag, and anything
+less tidy the characterization found) comes from a lookup table with one entry per velocity step,
+plus kA times the acceleration the targets ask for. It is sent as the feedforward_torque of the
+same position mode frame as the velocity target, so it costs no extra frame.
+
+Tables are built from logged runs with characterize() (see characterize.py), or from kS/kV/kA gains
+with FeedforwardTable.from_gains().
+
+Example usage:
+    model = ModuleModel(FeedforwardTable.from_gains(0.05, 0.002, 0.0004, 20.0), coupling_ratio=3.57)
+    velocity = model.drive_velocity(wheel_velocity, steer_snapshot.velocity)
+    torque = model.feedforward_torque(velocity, now)  # every tick
+"""
+
+
+class FeedforwardTable:
+    """
+    Drive torque as a function of velocity, sampled at evenly spaced velocities so a lookup is an index
+    computation and one interpolation, plus kA times the acceleration.
+    """
+
+    def __init__(self, min_velocity: float, step: float, torques: list, ka: float = 0.0):
+        """
+        :param min_velocity (float): The velocity of the first entry, in rev/s.
+        :param step (float): The velocity between entries, in rev/s.
+        :param torques (list): The steady state torque at each velocity, in Nm. At least two entries.
+        :param ka (float): Nm per rev/s² of acceleration.
+        """
+        if len(torques) < 2 or step <= 0.0:
+            raise ValueError("A feedforward table needs at least two entries and a positive step")
+        self.min_velocity = min_velocity
+        self.step = step
+        self.torques = [float(torque) for torque in torques]
+        self.ka = ka
+        self._last = len(self.torques) - 1
+
+    @classmethod
+    def from_gains(cls, ks: float, kv: float, ka: float, max_velocity: float,
+                   points: int = Constants.FEEDFORWARD_TABLE_POINTS) -> "FeedforwardTable":
+        """
+        Builds a table from the usual linear model, torque = kS * sign(velocity) + kV * velocity + kA * acceleration.
+
+        The table interpolates kS in over the first step either side of zero, so the torque does not
+        jump back and forth while the wheel is held at rest.
+
+        :param ks (float): Nm to overcome static friction.
+        :param kv (float): Nm per rev/s.
+        :param ka (float): Nm per rev/s².
+        :param max_velocity (float): The table covers -max_velocity to max_velocity rev/s, and is extended linearly beyond.
+        :param points (int): The number of entries, made odd so one falls on zero.
+        """
+        points |= 1
+        step = 2.0 * max_velocity / (points - 1)
+        velocities = [-max_velocity + i * step for i in range(points)]
+        torques = [0.0 if abs(v) < step * 0.5 else math.copysign(ks, v) + kv * v for v in velocities]
+        return cls(-max_velocity, step, torques, ka)
+
+    def torque(self, velocity: float, accel: float = 0.0) -> float:
+        """
+        Gives the feedforward torque for a velocity and acceleration.
+
+        :param velocity (float): The drive motor velocity target, in rev/s.
+        :param accel (float): The drive motor acceleration, in rev/s².
+
+        :return float: The torque in Nm.
+        """
+        position = (velocity - self.min_velocity) / self.step
+        index = min(max(int(math.floor(position)), 0), self._last - 1)
+        fraction = position - index  # below 0 or above 1 outside the table: extends the end segments
+        a = self.torques[index]
+        return a + (self.torques[index + 1] - a) * fraction + self.ka * accel
+
+    def to_dict(self) -> dict:
+        return {"min_velocity": self.min_velocity, "step": self.step, "torques": self.torques, "ka": self.ka}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FeedforwardTable":
+        return cls(float(data["min_velocity"]), float(data["step"]), data["torques"], float(data.get("ka", 0.0)))
+
+
+class ModuleModel:
+    def __init__(self, feedforward: FeedforwardTable = None, coupling_ratio: float = 0.0,
+                 max_accel: float = math.inf, clock=None):
+        """
+        Constructs the model of one module.
+
+        :param feedforward (FeedforwardTable): The drive feedforward. None to send no feedforward torque.
+        :param coupling_ratio (float): Drive motor revolutions per module revolution with the wheel still. 0.0 for none.
+        :param max_accel (float): The drive motor acceleration limit, in rev/s². The moteus limits the motor to it, so the kA term is too.
+        :param clock (function): Gives the current time in seconds, for the acceleration between velocity targets.
+        """
+        self.feedforward = feedforward
+        self.coupling_ratio = coupling_ratio
+        self.max_accel = max_accel
+        self.clock = clock
+        self.reset()
+
+    @classmethod
+    def from_profile(cls, profile, feedforward: FeedforwardTable = None, clock=None) -> "ModuleModel":
+        """
+        Constructs the model of a module of a robot profile.
+
+        :param profile (RobotProfile): The robot, for its coupling ratio, drive gains and motor limits.
+        :param feedforward (FeedforwardTable): A characterized table of the module. Built from the drive gains of the profile if not given.
+        :param clock (function): Gives the current time in seconds.
+        """
+        if feedforward is None and (profile.drive_ks or profile.drive_kv or profile.drive_ka):
+            feedforward = FeedforwardTable.from_gains(profile.drive_ks, profile.drive_kv, profile.drive_ka, profile.velocity_limit)
+        return cls(feedforward, profile.coupling_ratio, profile.accel_limit, clock)
+
+    def reset(self) -> None:
+        """
+        Forgets the last velocity target, e.g. after the drive was stopped.
+        """
+        self._last_velocity = math.nan
+        self._last_time = 0.0
+
+    def drive_velocity(self, wheel_velocity: float, steer_velocity: float) -> float:
+        """
+        Gives the drive motor velocity that turns the wheel at wheel_velocity while the module steers.
+
+        :param wheel_velocity (float): The wheel speed, in drive motor rev/s.
+        :param steer_velocity (float): The measured steer velocity, in module rev/s.
+        """
+        if self.coupling_ratio == 0.0 or math.isnan(steer_velocity):
+            return wheel_velocity
+        return wheel_velocity + self.coupling_ratio * steer_velocity
+
+    def wheel_velocity(self, drive_velocity: float, steer_velocity: float) -> float:
+        """
+        Gives the wheel speed from the measured drive and steer velocities, the inverse of drive_velocity().
+        """
+        if self.coupling_ratio == 0.0 or math.isnan(steer_velocity):
+            return drive_velocity
+        return drive_velocity - self.coupling_ratio * steer_velocity
+
+    def wheel_position(self, drive_position: float, steer_position: float) -> float:
+        """
+        Gives the distance the wheel rolled, in drive motor revolutions, from the measured drive position
+        and the unwrapped steer position in module revolutions.
+        """
+        if self.coupling_ratio == 0.0 or math.isnan(steer_position):
+            return drive_position
+        return drive_position - self.coupling_ratio * steer_position
+
+    def feedforward_torque(self, velocity: float, now: float = None):
+        """
+        Gives the drive feedforward torque for this tick's velocity target.
+
+        The acceleration is the change from the last target, capped at max_accel.
+
+        :param velocity (float): The drive motor velocity target, in rev/s.
+        :param now (float): The current time. Read from the clock if not given.
+
+        :return float: The torque in Nm, or None if the model has no feedforward.
+        """
+        if self.feedforward is None:
+            return None
+        if now is None:
+            now = self.clock()
+
+        accel = 0.0
+        dt = now - self._last_time
+        if dt > 0.0 and not math.isnan(self._last_velocity):
+            accel = min(max((velocity - self._last_velocity) / dt, -self.max_accel), self.max_accel)
+        self._last_velocity = velocity
+        self._last_time = now
+        return self.feedforward.torque(velocity, accel)
+
+
+def characterize(logs: list, max_velocity: float = None,
+                 points: int = Constants.FEEDFORWARD_TABLE_POINTS,
+                 min_samples: int = Constants.FEEDFORWARD_MIN_SAMPLES) -> tuple:
+    """
+    Builds a drive feedforward table from logged velocity and torque of one drive motor, e.g. from
+    telemetry files recorded during velocity sweeps.
+
+    kA, and the kS and kV of the linear model, are fitted by least squares over every sample. Each
+    table entry is then the mean torque, minus kA times the acceleration, of the samples near its
+    velocity, so the table follows friction that is not linear in velocity. Entries with fewer than
+    min_samples samples use the linear model instead.
+
+    :param logs (list): (velocity, torque, timestamp) arrays of each log, in rev/s, Nm and seconds, one entry per tick.
+    :param max_velocity (float): The velocity range of the table. The largest logged velocity if not given.
+    :param points (int): The number of table entries.
+    :param min_samples (int): How many samples an entry needs to be taken from the logs.
+
+    :return tuple: The FeedforwardTable, and the fitted (kS, kV, kA).
+
+    :raises ValueError: If the logs have too few usable samples.
+    """
+    import numpy as np
+
+    velocities, torques, accels = [], [], []
+    for velocity, torque, timestamp in logs:
+        velocity = np.asarray(velocity, dtype=float)
+        torque = np.asarray(torque, dtype=float)
+        timestamp = np.asarray(timestamp, dtype=float)
+        usable = np.isfinite(velocity) & np.isfinite(torque) & np.isfinite(timestamp)
+        velocity, torque, timestamp = velocity[usable], torque[usable], timestamp[usable]
+        # Ticks without a new reply repeat the timestamp, and would divide by zero.
+        _, unique = np.unique(timestamp, return_index=True)
+        if len(unique) < 3:
+            continue
+        velocity, torque, timestamp = velocity[unique], torque[unique], timestamp[unique]
+        # Acceleration within each log, never across the gap between two logs.
+        accels.append(np.gradient(velocity, timestamp))
+        velocities.append(velocity)
+        torques.append(torque)
+
+    if not velocities:
+        raise ValueError("Need at least 3 usable samples in a log to characterize")
+    velocity = np.concatenate(velocities)
+    torque = np.concatenate(torques)
+    accel = np.concatenate(accels)
+
+    if max_velocity is None:
+        max_velocity = float(np.max(np.abs(velocity)))
+    if max_velocity <= 0.0:
+        raise ValueError("The logs have no motion to characterize")
+
+    columns = np.column_stack((np.sign(velocity), velocity, accel))
+    (ks, kv, ka), *_ = np.linalg.lstsq(columns, torque, rcond=None)
+
+    table = FeedforwardTable.from_gains(ks, kv, ka, max_velocity, points)
+    steady = torque - ka * accel
+    bins = np.rint((velocity - table.min_velocity) / table.step).astype(int)
+    for index in range(len(table.torques)):
+        in_bin = bins == index
+        # The entry at zero stays 0: at rest the friction torque is whatever holds the wheel, not kS.
+        if np.count_nonzero(in_bin) >= min_samples and abs(table.min_velocity + index * table.step) >= table.step * 0.5:
+            table.torques[index] = float(np.mean(steady[in_bin]))
+    return table, (float(ks), float(kv), float(ka))
+
+
+def load_feedforward(path: str) -> dict:
+    """
+    Loads characterized feedforward tables.
+
+    :param path (str): The file written by save_feedforward().
+
+    :return dict: Drive motor id to FeedforwardTable. Empty if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return {int(drive_id): FeedforwardTable.from_dict(table) for drive_id, table in json.load(file).items()}
+
+
+def save_feedforward(path: str, tables: dict) -> None:
+    """
+    Saves feedforward tables, replacing the file in one step so it is never left half written.
+
+    :param path (str): The feedforward file.
+    :param tables (dict): Drive motor id to FeedforwardTable.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as file:
+        json.dump({str(drive_id): table.to_dict() for drive_id, table in sorted(tables.items())}, file, indent=4)
+    os.replace(temporary_path, path)
@@ -0,0 +1,436 @@
+import os
+import pickle
+import time
+import moteus.protocol
+import numpy as np
+from Utils.Controller import ControllerSnapshot
+from Utils.RobotProfile import RobotProfile
+
+"""
+Record and replay of drive runs, for reproducing a field run and for regression testing control changes.
+
+While recording, every controller snapshot the drive reads, every transport cycle (the exact command
+frames and the replies) and the clock of every tick are written to a log, and with a path, the trajectory
+the follower was started with. A replay builds a SwerveDrive on the recorded profile with a ReplayTransport,
+a ReplayController and a TickClock, feeds it the recorded inputs tick by tick as fast as it can, running the
+same tick as main.py (Swerve/Trajectory.py PathThenTeleop), and checks that every command frame the drive sends
+now is the same, byte for byte, as the recorded one. Any difference raises a ReplayMismatch naming the tick and servo.
+
+Recording (main.py --record does this):
+    clock = TickClock()
+    recorder = ReplayRecorder("replays/match.replay")
+    swerve_drive = SwerveDrive(transport=RecordingTransport(transport, recorder),
+                               controller=RecordingController(Controller(), recorder), clock=clock)
+    await swerve_drive.initialize_modules()
+    recorder.record_drive(swerve_drive, has_path=True)
+    # every tick:
+    clock.set(time.monotonic())
+    recorder.record_tick(clock(), dt)
+    recorder.record_path(table)  # in the tick the trajectory is given to PathThenTeleop.start()
+
+Replaying (see replay.py):
+    ticks = await replay("replays/match.replay")
+
+The log is a stream of pickled tuples, one per event:
+    ("drive", profile dict, {steer id: steer offset}, now, {drive id: feedforward table dict}, has path)
+                                                             once, after the modules are initialized
+    ("tick", now, dt)                                        at the start of every tick
+    ("path", trajectory table rows)                          in the tick the path follower was started
+    ("controller", axes, buttons, timestamp)                 every controller snapshot the drive read
+    ("cycle", commands, kwargs, replies)                     every transport cycle
+    ("error", message, commands, kwargs)                     every transport cycle that raised
+    ("end",)                                                 when the recorder is closed
+commands are (destination, data, reply_required) tuples and replies are the raw (arbitration_id, bus, data) frames,
+parsed again by the replayed command, or ("attitude", roll, pitch, yaw) for the IMU reply. Logs are trusted input:
+only replay your own.
+"""
+
+
+class ReplayMismatch(AssertionError):
+    """
+    Raised by a replay when the drive does something else than it did in the recording.
+    """
+
+
+class TickClock:
+    """
+    A clock that only moves when it is set, once per tick, so every time the drive reads within a tick
+    is the same value, and can be recorded and given back exactly.
+    """
+
+    def __init__(self, now: float = None):
+        self.now = time.monotonic() if now is None else now
+
+    def set(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _command_key(command) -> tuple:
+    return command.destination, bytes(command.data), bool(command.reply_required)
+
+
+def _reply_record(result) -> tuple:
+    if result.id == -1:
+        euler = result.euler_rad
+        return "attitude", euler.roll, euler.pitch, euler.yaw
+    return result.arbitration_id, result.bus, bytes(result.data)
+
+
+class ReplayRecorder:
+    def __init__(self, path: str):
+        """
+        Starts a new replay log, replacing any log at that path.
+
+        :param path (str): The log file.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.file = open(path, "wb")
+
+    def write(self, event: tuple) -> None:
+        # One pickle per event, without a shared memo, so nothing is kept alive between ticks.
+        if self.file.closed:
+            return  # e.g. the stop after the control loop ended
+        self.file.write(pickle.dumps(event, pickle.HIGHEST_PROTOCOL))
+
+    def record_drive(self, swerve_drive, has_path: bool = False) -> None:
+        """
+        Records the profile, steer offsets and feedforward tables in use, once the modules are initialized,
+        and the clock the startup ran on (the drive's TickClock must not have been set since).
+
+        :param has_path (bool): Whether the run follows a path before the joystick, see record_path().
+        """
+        offsets = {module.steer.motor.id: module.steer_controller.offset for module in swerve_drive.modules}
+        feedforward = {drive_id: table.to_dict() for drive_id, table in swerve_drive.feedforward.items()}
+        self.write(("drive", swerve_drive.profile.to_dict(), offsets, swerve_drive.clock(), feedforward, has_path))
+
+    def record_path(self, table) -> None:
+        """
+        Records the trajectory the path follower is started with, in the tick it is started.
+
+        :param table (TrajectoryTable): The trajectory.
+        """
+        self.write(("path", table.samples.tolist()))
+
+    def record_tick(self, now: float, dt: float) -> None:
+        """
+        Records the start of a tick.
+
+        :param now (float): The clock of the tick, what the drive's TickClock was set to.
+        :param dt (float): The time since the last tick, as passed to the tick.
+        """
+        self.write(("tick", now, dt))
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+        self.write(("end",))
+        self.file.close()
+
+
+class RecordingTransport:
+    """
+    Passes every cycle on to a transport and records it.
+    """
+
+    def __init__(self, transport, recorder: ReplayRecorder):
+        self.transport = transport
+        self.recorder = recorder
+
+    async def cycle(self, commands, **kwargs):
+        commands = list(commands)
+        keys = [_command_key(command) for command in commands]
+        try:
+            results = await self.transport.cycle(commands, **kwargs)
+        except Exception as e:
+            self.recorder.write(("error", str(e), keys, kwargs))
+            raise
+        self.recorder.write(("cycle", keys, kwargs, [_reply_record(result) for result in results]))
+        return results
+
+
+class RecordingController:
+    """
+    Passes every read on to a controller and records the snapshots.
+    """
+
+    def __init__(self, controller, recorder: ReplayRecorder):
+        self.controller = controller
+        self.recorder = recorder
+
+    def start(self, rate_hz: float = 100.0):
+        self.controller.start(rate_hz)
+
+    def stop(self):
+        self.controller.stop()
+
+    def get_snapshot(self) -> ControllerSnapshot:
+        snapshot = self.controller.get_snapshot()
+        self.recorder.write(("controller", tuple(snapshot.axes), tuple(snapshot.buttons), snapshot.timestamp))
+        return snapshot
+
+    def get_axis(self, axis):
+        axes = self.get_snapshot().axes
+        return axes[axis] if axis < len(axes) else 0.0
+
+    def get_button(self, button):
+        buttons = self.get_snapshot().buttons
+        return bool(buttons[button]) if button < len(buttons) else False
+
+
+class ReplayLog:
+    """
+    A loaded replay log, split into the startup (everything before the first tick) and one entry per tick.
+
+    A log without an end event (the robot lost power, ...) is cut off mid-tick, so its last tick is dropped.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path (str): A log written by ReplayRecorder.
+
+        :raises ValueError: If the log has no drive event.
+        """
+        self.path = path
+        self.drive = None
+        self.startup = {"controller": [], "cycle": []}
+        self.ticks = []  # (now, dt, {"controller": [...], "cycle": [...]})
+        self.paths = {}  # tick index to the trajectory table rows the path follower was started with
+
+        current = self.startup
+        complete = False
+        with open(path, "rb") as file:
+            while True:
+                try:
+                    event = pickle.load(file)
+                except (EOFError, pickle.UnpicklingError):
+                    break
+                kind = event[0]
+                if kind == "end":
+                    complete = True
+                    break
+                elif kind == "tick":
+                    current = {"controller": [], "cycle": []}
+                    self.ticks.append((event[1], event[2], current))
+                elif kind == "drive":
+                    self.drive = event
+                elif kind == "controller":
+                    current["controller"].append(event)
+                elif kind == "path":
+                    self.paths[len(self.ticks) - 1] = event[1]
+                else:
+                    current["cycle"].append(event)
+
+        if self.drive is None:
+            raise ValueError(f"{path} has no drive event, was record_drive() called?")
+        if not complete and self.ticks:
+            self.ticks.pop()
+
+    def profile(self) -> RobotProfile:
+        """
+        Gives the recorded profile, with the steer offsets that were in use.
+        """
+        data, offsets = self.drive[1], self.drive[2]
+        profile = RobotProfile.from_dict(data, source=self.path)
+        profile.modules = [module._replace(steer_offset=offsets.get(module.steer_id, module.steer_offset)) for module in profile.modules]
+        return profile
+
+    def has_path(self) -> bool:
+        """
+        Gives whether the run followed a path before the joystick. False for logs recorded before paths were.
+        """
+        return bool(self.drive[5]) if len(self.drive) > 5 else False
+
+    def feedforward(self) -> dict:
+        """
+        Gives the feedforward tables that were in use, drive motor id to FeedforwardTable. Empty for logs recorded before there were any.
+        """
+        from Swerve.ModuleModel import FeedforwardTable
+
+        tables = self.drive[4] if len(self.drive) > 4 else {}
+        return {drive_id: FeedforwardTable.from_dict(table) for drive_id, table in tables.items()}
+
+
+class ReplayAttitude:
+    """
+    A recorded IMU attitude reply, shaped like moteus_pi3hat.CanAttitudeWrapper (id -1, angles in radians).
+    """
+
+    class Euler:
+        def __init__(self, roll: float, pitch: float, yaw: float):
+            self.roll = roll
+            self.pitch = pitch
+            self.yaw = yaw
+
+    def __init__(self, roll: float, pitch: float, yaw: float):
+        self.id = -1
+        self.euler_rad = ReplayAttitude.Euler(roll, pitch, yaw)
+
+
+class _Frame:
+    # A recorded CAN reply frame, shaped like the ones the Pi3Hat hands to moteus.Command.parse().
+    def __init__(self, arbitration_id: int, bus: int, data: bytes):
+        self.arbitration_id = arbitration_id
+        self.bus = bus
+        self.data = data
+
+
+def _results(commands, replies: list) -> list:
+    parsers = {command.destination: command for command in commands if command.reply_required}
+    results = []
+    for reply in replies:
+        if reply[0] == "attitude":
+            results.append(ReplayAttitude(*reply[1:]))
+        else:
+            frame = _Frame(*reply)
+            results.append(parsers[(frame.arbitration_id >> 8) & 0x7f].parse(frame))
+    return results
+
+
+class _ReplaySource:
+    # The recorded events of the tick being replayed, consumed in order.
+    def __init__(self):
+        self.tick = -1  # -1 during startup
+        self.events = {"controller": [], "cycle": []}
+        self.index = {"controller": 0, "cycle": 0}
+        # The drive treats transport errors as faults and carries on, so the first mismatch is kept
+        # and raised again at the end of the tick, even if the drive caught it.
+        self.mismatch = None
+
+    def fail(self, message: str) -> ReplayMismatch:
+        if self.mismatch is None:
+            self.mismatch = ReplayMismatch(f"{self.where()}: {message}")
+        return self.mismatch
+
+    def begin(self, tick: int, events: dict) -> None:
+        self.tick = tick
+        self.events = events
+        self.index = {"controller": 0, "cycle": 0}
+
+    def next(self, kind: str) -> tuple:
+        index = self.index[kind]
+        events = self.events[kind]
+        if index >= len(events):
+            raise self.fail(f"{kind} #{index} was not in the recording (only {len(events)})")
+        self.index[kind] = index + 1
+        return events[index]
+
+    def finish(self) -> None:
+        if self.mismatch is not None:
+            raise self.mismatch
+        for kind, events in self.events.items():
+            if self.index[kind] != len(events):
+                raise self.fail(f"only {self.index[kind]} of {len(events)} recorded {kind} events happened")
+
+    def where(self) -> str:
+        return "startup" if self.tick < 0 else f"tick {self.tick}"
+
+
+class ReplayTransport:
+    """
+    Answers every cycle with the recorded replies, after checking its commands against the recorded ones.
+    """
+
+    def __init__(self, source: _ReplaySource):
+        self.source = source
+
+    async def cycle(self, commands, **kwargs):
+        event = self.source.next("cycle")
+        keys = [_command_key(command) for command in commands]
+        recorded, recorded_kwargs = (event[2], event[3]) if event[0] == "error" else (event[1], event[2])
+        if keys != recorded:
+            raise self.source.fail(_describe_difference(recorded, keys))
+        if kwargs != recorded_kwargs:
+            raise self.source.fail(f"cycle options {kwargs}, recorded {recorded_kwargs}")
+        if event[0] == "error":
+            raise RuntimeError(event[1])
+        return _results(commands, event[3])
+
+
+class ReplayController:
+    """
+    Gives back the recorded controller snapshots, in order.
+    """
+
+    def __init__(self, source: _ReplaySource):
+        self.source = source
+
+    def start(self, rate_hz: float = None):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_snapshot(self) -> ControllerSnapshot:
+        _, axes, buttons, timestamp = self.source.next("controller")
+        return ControllerSnapshot(axes, buttons, timestamp)
+
+    def get_axis(self, axis):
+        axes = self.get_snapshot().axes
+        return axes[axis] if axis < len(axes) else 0.0
+
+    def get_button(self, button):
+        buttons = self.get_snapshot().buttons
+        return bool(buttons[button]) if button < len(buttons) else False
+
+
+def _describe_difference(recorded: list, replayed: list) -> str:
+    for index, (expected, actual) in enumerate(zip(recorded, replayed)):
+        if expected != actual:
+            return (f"command #{index} differs, recorded servo {expected[0]} {expected[1].hex()}, "
+                    f"replayed servo {actual[0]} {actual[1].hex()}")
+    return f"recorded {len(recorded)} commands, replayed {len(replayed)}"
+
+
+async def default_tick(swerve_drive, dt: float) -> None:
+    """
+    The joystick tick of main.py without a path.
+    """
+    await swerve_drive.teleop_periodic(dt)
+    await swerve_drive.swerve_drive_periodic()
+
+
+async def replay(path: str, tick=None) -> int:
+    """
+    Replays a log through a new SwerveDrive, as fast as possible.
+
+    :param path (str): A log written by ReplayRecorder.
+    :param tick (function): The coroutine function run every tick with (swerve_drive, dt), the same as in the recorded run.
+        The tick of main.py if not given, following the recorded path if the run had one.
+
+    :return int: How many ticks were replayed.
+
+    :raises ReplayMismatch: At the first command frame, cycle or controller read that differs from the recording.
+    """
+    from Swerve.SwerveDrive import SwerveDrive
+    from Swerve.Trajectory import PathThenTeleop, TrajectoryTable
+
+    log = ReplayLog(path)
+    source = _ReplaySource()
+    source.begin(-1, log.startup)
+    clock = TickClock(log.drive[3])
+    swerve_drive = SwerveDrive(transport=ReplayTransport(source), controller=ReplayController(source),
+                               profile=log.profile(), steer_offset_path=None, clock=clock, feedforward=log.feedforward())
+
+    drive_tick = None
+    if tick is None:
+        drive_tick = PathThenTeleop(swerve_drive, has_path=log.has_path())
+
+    await swerve_drive.initialize_modules()
+    source.finish()
+    for index, (now, dt, events) in enumerate(log.ticks):
+        source.begin(index, events)
+        clock.set(now)
+        if drive_tick is None:
+            await tick(swerve_drive, dt)
+        else:
+            if index in log.paths:
+                drive_tick.start(TrajectoryTable(np.array(log.paths[index])))
+            await drive_tick.tick(dt)
+        source.finish()
+    return len(log.ticks)
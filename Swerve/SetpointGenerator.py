@@ -0,0 +1,137 @@
+import math
+import Utils.Constants as Constants
+
+"""
+Acceleration and jerk limiting of chassis speed setpoints.
+
+Joystick (or any other) chassis speeds go through the generator before the kinematics, so the
+whole chassis ramps as one: every module state of a tick comes from the same limited chassis speeds,
+and no module is asked for a change the others cannot follow. The servos' own accel_limit then only
+has to track, instead of each wheel ramping on its own and the chassis skidding when one lags.
+
+Translation is limited as a vector in the chassis frame, so a diagonal move ramps along its
+direction instead of one axis finishing first. The acceleration itself is ramped at the jerk limit,
+and eased off ahead of the target, so the speed settles on the target instead of overshooting.
+
+Each update only does float arithmetic on the generator's own attributes: no lists, tuples or
+other objects are created per tick.
+
+Example usage:
+    generator = ChassisSetpointGenerator.from_profile(swerve_drive.profile)
+    generator.update(vx, vy, omega, dt)  # every tick
+    await swerve_drive.set_drive_speeds(generator.vx, generator.vy, generator.omega, False, dt)
+"""
+
+
+def _ramp_down_accel(error: float, max_jerk: float, dt: float) -> float:
+    # The largest acceleration that, stepped down to zero over a whole number of ticks without changing by more
+    # than max_jerk * dt a tick, covers exactly the error: n ticks of a, a (n - 1) / n, ..., a / n cover a dt (n + 1) / 2.
+    if math.isinf(max_jerk):
+        return math.inf
+    ticks = math.ceil(0.5 * (math.sqrt(1.0 + 8.0 * error / (max_jerk * dt * dt)) - 1.0))
+    return 2.0 * error / (dt * (ticks + 1))
+
+
+class ChassisSetpointGenerator:
+    def __init__(self,
+                 max_accel: float = Constants.CHASSIS_ACCEL_LIMIT,
+                 max_jerk: float = Constants.CHASSIS_JERK_LIMIT,
+                 max_angular_accel: float = Constants.CHASSIS_ANGULAR_ACCEL_LIMIT,
+                 max_angular_jerk: float = Constants.CHASSIS_ANGULAR_JERK_LIMIT):
+        """
+        Constructs a setpoint generator, starting at rest.
+
+        :param max_accel (float): The largest linear acceleration of the chassis, in m/s².
+        :param max_jerk (float): How fast the linear acceleration may change, in m/s³. math.inf for no jerk limit.
+        :param max_angular_accel (float): The largest angular acceleration of the chassis, in rad/s².
+        :param max_angular_jerk (float): How fast the angular acceleration may change, in rad/s³. math.inf for no jerk limit.
+        """
+        self.max_accel = max_accel
+        self.max_jerk = max_jerk
+        self.max_angular_accel = max_angular_accel
+        self.max_angular_jerk = max_angular_jerk
+        self.reset()
+
+    @classmethod
+    def from_profile(cls, profile) -> "ChassisSetpointGenerator":
+        """
+        Constructs a setpoint generator with the chassis limits of a robot profile.
+        """
+        return cls(profile.chassis_accel_limit, profile.chassis_jerk_limit,
+                   profile.chassis_angular_accel_limit, profile.chassis_angular_jerk_limit)
+
+    def reset(self, vx: float = 0.0, vy: float = 0.0, omega: float = 0.0) -> None:
+        """
+        Starts again from the given chassis speeds, with no acceleration, e.g. after the drive was stopped
+        or when taking over from a path follower.
+        """
+        self.vx = vx  # m/s forward
+        self.vy = vy  # m/s left
+        self.omega = omega  # rad/s counterclockwise
+        self.ax = 0.0  # m/s²
+        self.ay = 0.0
+        self.alpha = 0.0  # rad/s²
+
+    def update(self, vx: float, vy: float, omega: float, dt: float) -> None:
+        """
+        Moves the setpoint one tick towards the target chassis speeds. The new setpoint is in vx, vy and omega.
+
+        :param vx (float): Target forward speed in m/s.
+        :param vy (float): Target left speed in m/s.
+        :param omega (float): Target counterclockwise turn speed in rad/s.
+        :param dt (float): The time since the last update in seconds.
+        """
+        if dt <= 0.0:
+            return
+
+        # Translation, as one vector.
+        error_x = vx - self.vx
+        error_y = vy - self.vy
+        error = math.hypot(error_x, error_y)
+        if error > 0.0:
+            # The acceleration that would close the error this tick, capped at max_accel, and at what can
+            # still be ramped down to zero at the jerk limit before reaching the target.
+            accel = min(error / dt, self.max_accel, _ramp_down_accel(error, self.max_jerk, dt))
+            target_ax = error_x / error * accel
+            target_ay = error_y / error * accel
+        else:
+            target_ax = target_ay = 0.0
+
+        change_x = target_ax - self.ax
+        change_y = target_ay - self.ay
+        change = math.hypot(change_x, change_y)
+        max_change = self.max_jerk * dt
+        if change > max_change:
+            scale = max_change / change
+            change_x *= scale
+            change_y *= scale
+        self.ax += change_x
+        self.ay += change_y
+
+        step_x = self.ax * dt
+        step_y = self.ay * dt
+        if step_x * error_x + step_y * error_y >= error * error:
+            # Reaches (or passes) the target this tick.
+            self.vx = vx
+            self.vy = vy
+            self.ax = self.ay = 0.0
+        else:
+            self.vx += step_x
+            self.vy += step_y
+
+        # Rotation, the same in one dimension.
+        error = omega - self.omega
+        if error == 0.0:
+            self.alpha = 0.0
+            return
+        magnitude = abs(error)
+        target_alpha = math.copysign(min(magnitude / dt, self.max_angular_accel, _ramp_down_accel(magnitude, self.max_angular_jerk, dt)), error)
+        max_change = self.max_angular_jerk * dt
+        self.alpha += min(max(target_alpha - self.alpha, -max_change), max_change)
+
+        step = self.alpha * dt
+        if step * error >= error * error:
+            self.omega = omega
+            self.alpha = 0.0
+        else:
+            self.omega += step
@@ -0,0 +1,424 @@
+import asyncio
+import math
+import struct
+import time
+import moteus
+import moteus.multiplex as mp
+from wpimath.geometry import Rotation2d
+from wpimath.kinematics import SwerveModuleState
+import Utils.Constants as Constants
+
+"""
+A hardware-free stand-in for the Pi3Hat transport.
+
+Implements the moteus.Transport cycle() contract: commands are decoded from their real
+multiplex register frames, every servo runs a first-order position/velocity model, and
+query replies are encoded back into register frames and parsed by each command's own parser,
+so the rest of the code cannot tell it apart from a Pi3HatRouter.
+"""
+
+_TYPES = [struct.Struct('<b'), struct.Struct('<h'), struct.Struct('<i'), struct.Struct('<f')]
+_INT_MIN = [-128, -32768, -2147483648]
+_INT_MAX = [127, 32767, 2147483647]
+
+# int8/int16/int32 scales of the registers the simulation reads or writes (F32 is always unscaled).
+_POSITION_SCALES = (0.01, 0.0001, 0.00001)
+_VELOCITY_SCALES = (0.1, 0.00025, 0.00001)
+_TORQUE_SCALES = (0.5, 0.01, 0.001)
+_TEMPERATURE_SCALES = (1.0, 0.1, 0.001)
+_SCALES = {
+    moteus.Register.POSITION: _POSITION_SCALES,
+    moteus.Register.VELOCITY: _VELOCITY_SCALES,
+    moteus.Register.TORQUE: _TORQUE_SCALES,
+    moteus.Register.VOLTAGE: (0.5, 0.1, 0.001),
+    moteus.Register.TEMPERATURE: _TEMPERATURE_SCALES,
+    moteus.Register.MOTOR_TEMPERATURE: _TEMPERATURE_SCALES,
+    moteus.Register.COMMAND_POSITION: _POSITION_SCALES,
+    moteus.Register.COMMAND_VELOCITY: _VELOCITY_SCALES,
+    moteus.Register.COMMAND_FEEDFORWARD_TORQUE: _TORQUE_SCALES,
+    moteus.Register.COMMAND_STOP_POSITION: _POSITION_SCALES,
+    moteus.Register.COMMAND_TIMEOUT: (0.01, 0.001, 0.000001),
+    moteus.Register.COMMAND_VELOCITY_LIMIT: _VELOCITY_SCALES,
+    moteus.Register.COMMAND_ACCEL_LIMIT: (0.05, 0.001, 0.00001),
+}
+
+
+def _read_varuint(data: bytes, offset: int):
+    result = 0
+    shift = 0
+    while True:
+        this_byte = data[offset]
+        offset += 1
+        result |= (this_byte & 0x7f) << shift
+        shift += 7
+        if not this_byte & 0x80:
+            return result, offset
+
+
+def _write_varuint(out: bytearray, value: int) -> None:
+    while True:
+        this_byte = value & 0x7f
+        value >>= 7
+        out.append(this_byte | (0x80 if value else 0x00))
+        if value == 0:
+            return
+
+
+def decode_frame(data: bytes):
+    """
+    Decodes the write and read subframes of a moteus multiplex command.
+
+    :param data (bytes): The data of a moteus.Command.
+
+    :return tuple: A dict of written {register: value} (scaled to physical units), and a list of (register, resolution) to reply with.
+    """
+    writes = {}
+    reads = []
+    offset = 0
+    while offset < len(data):
+        cmd = data[offset]
+        offset += 1
+        upper = cmd & 0xf0
+        if upper == 0x50:  # NOP
+            continue
+        if upper != 0x00 and upper != 0x10:
+            break  # Not something a servo command carries, stop parsing.
+
+        resolution = (cmd >> 2) & 0x03
+        count = cmd & 0x03
+        if count == 0:
+            count, offset = _read_varuint(data, offset)
+        register, offset = _read_varuint(data, offset)
+
+        for i in range(count):
+            if upper == 0x10:
+                reads.append((register + i, resolution))
+                continue
+
+            value = _TYPES[resolution].unpack_from(data, offset)[0]
+            offset += _TYPES[resolution].size
+            if resolution != mp.F32 and (register + i) in _SCALES:
+                value = math.nan if value == _INT_MIN[resolution] else value * _SCALES[register + i][resolution]
+            writes[register + i] = value
+
+    return writes, reads
+
+
+def encode_reply(values: dict, reads: list) -> bytes:
+    """
+    Encodes register values into a moteus multiplex reply frame.
+
+    :param values (dict): The current {register: value} of the servo, in physical units.
+    :param reads (list): The (register, resolution) pairs that were asked for.
+
+    :return bytes: The reply frame data.
+    """
+    out = bytearray()
+    for register, resolution in reads:
+        value = values.get(register, 0)
+        out.append(0x20 | (resolution << 2) | 0x01)
+        _write_varuint(out, register)
+        if resolution == mp.F32:
+            out += _TYPES[resolution].pack(float(value))
+            continue
+
+        scale = _SCALES[register][resolution] if register in _SCALES else 1.0
+        if value is None or math.isnan(value):
+            raw = _INT_MIN[resolution]
+        else:
+            raw = max(_INT_MIN[resolution] + 1, min(_INT_MAX[resolution], int(round(value / scale))))
+        out += _TYPES[resolution].pack(raw)
+    return bytes(out)
+
+
+class SimFrame:
+    """
+    A CAN reply frame, shaped like the ones the Pi3Hat hands to moteus.Command.parse().
+    """
+
+    def __init__(self, arbitration_id: int, data: bytes, bus: int):
+        self.arbitration_id = arbitration_id
+        self.data = data
+        self.bus = bus
+
+
+class SimEuler:
+    def __init__(self, roll: float, pitch: float, yaw: float):
+        self.roll = roll
+        self.pitch = pitch
+        self.yaw = yaw
+
+
+class SimAttitude:
+    """
+    An IMU attitude reply, shaped like moteus_pi3hat.CanAttitudeWrapper (id -1, angles in radians).
+    """
+
+    def __init__(self, yaw: float, yaw_rate: float):
+        self.id = -1
+        self.euler_rad = SimEuler(0.0, 0.0, yaw)
+        self.rate_dps = SimEuler(0.0, 0.0, math.degrees(yaw_rate))
+
+
+class SimServo:
+    """
+    A first-order model of a single moteus servo in position mode.
+
+    Velocity follows its target with time constant `time_constant`, limited by the commanded
+    velocity and acceleration limits. A finite position target adds a proportional term on the
+    position error, capped at the speed the servo can still stop from within its acceleration limit. The moteus command watchdog is modeled: a servo that does not get a new
+    position command within its watchdog_timeout goes to TIMEOUT mode and decelerates to a stop.
+    """
+
+    def __init__(self, servo_id: int, bus: int, time_constant: float = 0.02, position_gain: float = 20.0,
+                 inertia: float = 0.001):
+        self.id = servo_id
+        self.bus = bus
+        self.time_constant = time_constant
+        self.position_gain = position_gain
+        self.inertia = inertia  # kg*m², only used to report a torque
+
+        self.mode = moteus.Mode.STOPPED
+        self.position = 0.0
+        self.velocity = 0.0
+        self.torque = 0.0
+        self.voltage = 24.0
+        self.temperature = 30.0
+        self.fault = 0
+        self.online = True  # Set to False to simulate a servo that stopped replying.
+
+        self.target_position = math.nan
+        self.target_velocity = 0.0
+        self.velocity_limit = math.nan
+        self.accel_limit = math.nan
+        self.watchdog_timeout = math.nan
+        self.last_command_time = 0.0
+
+        # Registers that are not part of the model (firmware version, config, ...) can be set here.
+        self.registers = {
+            moteus.Register.MODEL_NUMBER: 0x0000,
+            moteus.Register.FIRMWARE_VERSION: Constants.MIN_FIRMWARE_VERSION,
+            moteus.Register.REGISTER_MAP_VERSION: Constants.REGISTER_MAP_VERSION,
+        }
+
+    def apply(self, writes: dict, now: float) -> None:
+        """
+        Applies the register writes of a command.
+        """
+        mode = writes.get(moteus.Register.MODE)
+        if mode is not None:
+            self.mode = int(mode)
+            if self.mode == moteus.Mode.STOPPED:
+                self.fault = 0  # Like moteus, a stop command clears faults.
+            elif self.fault:
+                self.mode = moteus.Mode.FAULT
+            if self.mode == moteus.Mode.POSITION:
+                self.target_position = writes.get(moteus.Register.COMMAND_POSITION, math.nan)
+                velocity = writes.get(moteus.Register.COMMAND_VELOCITY, 0.0)
+                self.target_velocity = 0.0 if math.isnan(velocity) else velocity
+                self.velocity_limit = writes.get(moteus.Register.COMMAND_VELOCITY_LIMIT, math.nan)
+                self.accel_limit = writes.get(moteus.Register.COMMAND_ACCEL_LIMIT, math.nan)
+                self.watchdog_timeout = writes.get(moteus.Register.COMMAND_TIMEOUT, math.nan)
+                self.last_command_time = now
+
+        for register, value in writes.items():
+            if register == moteus.Register.SET_OUTPUT_NEAREST or register == moteus.Register.SET_OUTPUT_EXACT:
+                self.position = value
+                self.target_position = math.nan
+            elif register != moteus.Register.MODE:
+                self.registers[register] = value
+
+    def step(self, dt: float, now: float) -> None:
+        """
+        Advances the model by dt seconds.
+        """
+        if dt <= 0.0:
+            return
+
+        if (self.mode == moteus.Mode.POSITION and self.watchdog_timeout > 0.0
+                and now - self.last_command_time > self.watchdog_timeout):
+            self.mode = moteus.Mode.TIMEOUT
+
+        if self.mode == moteus.Mode.POSITION:
+            target = self.target_velocity
+            if not math.isnan(self.target_position):
+                error = self.target_position - self.position
+                correction = self.position_gain * abs(error)
+                if self.accel_limit >= 0.0:
+                    # Like the moteus trajectory planner, never go faster than we can still stop from.
+                    correction = min(correction, math.sqrt(2.0 * self.accel_limit * abs(error)))
+                target += math.copysign(correction, error)
+            if self.velocity_limit >= 0.0:
+                target = max(-self.velocity_limit, min(self.velocity_limit, target))
+            accel_limit = self.accel_limit
+        elif self.mode == moteus.Mode.TIMEOUT:
+            target = 0.0
+            accel_limit = self.accel_limit
+        else:
+            # Stopped or faulted, the rotor just coasts down.
+            target = 0.0
+            accel_limit = math.nan
+
+        delta = (target - self.velocity) * (1.0 - math.exp(-dt / self.time_constant))
+        if accel_limit >= 0.0:
+            delta = max(-accel_limit * dt, min(accel_limit * dt, delta))
+
+        self.position += (self.velocity + 0.5 * delta) * dt
+        self.velocity += delta
+        self.torque = self.inertia * delta / dt * 2.0 * math.pi
+
+    def values(self) -> dict:
+        """
+        Gives the register values a query reply would report.
+        """
+        values = dict(self.registers)
+        values[moteus.Register.MODE] = int(self.mode)
+        values[moteus.Register.POSITION] = self.position
+        values[moteus.Register.VELOCITY] = self.velocity
+        values[moteus.Register.TORQUE] = self.torque
+        values[moteus.Register.VOLTAGE] = self.voltage
+        values[moteus.Register.TEMPERATURE] = self.temperature
+        values[moteus.Register.MOTOR_TEMPERATURE] = self.temperature
+        values[moteus.Register.FAULT] = self.fault
+        values[moteus.Register.TRAJECTORY_COMPLETE] = int(
+            not math.isnan(self.target_position) and abs(self.target_position - self.position) < 1e-3)
+        return values
+
+
+class SimTransport:
+    """
+    A simulated moteus transport that can be passed to SwerveDrive(transport=...).
+
+    Every cycle advances all servos to the current time, applies the commands, waits for the
+    simulated CAN latency of the busiest bus (buses run in parallel, like on the Pi3Hat), and
+    returns the query replies, plus an IMU attitude reply if request_attitude is set.
+
+    Example usage:
+        transport = SimTransport(Constants.SERVO_BUS_MAP, modules=[(11, 12), (13, 14), (15, 16), (17, 18)])
+        swerve_drive = SwerveDrive(transport=transport)
+    """
+
+    @classmethod
+    def from_profile(cls, profile, **kwargs) -> "SimTransport":
+        """
+        Constructs a simulated transport with the servos, modules and geometry of a robot profile.
+
+        :param profile (RobotProfile): The robot to simulate.
+        :param kwargs: Passed on to the constructor (bus_latency, frame_time, ...).
+        """
+        return cls(profile.servo_bus_map, modules=profile.module_ids, profile=profile, **kwargs)
+
+    def __init__(self,
+                 servo_bus_map: dict,
+                 modules: list = None,
+                 bus_latency: dict = None,
+                 frame_time: float = 0.0,
+                 clock=time.monotonic,
+                 max_step: float = 0.001,
+                 profile=None,
+                 **servo_kwargs):
+        """
+        Constructs a simulated transport.
+
+        :param servo_bus_map (dict): Bus number to list of servo ids, the same as for Pi3HatRouter.
+        :param modules (list): (drive_id, steer_id) of each module, in kinematics order. If given, the IMU yaw follows the simulated chassis.
+        :param bus_latency (dict): Fixed latency of each bus per cycle, in seconds. Buses that are not listed have no latency.
+        :param frame_time (float): Extra latency per frame sent on a bus, in seconds.
+        :param clock (function): Gives the current time in seconds, used to advance the servo models.
+        :param max_step (float): Longest integration step of the servo models, in seconds.
+        :param profile (RobotProfile): The robot geometry used to integrate the IMU yaw. RobotProfile.default() if not given.
+        :param servo_kwargs: Passed to every SimServo (time_constant, position_gain, inertia).
+        """
+        self.servos = {}
+        for bus, servo_ids in servo_bus_map.items():
+            for servo_id in servo_ids:
+                self.servos[servo_id] = SimServo(servo_id, bus, **servo_kwargs)
+
+        if profile is None:
+            from Utils.RobotProfile import RobotProfile
+            profile = RobotProfile.default()
+        self.profile = profile
+        self.modules = modules or []
+        self.bus_latency = bus_latency or {}
+        self.frame_time = frame_time
+        self.clock = clock
+        self.max_step = max_step
+
+        self.yaw = 0.0
+        self.yaw_rate = 0.0
+        self.cycles = 0
+        self._last_time = None
+
+    def _advance(self) -> float:
+        now = self.clock()
+        if self._last_time is None:
+            self._last_time = now
+        dt = now - self._last_time
+        self._last_time = now
+
+        # Integrate in small steps, cycles can be far apart (or not happen at all while idle).
+        steps = max(1, math.ceil(dt / self.max_step))
+        for i in range(steps):
+            step_time = now - dt + (i + 1) * dt / steps
+            for servo in self.servos.values():
+                servo.step(dt / steps, step_time)
+
+        if self.modules and dt > 0.0:
+            self.yaw_rate = self._chassis_yaw_rate()
+            self.yaw = math.remainder(self.yaw + self.yaw_rate * dt, 2.0 * math.pi)
+        return now
+
+    def _chassis_yaw_rate(self) -> float:
+        meters_per_rev = self.profile.meters_per_drive_rev
+        states = [
+            SwerveModuleState(
+                self.servos[drive_id].velocity * meters_per_rev,
+                Rotation2d.fromRotations(self.servos[steer_id].position - module.steer_offset))
+            for (drive_id, steer_id), module in zip(self.modules, self.profile.modules)
+        ]
+        return self.profile.kinematics.toChassisSpeeds(tuple(states)).omega
+
+    def _latency(self, commands) -> float:
+        frames_per_bus = {}
+        for command in commands:
+            servo = self.servos.get(command.destination)
+            if servo is not None:
+                frames_per_bus[servo.bus] = frames_per_bus.get(servo.bus, 0) + 1
+
+        latency = 0.0
+        for bus, frames in frames_per_bus.items():
+            latency = max(latency, self.bus_latency.get(bus, 0.0) + frames * self.frame_time)
+        return latency
+
+    async def cycle(self, commands, request_attitude: bool = False, **kwargs):
+        """
+        Sends commands to the simulated servos and returns their replies.
+
+        :param commands (list): moteus.Command objects, as made by moteus.Controller.make_*().
+        :param request_attitude (bool): Also return an IMU attitude reply (id -1).
+
+        :return list: The parsed replies of every command that required one.
+        """
+        now = self._advance()
+
+        replies = []
+        for command in commands:
+            servo = self.servos.get(command.destination)
+            if servo is None or not servo.online:
+                continue  # Nobody on the bus with that id, so no reply.
+
+            writes, reads = decode_frame(command.data)
+            servo.apply(writes, now)
+            if command.reply_required and reads:
+                arbitration_id = (servo.id << 8) | command.source
+                replies.append((command, SimFrame(arbitration_id, encode_reply(servo.values(), reads), servo.bus)))
+
+        latency = self._latency(commands)
+        if latency > 0.0:
+            await asyncio.sleep(latency)
+
+        self.cycles += 1
+        results = [command.parse(frame) for command, frame in replies]
+        if request_attitude:
+            results.append(SimAttitude(self.yaw, self.yaw_rate))
+        return results
@@ -0,0 +1,115 @@
+import json
+import math
+import os
+
+"""
+Continuous steer position tracking and shortest-path steer targets for one swerve module.
+
+The steer motor position is unwrapped from telemetry (so a motor configured to wrap its position,
+or a position that jumps by whole turns, still gives one continuous value) and every new module
+angle is sent as the nearest motor position that points the wheel that way. A target of -179
+degrees after 179 degrees then turns the wheel 2 degrees instead of spinning it 358 degrees back.
+
+Steer positions are in module revolutions: the steer servo applies the gearing itself (its
+motor_position.rotor_to_output_ratio), so one revolution it reports is one turn of the wheel about the steer axis.
+"""
+
+
+class SteerController:
+    def __init__(self, offset: float = 0.0):
+        """
+        Constructs a steer controller.
+
+        :param offset (float): The steer motor position when the wheel points forward, in revolutions.
+        """
+        self.offset = offset
+        self.raw_position = math.nan  # the last position the motor reported, in revolutions
+        self.position = math.nan  # the unwrapped motor position, in revolutions
+        self.target = math.nan  # the last motor position sent as a target, in revolutions
+
+    def update(self, raw_position: float) -> None:
+        """
+        Updates the unwrapped position from a telemetry snapshot. Does not go to the bus.
+
+        :param raw_position (float): The steer motor position from its last reply, in revolutions.
+        """
+        if math.isnan(raw_position):
+            return
+        if math.isnan(self.position):
+            self.position = raw_position
+        else:
+            self.position += math.remainder(raw_position - self.raw_position, 1.0)
+        self.raw_position = raw_position
+
+    def angle(self) -> float:
+        """
+        Gives the module angle the wheel points at now.
+
+        :return float: The angle in radians, from -pi to pi.
+        """
+        return math.remainder((self.position - self.offset) * 2.0 * math.pi, 2.0 * math.pi)
+
+    def target_for(self, angle_rad: float) -> float:
+        """
+        Gives the motor position to command for a module angle: the one nearest to the last target
+        (or to the measured position, if there is none yet), so the wheel never turns more than half a turn.
+
+        The target is computed against the last target rather than the measured position, so an unchanged
+        angle gives exactly the same target every tick, and repeated commands can be suppressed.
+
+        :param angle_rad (float): The module angle to point the wheel at, in radians.
+
+        :return float: The steer motor position target, in raw motor revolutions.
+        """
+        reference = self.target
+        if math.isnan(reference):
+            reference = self.raw_position if not math.isnan(self.raw_position) else self.offset
+        wheel_reference = reference - self.offset
+        self.target = reference + math.remainder(angle_rad / (2.0 * math.pi) - wheel_reference, 1.0)
+        return self.target
+
+    def reset_target(self) -> None:
+        """
+        Forgets the last target, e.g. after the motor was stopped and may have been moved by hand.
+        """
+        self.target = math.nan
+
+    def calibrate(self) -> float:
+        """
+        Takes the current steer position as pointing forward, and gives the new offset.
+
+        :return float: The new offset, in revolutions from -0.5 to 0.5.
+        """
+        self.offset = math.remainder(self.raw_position, 1.0)
+        self.reset_target()
+        return self.offset
+
+
+def load_steer_offsets(path: str) -> dict:
+    """
+    Loads calibrated steer offsets.
+
+    :param path (str): The offset file written by save_steer_offsets().
+
+    :return dict: Steer motor id to offset in revolutions. Empty if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return {int(steer_id): float(offset) for steer_id, offset in json.load(file).items()}
+
+
+def save_steer_offsets(path: str, offsets: dict) -> None:
+    """
+    Saves calibrated steer offsets, replacing the file in one step so it is never left half written.
+
+    :param path (str): The offset file.
+    :param offsets (dict): Steer motor id to offset in revolutions.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as file:
+        json.dump({str(steer_id): offset for steer_id, offset in sorted(offsets.items())}, file, indent=4)
+    os.replace(temporary_path, path)
@@ -1,197 +1,598 @@
 import moteus
-import moteus_pi3hat
 import asyncio
 from Swerve.SwerveModule import SwerveModule
+from Swerve.BusDispatcher import BusDispatcher
+from Swerve.FaultManager import FaultManager
+from Swerve.SwerveKinematics import SwerveKinematics
+from Swerve.SetpointGenerator import ChassisSetpointGenerator
+from Swerve.HeadingController import HeadingController
+from Swerve.SteerController import load_steer_offsets, save_steer_offsets
+from Swerve.ModuleModel import load_feedforward
 import Utils.Constants as Constants
-import wpimath.estimator as estimator
+from Utils.RobotProfile import RobotProfile
+from Utils.Profiler import profiler
 from wpimath.geometry import Pose2d, Rotation2d
 import wpimath.kinematics 
-from wpimath.geometry import Pose3d, Rotation3d
 import math
-import wpilib
-import numpy as np
+import time
 
 
 from Utils.Controller import Controller
 
 class SwerveDrive:
-    def __init__(self):
-        self.transport: moteus.Transport = moteus_pi3hat.Pi3HatRouter(
-            servo_bus_map={
-                1: [11, 12], # Bus 1, Motor ids 11 and 12
-                2: [13, 14], # Bus 2, Motor ids 13 and 14
-                3: [15, 16], # Bus 3, Motor ids 15 and 16
-                4: [17, 18],  # Bus 4, Motor ids 17 and 18
-            }
-        )
+    def __init__(self, transport: moteus.Transport = None, controller: Controller = None, profile: RobotProfile = None,
+                 steer_offset_path: str = Constants.STEER_OFFSET_PATH, clock=time.monotonic,
+                 feedforward_path: str = Constants.FEEDFORWARD_PATH, feedforward: dict = None, fast_path: bool = Constants.FAST_PATH):
+        """
+        Constructs the swerve drive.
+
+        :param transport (moteus.Transport): The transport to talk to the motors through. A Pi3HatRouter using the bus map of the profile if not given.
+        :param controller (Controller): The controller to drive with. A pygame Controller if not given.
+        :param profile (RobotProfile): The geometry, CAN layout and limits of the robot. RobotProfile.default() (Utils/Constants.py) if not given.
+        :param steer_offset_path (str): Where calibrated steer offsets are kept, overriding the offsets of the profile. None to only use the profile (e.g. in simulation).
+        :param clock (function): Gives the current time in seconds. Everything the drive decides from the time reads this clock, so a replay can supply the recorded one.
+        :param feedforward_path (str): Where characterized drive feedforward tables are kept (see characterize.py). None to only use the drive gains of the profile.
+        :param feedforward (dict): Drive motor id to FeedforwardTable, instead of loading feedforward_path (e.g. the tables of a recording).
+        :param fast_path (bool): Reuse the command frames, module positions and heading Rotation2d of every tick instead of allocating
+            new ones. The wire bytes and odometry are the same either way, but objects handed out by getPosition() change under the caller.
+        """
+        self.profile = profile if profile is not None else RobotProfile.default()
+        self.steer_offset_path = steer_offset_path
+        self.feedforward_path = feedforward_path
+        self.feedforward = feedforward
+        self.clock = clock
+        self.fast_path = fast_path
+        if transport is None:
+            # Only importable on the Pi, so the drive can still be built on a dev machine with a simulated transport.
+            import moteus_pi3hat
+            transport = moteus_pi3hat.Pi3HatRouter(servo_bus_map=self.profile.servo_bus_map)
+        self.transport: moteus.Transport = transport
+        self.dispatcher = BusDispatcher(self.transport, self.profile.servo_bus_map)
+        self.fault_manager = FaultManager(len(self.profile.modules))
+        self.kinematics = SwerveKinematics(self.profile.translations, self.profile.max_speed)
+        self.setpoint_generator = ChassisSetpointGenerator.from_profile(self.profile)
+        self.heading_controller = HeadingController.from_profile(self.profile)
 
-        #need to add controller
-        self.controller = Controller()
+        self.controller = controller if controller is not None else Controller()
+        self.controller.start(Constants.CONTROLLER_RATE_HZ)
         self.modules = []
-        # pose_estimator: estimator.SwerveDrive4PoseEstimatorBase | None = None
-        # pose_estimator_3d: estimator.SwerveDrive4PoseEstimator3dBase | None = None
 
-        # states = [wpimath.kinematics.SwerveModuleState() for _ in range(4)]
-        # set_states = [wpimath.kinematics.SwerveModuleState() for _ in range(4)]
+        # Buffers every tick reuses (sized in initialize_modules()), so the hot loop allocates as little as it can.
+        self._speeds = [0.0, 0.0, 0.0]
+        self._module_angles = []
+        self.module_speeds = []  # m/s, the module targets of the last set_drive_speeds()
+        self.module_angles = []  # radians
+        self._results_by_id = {}
+        self._commanded_ids = set()
+        self._positions = ()
+        self._yaw_rotation = Rotation2d(0.0)
 
-        # self.pose_estimator = self.initialize_pose_estimator()
-        # self.pose_estimator_3d = self.initialize_pose_estimator_3d()
-        # self.field = wpilib.Field2d()
+        # Heading from the IMU attitude reply of the last cycle that carried one.
+        self.yaw = 0.0  # radians
+        self.yaw_timestamp = 0.0
+        # The yaw at which the robot faces field forward, see reset_heading().
+        self.heading_offset = 0.0  # radians
 
-        # self.robot_pos = Pose2d(0.0, 0.0, Rotation2d.fromDegrees(0.0))
-        # self.robot_pos_3d = Pose3d(0.0, 0.0, 0.0, Rotation3d(0.0, 0.0, 0.0))
+        # The controller snapshot of the last getControllerSpeeds(), so buttons need no second read.
+        self.controller_snapshot = None
+        self.reset_heading_held = False
+
+        # Imported lazily in initialize_pose_estimator(), to keep it out of the import time.
+        self.pose_estimator: "wpimath.estimator.SwerveDrive4PoseEstimator" = None
+        self.robot_pos = Pose2d(0.0, 0.0, Rotation2d.fromDegrees(0.0))
+
+        # What each servo reported during discover_servos(), and how long each startup phase took in seconds.
+        self.servo_info = {}
+        self.servo_config = {}  # from verify_servo_config()
+        self.startup_timings = {}
+        self.command_stats_start = time.monotonic()
 
-    # this is not my code maybe delete later
     async def stop(self):
         """
-        Stops all swerve modules.
+        Stops all swerve modules, with one bus cycle for all eight motors.
         """
-        [
-            await module.stop() for module in self.modules
-        ]
+        self.setpoint_generator.reset()
+        self.heading_controller.reset()
+        for module in self.modules:
+            module.request_stop()
+        await self.sync_all(request_attitude=False)
 
-    async def setAll(self, speeds, angles):
-        """
-        Sets the speed and angle of each swerve module.
+    async def sync_all(self, request_attitude: bool = True) -> list:
         """
-        [
-            await module.set(speed, angle, self.transport)
-            for module, speed, angle in zip(self.modules, speeds, angles)
-        ]
+        Turns the intent of every module (see SwerveModule.set_target()) into exactly one transport cycle.
 
-    async def setModule(self, index, speed, angle):
-        """
-        Sets the speed and angle of a specific swerve module.
-        """
-        await self.modules[index].set(speed, angle, self.transport)
+        Modules without an intent are queried, modules the fault manager stopped get stop commands
+        instead of their target, and every intent is cleared once it is sent.
 
-    async def getModulePosition(self, index):
-        """
-        Gets the position of a specific swerve module.
+        :param request_attitude (bool): Also request the IMU attitude, for the heading.
+
+        :return list: The results of the cycle, empty if the transport raised.
         """
-        return await self.modules[index].getPosition()
-    
+        # A fresh list every cycle: the transport (and a recording of it) may hold on to the one it was given.
+        span = profiler.start()
+        commands = []
+        should_command = self.fault_manager.should_command
+        for index, module in enumerate(self.modules):
+            module.add_intent_commands(commands, should_command(index))
+        profiler.stop("module_commands", span)
+        if request_attitude:
+            return await self.cycle(commands, request_attitude=True)
+        return await self.cycle(commands)
+
     async def getControllerSpeeds(self):
         """
         Uses the controller to set the speeds of the swerve modules based on joystick input.
+
+        Reads the latest controller snapshot without blocking and applies deadband and expo shaping.
+        If no new input has arrived within CONTROLLER_TIMEOUT, zero speeds are returned instead.
+        """
+        span = profiler.start()
+        snapshot = self.controller.get_snapshot()
+        self.controller_snapshot = snapshot
+        axes = snapshot.axes
+        # The same list every tick, overwritten in place.
+        speeds = self._speeds
+        if self.clock() - snapshot.timestamp > Constants.CONTROLLER_TIMEOUT or len(axes) <= Controller.RIGHT_X:
+            speeds[0] = speeds[1] = speeds[2] = 0.0
+            profiler.stop("controller", span)
+            return speeds
+
+        speeds[0] = Controller.shape_axis(axes[Controller.LEFT_X], Constants.CONTROLLER_DEADBAND, Constants.CONTROLLER_EXPO)  # forward
+        speeds[1] = Controller.shape_axis(axes[Controller.LEFT_Y], Constants.CONTROLLER_DEADBAND, Constants.CONTROLLER_EXPO)  # left
+        speeds[2] = Controller.shape_axis(axes[Controller.RIGHT_X], Constants.CONTROLLER_DEADBAND, Constants.CONTROLLER_EXPO)  # turn
+
+        profiler.stop("controller", span)
+        return speeds
+
+    async def teleop_periodic(self, dt: float = Constants.LOOP_PERIOD):
+        """
+        Drives one tick from the controller: reads the latest snapshot, ramps the chassis speeds towards it
+        within the chassis acceleration and jerk limits of the profile, and sends the module targets.
+        Field oriented and with heading hold if the profile says so. Still one bus cycle per tick either way.
+
+        :param dt (float): The time since the last tick in seconds.
         """
-        forward_speed = self.controller.get_axis(Controller.LEFT_X)
-        left_speed = self.controller.get_axis(Controller.LEFT_Y)
-        turn_speed = self.controller.get_axis(Controller.RIGHT_X)
+        speeds = await self.getControllerSpeeds()
 
-        return [forward_speed, left_speed, turn_speed]
+        buttons = self.controller_snapshot.buttons
+        pressed = Constants.RESET_HEADING_BUTTON < len(buttons) and bool(buttons[Constants.RESET_HEADING_BUTTON])
+        if pressed and not self.reset_heading_held:
+            await self.reset_heading()
+        self.reset_heading_held = pressed
+
+        generator = self.setpoint_generator
+        generator.update(speeds[0], speeds[1], speeds[2], dt)
+        omega = generator.omega
+        if self.profile.heading_hold:
+            omega = self.heading_controller.hold(speeds[2], omega, self.yaw, dt)
+        await self.set_drive_speeds(generator.vx, generator.vy, omega, self.profile.field_oriented, dt)
 
 
     # NEW CODE
 
     async def initialize_modules(self):
-        return [
-            SwerveModule(
-               drive_id=11, steer_id=12, transport=self.transport
-            ),
-            SwerveModule(
-                drive_id=13, steer_id=14, transport=self.transport
-            ),
-            SwerveModule(
-                drive_id=15, steer_id=16, transport=self.transport
-            ),
-            SwerveModule(
-                drive_id=17, steer_id=18, transport=self.transport
-            )
+        """
+        Boots the drive: discovers and verifies every servo, builds the modules of the profile
+        and starts odometry from their real positions.
+
+        How long each phase took is added to self.startup_timings.
+
+        :return list: The SwerveModules, also in self.modules.
+        """
+        phase_start = time.perf_counter()
+        await self.discover_servos()
+        self.startup_timings["discover servos"] = time.perf_counter() - phase_start
+
+        phase_start = time.perf_counter()
+        offsets = load_steer_offsets(self.steer_offset_path) if self.steer_offset_path else {}
+        if self.feedforward is None:
+            self.feedforward = load_feedforward(self.feedforward_path) if self.feedforward_path else {}
+        self.modules = [
+            SwerveModule(drive_id=module.drive_id, steer_id=module.steer_id, transport=self.transport,
+                         profile=self.profile, steer_offset=offsets.get(module.steer_id, module.steer_offset), clock=self.clock,
+                         feedforward=self.feedforward.get(module.drive_id), fast_path=self.fast_path)
+            for module in self.profile.modules
         ]
+        count = len(self.modules)
+        self._module_angles = [0.0] * count
+        self.module_speeds = [0.0] * count
+        self.module_angles = [0.0] * count
+        # Every id a cycle can reply with, the servos and the IMU (-1).
+        self._results_by_id = dict.fromkeys([servo_id for servo_ids in self.profile.servo_bus_map.values() for servo_id in servo_ids] + [-1])
+
+        # Fill the telemetry snapshots and heading, so odometry starts from the real module positions.
+        await self.refresh_telemetry(force=True)
+        self.startup_timings["initial telemetry"] = time.perf_counter() - phase_start
+
+        phase_start = time.perf_counter()
+        self.pose_estimator = await self.initialize_pose_estimator()
+        self.startup_timings["pose estimator"] = time.perf_counter() - phase_start
+        return self.modules
+
+    async def discover_servos(self) -> dict:
+        """
+        Queries every servo in the bus map of the profile at once, in a single cycle, and checks that it
+        replies and runs a firmware with the register map this code was written against.
+
+        Servos that do not reply are asked again, up to Constants.DISCOVERY_ATTEMPTS cycles in total.
+
+        :return dict: Servo id to its reply values (model, firmware and register map version, mode, fault, voltage, temperature), also in self.servo_info.
+        """
+        import moteus.multiplex as mp
+
+        query = {
+            moteus.Register.MODE: mp.INT8,
+            moteus.Register.VOLTAGE: mp.INT16,
+            moteus.Register.TEMPERATURE: mp.INT16,
+            moteus.Register.FAULT: mp.INT8,
+            moteus.Register.MODEL_NUMBER: mp.INT32,
+            moteus.Register.FIRMWARE_VERSION: mp.INT32,
+            moteus.Register.REGISTER_MAP_VERSION: mp.INT32,
+        }
+        controllers = [
+            moteus.Controller(id=servo_id, transport=self.transport)
+            for servo_ids in self.profile.servo_bus_map.values()
+            for servo_id in servo_ids
+        ]
+
+        self.servo_info = {}
+        missing = controllers
+        error = None
+        for attempt in range(Constants.DISCOVERY_ATTEMPTS):
+            try:
+                results = await self.dispatcher.cycle([controller.make_custom_query(query) for controller in missing])
+            except Exception as e:
+                error = e
+                continue
+            for result in results:
+                self.servo_info[result.id] = result.values
+            missing = [controller for controller in missing if controller.id not in self.servo_info]
+            if not missing:
+                break
+
+        if missing:
+            raise RuntimeError(f"Servos did not reply: {[controller.id for controller in missing]}"
+                               + (f" (last transport error: {error})" if error is not None else ""))
+
+        for servo_id, values in self.servo_info.items():
+            register_map_version = values.get(moteus.Register.REGISTER_MAP_VERSION)
+            if register_map_version != Constants.REGISTER_MAP_VERSION:
+                raise RuntimeError(f"Servo {servo_id} has register map version {register_map_version}, "
+                                   f"expected {Constants.REGISTER_MAP_VERSION}. Update its firmware.")
+            if values.get(moteus.Register.FIRMWARE_VERSION, 0) < Constants.MIN_FIRMWARE_VERSION:
+                raise RuntimeError(f"Servo {servo_id} runs firmware 0x{values.get(moteus.Register.FIRMWARE_VERSION, 0):06x}, "
+                                   f"at least 0x{Constants.MIN_FIRMWARE_VERSION:06x} is needed.")
+            if values.get(moteus.Register.FAULT, 0):
+                # Not fatal, the first stop or the fault manager clears it.
+                print(f"Servo {servo_id} reports fault {values[moteus.Register.FAULT]} at startup.")
+
+        return self.servo_info
+
+    async def verify_servo_config(self, transport: moteus.Transport = None) -> dict:
+        """
+        Reads the configuration every servo needs through its diagnostic stream, for all servos at once
+        (one cycle per step for every servo, not one exchange per servo).
+
+        servopos.position_min and servopos.position_max have to be nan (see run_notes.md), or every position
+        mode command faults with 39. servo.default_timeout_s is the watchdog of commands that do not give their
+        own, so a servo that does not have one only gets a warning, since every command of the drive sets it.
+        The steer servos should report module revolutions (motor_position.rotor_to_output_ratio = 1 / STEER_MOTOR_GEAR_RATIO,
+        see Swerve/SteerController.py), a steer servo with another ratio also only gets a warning.
+
+        :param transport (moteus.Transport): The transport to read through, self.transport if not given. main.py passes
+            the one under a RecordingTransport, since the diagnostic stream is not part of a replayable run.
+
+        :return dict: Servo id to config name to value, also in self.servo_config.
+
+        :raises RuntimeError: If a servo does not answer, or has position bounds set.
+        """
+        transport = transport if transport is not None else self.transport
+        controllers = [
+            moteus.Controller(id=servo_id, transport=transport)
+            for servo_ids in self.profile.servo_bus_map.values()
+            for servo_id in servo_ids
+        ]
+
+        self.servo_config = {controller.id: {} for controller in controllers}
+        for name in ("servopos.position_min", "servopos.position_max", "servo.default_timeout_s", "motor_position.rotor_to_output_ratio"):
+            await transport.cycle([controller.make_diagnostic_write(f"conf get {name}\n".encode()) for controller in controllers])
+            lines = {controller.id: b"" for controller in controllers}
+            pending = controllers
+            for attempt in range(Constants.CONFIG_READ_ATTEMPTS):
+                for result in await transport.cycle([controller.make_diagnostic_read() for controller in pending]):
+                    if result.id in lines:
+                        lines[result.id] += getattr(result, "data", b"") or b""
+                pending = [controller for controller in pending if b"\n" not in lines[controller.id]]
+                if not pending:
+                    break
+            if pending:
+                raise RuntimeError(f"Servos did not answer conf get {name}: {[controller.id for controller in pending]}")
+
+            for servo_id, line in lines.items():
+                text = line.split(b"\n")[0].strip().decode("latin1")
+                try:
+                    self.servo_config[servo_id][name] = float(text)
+                except ValueError:
+                    raise RuntimeError(f"Servo {servo_id} answered conf get {name} with {text!r}")
+
+        for servo_id, config in self.servo_config.items():
+            for name in ("servopos.position_min", "servopos.position_max"):
+                if not math.isnan(config[name]):
+                    raise RuntimeError(f"Servo {servo_id} has {name} = {config[name]}, it has to be nan. "
+                                       f"Run conf set {name} nan and conf write in tview (see run_notes.md).")
+            if not math.isfinite(config["servo.default_timeout_s"]) or config["servo.default_timeout_s"] <= 0.0:
+                print(f"Servo {servo_id} has no default watchdog (servo.default_timeout_s = {config['servo.default_timeout_s']}).")
+        for module in self.profile.modules:
+            ratio = self.servo_config[module.steer_id]["motor_position.rotor_to_output_ratio"]
+            if not math.isclose(ratio, 1.0 / Constants.STEER_MOTOR_GEAR_RATIO, rel_tol=1e-3):
+                print(f"Steer servo {module.steer_id} has motor_position.rotor_to_output_ratio = {ratio}, "
+                      f"expected {1.0 / Constants.STEER_MOTOR_GEAR_RATIO:.6f} so it reports module revolutions.")
+
+        return self.servo_config
     
-    # async def initialize_pose_estimator(self):
-    #     return estimator.SwerveDrive4PoseEstimator(
-    #         Constants.kinematics,
-    #         Rotation2d.fromDegrees(self.get_heading()), #<- needs to be updated
-    #         self.get_module_positions(), #<- allso wrong change later
-    #         Pose2d(0.0, 0.0, Rotation2d.fromDegrees(0.0)),
-    #         np.array([[0.02], [0.02], [math.radians(5)]]),
-    #         np.array([[0.3], [0.3], [math.radians(10)]])
-    #     )
-    
-    # async def initialize_pose_estimator_3d(self):
-    #     return estimator.SwerveDrive4PoseEstimator3d(
-    #         Constants.kinematics,
-    #         self.get_rotation_3d_function, #<- needs to be updated
-    #         self.get_module_positions(), #<- wrong change later
-    #         Pose3d(0.0, 0.0, 0.0, Rotation3d(0.0, 0.0, 0.0))
-    # )
+    async def initialize_pose_estimator(self) -> "wpimath.estimator.SwerveDrive4PoseEstimator":
+        import wpimath.estimator as estimator
+
+        return estimator.SwerveDrive4PoseEstimator(
+            self.profile.kinematics,
+            Rotation2d(self.yaw),
+            tuple(await self.get_swerve_module_positions()),
+            Pose2d(0.0, 0.0, Rotation2d.fromDegrees(0.0)),
+            (0.02, 0.02, math.radians(5)),
+            (0.3, 0.3, math.radians(10))
+        )
 
     async def swerve_drive_periodic(self):
-        # await self.update_pos() 
-        return
+        """
+        Updates odometry from the telemetry and heading of the last cycle. Does not go to the bus.
+        """
+        if self.pose_estimator is None:
+            return
 
-        #idk why its white 
-        # self.pose_estimator.update(self.get_pidgey_rotation(), self.get_module_positions()) #fix more stuff dummy
-        # self.pose_estimator_3d.update(self.pidgey.getRotation3d(), self.get_module_positions()) # needs to change the rotation functions here
+        span = profiler.start()
+        if self.fast_path:
+            # getPosition() updates the module positions in place, so the tuple of them is built once.
+            for module in self.modules:
+                module.getPosition()
+            if not self._positions:
+                self._positions = tuple([module.swerve_module_position for module in self.modules])
+            positions = self._positions
+            if self._yaw_rotation.radians() != self.yaw:
+                self._yaw_rotation = Rotation2d(self.yaw)
+            rotation = self._yaw_rotation
+        else:
+            positions = tuple([module.getPosition() for module in self.modules])
+            rotation = Rotation2d(self.yaw)
+        self.robot_pos = self.pose_estimator.updateWithTime(self.clock(), rotation, positions)
+        profiler.stop("odometry", span)
 
-        # self.robot_pos = self.pose_estimator.getEstimatedPosition()
-        # self.robot_pos_3d = self.pose_estimator_3d.getEstimatedPosition()
+    def get_pose(self) -> Pose2d:
+        """
+        Gives the estimated robot pose from the last swerve_drive_periodic(). Does not go to the bus.
+        """
+        return self.robot_pos
 
-    # async def update_pos(self):
-        # return #no idea how to do this shit rn
-    
-    async def set_drive_speeds(self, forward_speed, left_speed, turn_speed, is_field_oriented = False):
-        # Convert to chassis speeds the robot understand?s
-        speeds = None
-        if is_field_oriented:
-            speeds = wpimath.kinematics.ChassisSpeeds.fromFieldRelativeSpeeds
-            (forward_speed, left_speed, turn_speed, self.get_heading_rotation2d())
-            #fix get heading
+    def add_vision_measurement(self, pose: Pose2d, timestamp: float, std_devs: tuple = None) -> None:
+        """
+        Fuses a vision pose measurement into the pose estimate.
 
-        else: 
-            speeds = wpimath.kinematics.ChassisSpeeds(forward_speed, left_speed, turn_speed)
+        The estimator keeps a short history of odometry, so a measurement that arrives late is applied
+        at the time the image was taken and replayed forward (latency compensation).
 
-        speeds = wpimath.kinematics.ChassisSpeeds.discretize(speeds, 0.02)
+        :param pose (Pose2d): The robot pose measured by vision, in field coordinates.
+        :param timestamp (float): The time.monotonic() time the measurement was taken at (not when it arrived).
+        :param std_devs (tuple): Optional (x, y, heading) standard deviations of this measurement, in meters and radians.
+        """
+        if self.pose_estimator is None:
+            return
+        if std_devs is None:
+            self.pose_estimator.addVisionMeasurement(pose, timestamp)
+        else:
+            self.pose_estimator.addVisionMeasurement(pose, timestamp, std_devs)
 
-        new_states = Constants.kinematics.toSwerveModuleStates(speeds)
+    async def set_drive_speeds(self, forward_speed, left_speed, turn_speed, is_field_oriented = False, dt = Constants.LOOP_PERIOD):
+        """
+        Drives the chassis at the given speeds for one tick, in one bus cycle.
 
-        new_states = wpimath.kinematics.SwerveDrive4Kinematics.desaturateWheelSpeeds(new_states, Constants.MAX_SPEED)
-        await self.set_swerve_module_states(new_states)
+        :param forward_speed (float): m/s forward, of the robot or away from the driver if field oriented.
+        :param left_speed (float): m/s left, of the robot or of the driver if field oriented.
+        :param turn_speed (float): rad/s counterclockwise.
+        :param is_field_oriented (bool): Whether the speeds are relative to the field (see reset_heading()) instead of the robot.
+        :param dt (float): The loop period, in seconds.
+        """
+        if is_field_oriented:
+            # Field to robot coordinates, with the heading from the attitude reply of the last cycle,
+            # so this needs no bus round-trip of its own.
+            heading = self.yaw - self.heading_offset
+            cos_heading = math.cos(heading)
+            sin_heading = math.sin(heading)
+            forward_speed, left_speed = (forward_speed * cos_heading + left_speed * sin_heading,
+                                         -forward_speed * sin_heading + left_speed * cos_heading)
+
+        span = profiler.start()
+        # Discretize, inverse kinematics, desaturate and optimize against the measured module angles, without wpimath objects.
+        vx, vy, omega = self.kinematics.discretize(forward_speed, left_speed, turn_speed, dt)
+        current_angles = self._module_angles
+        for i, module in enumerate(self.modules):
+            current_angles[i] = module.angle
+        self.kinematics.module_states_into(vx, vy, omega, self.module_speeds, self.module_angles, current_angles)
+        profiler.stop("kinematics", span)
+        await self.apply_module_targets(self.module_speeds, self.module_angles)
+        profiler.stop("set_drive_speeds", span)
+
+    async def reset_heading(self, heading: float = 0.0):
+        """
+        Makes the way the robot faces now the given field heading, for field oriented driving. Does not go to the bus.
 
-    async def reset_heading(self):
-        #reset the heading
-        return
+        Odometry keeps using the raw IMU yaw, so the pose estimate does not jump.
 
-    async def get_swerve_module_states(self) -> wpimath.kinematics.SwerveModuleState:
-        current_module_state = wpimath.kinematics.SwerveModuleState()
-        for i in range(4):
-            current_module_state[i] = self.states[i]
-        
-        return current_module_state
+        :param heading (float): The field heading the robot has now, in degrees. 0 makes it face field forward.
+        """
+        self.heading_offset = math.remainder(self.yaw - math.radians(heading), 2.0 * math.pi)
+
+    async def get_swerve_module_states(self) -> list:
+        await self.refresh_telemetry()
+        return [module.get_states() for module in self.modules]
     
     async def set_swerve_module_states(self, states):
-        set_states = states
-        for i in range (4):
-            self.modules[i].set_states(set_states[i])
+        await self.apply_states(states)
 
+    async def apply_states(self, states):
+        """
+        Sends the desired state of every module in a single transport cycle.
+
+        The steer and drive commands of all four modules are collected and issued together,
+        and the query replies are decoded back into each module's measured state. The IMU
+        attitude is requested in the same cycle, so the heading costs no extra round-trip.
+
+        :param states: The desired SwerveModuleState of each module, in module order.
+        """
+        for module, state in zip(self.modules, states):
+            module.set_state(state)
+        await self.sync_all()
+
+    async def apply_module_targets(self, speeds, angles):
+        """
+        The same as apply_states(), for module speeds (m/s) and angles (radians) that are already optimized.
+        """
+        modules = self.modules
+        for i in range(len(modules)):
+            modules[i].set_target(speeds[i], angles[i])
+        await self.sync_all()
+
+    async def cycle(self, commands, **kwargs) -> list:
+        """
+        Sends commands in one dispatcher cycle, decodes the replies into the modules and heading, and checks them for faults.
+
+        A transport error does not propagate: it is counted by the fault manager as a timeout of every
+        module, and the tick is skipped.
+
+        :param commands (list): moteus.Command objects, for any mix of modules.
+        :param kwargs: Passed on to transport.cycle() (request_attitude, ...).
+
+        :return list: The results of the cycle, empty if the transport raised.
+        """
+        span = profiler.start()
+        try:
+            results = await self.dispatcher.cycle(commands, **kwargs)
+        except Exception as e:
+            self.fault_manager.record_transport_error(e)
+            return []
+        finally:
+            profiler.stop("bus_cycle", span)
+
+        results_by_id = self.update_modules_from_results(results)
+        # The same set every cycle, refilled in place.
+        commanded_ids = self._commanded_ids
+        commanded_ids.clear()
+        for command in commands:
+            commanded_ids.add(command.destination)
+        self.fault_manager.check_cycle(self.modules, results_by_id, commanded_ids)
+        return results
+
+    def update_modules_from_results(self, results) -> dict:
+        """
+        Decodes the query replies of a transport cycle into the telemetry of every module,
+        and the IMU attitude reply (id -1, if the cycle requested one) into the heading.
+
+        :param results (list): The results returned by transport.cycle().
+
+        :return dict: The results keyed by id, None for every servo that did not reply. The same dict every cycle.
+        """
+        results_by_id = self._results_by_id
+        for key in results_by_id:
+            results_by_id[key] = None
+        for result in results:
+            results_by_id[result.id] = result
+        for module in self.modules:
+            module.update_from_results(results_by_id)
+
+        attitude = results_by_id.get(-1)
+        if attitude is not None and hasattr(attitude, "euler_rad"):
+            self.yaw = attitude.euler_rad.yaw
+            self.yaw_timestamp = self.clock()
+        return results_by_id
+
+    async def get_swerve_module_positions(self) -> list:
+        await self.refresh_telemetry()
+        return [module.getPosition() for module in self.modules]
+
+    async def refresh_telemetry(self, force: bool = False) -> None:
+        """
+        Refreshes the telemetry snapshots of every module in one query-only cycle, but only if one of them is stale.
+
+        While commands are being sent every tick, the snapshots are kept fresh by the command replies
+        and this does not go to the bus at all.
+
+        :param force (bool): Query even if no snapshot is stale.
+        """
+        if not force and not any(module.is_stale() for module in self.modules):
+            return
+        await self.sync_all()
     
-    async def get_swerve_module_positions(self) -> wpimath.kinematics.SwerveModulePosition:
-        current_module_position = wpimath.kinematics.SwerveModulePosition[4]
-        for i in range(4):
-            current_module_position[i] = await self.modules.get_position()
-        
-        return current_module_position
-    
+    async def calibrate_steer_offsets(self) -> dict:
+        """
+        Takes the current steer position of every module as pointing forward, and saves the offsets to steer_offset_path.
+
+        Point every wheel straight forward by hand (with the motors stopped) before calling this.
+
+        :return dict: Steer motor id to its new offset, in revolutions.
+        """
+        await self.refresh_telemetry(force=True)
+        offsets = {module.steer.motor.id: module.steer_controller.calibrate() for module in self.modules}
+        if self.steer_offset_path:
+            save_steer_offsets(self.steer_offset_path, offsets)
+        return offsets
+
+    def reset_command_stats(self) -> None:
+        """
+        Clears the sent and suppressed command counts of every motor.
+        """
+        self.command_stats_start = time.monotonic()
+        for module in self.modules:
+            module.drive.reset_command_stats()
+            module.steer.reset_command_stats()
+
+    def command_stats(self) -> dict:
+        """
+        Gives how many position mode commands were sent in full and how many were suppressed as repeats, since the last reset_command_stats().
+
+        :return dict: Totals over every motor, and the full command frames and bytes saved per second.
+        """
+        motors = [motor for module in self.modules for motor in (module.drive, module.steer)]
+        sent = sum(motor.commands_sent for motor in motors)
+        downgraded = sum(motor.commands_downgraded for motor in motors)
+        skipped = sum(motor.commands_skipped for motor in motors)
+        bytes_saved = sum(motor.bytes_saved for motor in motors)
+        elapsed = max(time.monotonic() - self.command_stats_start, 1e-9)
+        return {
+            "sent": sent,
+            "downgraded": downgraded,
+            "skipped": skipped,
+            "suppressed_fraction": (downgraded + skipped) / max(sent + downgraded + skipped, 1),
+            "frames_saved_per_second": (downgraded + skipped) / elapsed,
+            "bytes_saved_per_second": bytes_saved / elapsed,
+        }
+
     async def stop_modules(self):
-        for i in range(4):
-            await self.modules[i].stop()
+        await self.stop()
     
     async def reset_drive_positions(self):
-        for i in range(4):
-            await self.modules.reset_drive_positions()
+        """
+        Zeroes the drive position of every module, with one bus cycle for all four.
+        """
+        for module in self.modules:
+            module.request_drive_reset()
+        await self.sync_all(request_attitude=False)
 
     
     async def get_heading(self) -> float:
-        result = await self.transport.cycle([], request_attitude=True)
-        imu_result = [
-            x for x in result
-            if x.id == -1 and isinstance(x, moteus_pi3hat.CanAttitudeWrapper)][0]
-
-        return imu_result.euler_rad.yaw * 180.0 / math.pi  # Convert radians to degrees
+        """
+        Gives the field heading in degrees, from the attitude reply of the last cycle. Does not go to the bus.
+        """
+        return math.degrees(math.remainder(self.yaw - self.heading_offset, 2.0 * math.pi))
 
     
-    async def get_heading_rotation2d(self) -> float:
-        return Rotation2d.fromDegrees(await self.get_heading())
+    async def get_heading_rotation2d(self) -> Rotation2d:
+        return Rotation2d(self.yaw - self.heading_offset)
 
@@ -0,0 +1,143 @@
+import math
+import numpy as np
+
+TWO_PI = 2.0 * math.pi
+HALF_PI = 0.5 * math.pi
+
+"""
+Swerve inverse kinematics without wpimath objects, as a fast path for wpimath's SwerveDrive4Kinematics.
+
+All per-module math (inverse kinematics, desaturation, angle optimization and cosine scaling)
+is done against a module matrix that is built once, instead of crossing into C++ and
+allocating SwerveModuleState/Rotation2d objects per module per tick. Batches of samples go
+through the matrix in one NumPy operation.
+"""
+class SwerveKinematics:
+    def __init__(self, translations, max_speed: float):
+        """
+        Constructs the kinematics for a set of modules.
+
+        :param translations (list): The position of each module relative to the robot center, as Translation2d or (x, y) in meters.
+        :param max_speed (float): The fastest a module can drive, in meters per second. Faster states are scaled down (desaturated).
+        """
+        positions = np.array([
+            (t.x, t.y) if hasattr(t, "x") else tuple(t)
+            for t in translations
+        ], dtype=float)
+        self.module_count = len(positions)
+        self.max_speed = max_speed
+
+        # Each module gets two rows: [vx_i, vy_i] = [[1, 0, -y_i], [0, 1, x_i]] @ [vx, vy, omega]
+        self.matrix = np.zeros((2 * self.module_count, 3))
+        self.matrix[0::2, 0] = 1.0
+        self.matrix[0::2, 2] = -positions[:, 1]
+        self.matrix[1::2, 1] = 1.0
+        self.matrix[1::2, 2] = positions[:, 0]
+
+        # The omega columns of the matrix as (vx, vy) pairs, for the per-tick path.
+        self._rows = tuple(zip(self.matrix[0::2, 2].tolist(), self.matrix[1::2, 2].tolist()))
+
+        # Like wpimath, the wheels keep their last angle when the robot is told to stand still.
+        self.last_angles = [0.0] * self.module_count
+
+    @staticmethod
+    def discretize(vx: float, vy: float, omega: float, dt: float):
+        """
+        The same as ChassisSpeeds.discretize(): gives the speeds that, held for dt, end at the pose the
+        continuous speeds would reach, so translating while rotating does not drift.
+
+        :return tuple: The discretized (vx, vy, omega).
+        """
+        half_theta = 0.5 * omega * dt
+        cos_minus_one = math.cos(omega * dt) - 1.0
+        if abs(cos_minus_one) < 1e-9:
+            half_theta_by_tan = 1.0 - (omega * dt) ** 2 / 12.0
+        else:
+            half_theta_by_tan = -(half_theta * math.sin(omega * dt)) / cos_minus_one
+
+        # Rotate the translation by -half_theta and scale it, as one complex multiplication.
+        return (
+            vx * half_theta_by_tan + vy * half_theta,
+            vy * half_theta_by_tan - vx * half_theta,
+            omega
+        )
+
+    def to_module_states(self, vx: float, vy: float, omega: float, current_angles=None, cosine_scale: bool = True):
+        """
+        Converts chassis speeds to module speeds and angles, desaturated and optimized.
+
+        For a single tick of four modules, NumPy's per-call overhead costs more than the math itself,
+        so this works on the rows of the module matrix with plain floats. Use to_module_states_batch()
+        for many samples at once.
+
+        :param vx (float): Forward speed in meters per second.
+        :param vy (float): Left speed in meters per second.
+        :param omega (float): Counterclockwise turn speed in radians per second.
+        :param current_angles (list): The current angle of each module in radians. If given, each state is optimized so its module turns at most 90 degrees.
+        :param cosine_scale (bool): Scale each speed by the cosine of its angle error (only with current_angles).
+
+        :return tuple: A list of module speeds in meters per second, and a list of module angles in radians.
+        """
+        speeds = [0.0] * self.module_count
+        angles = [0.0] * self.module_count
+        self.module_states_into(vx, vy, omega, speeds, angles, current_angles, cosine_scale)
+        return speeds, angles
+
+    def module_states_into(self, vx: float, vy: float, omega: float, speeds, angles, current_angles=None,
+                           cosine_scale: bool = True) -> None:
+        """
+        The same as to_module_states(), but writes into the given speeds and angles sequences instead of allocating new ones.
+        """
+        last_angles = self.last_angles
+        if vx == 0.0 and vy == 0.0 and omega == 0.0:
+            for i in range(self.module_count):
+                speeds[i] = 0.0
+                angles[i] = last_angles[i]
+        else:
+            top_speed = 0.0
+            for i, (rotation_x, rotation_y) in enumerate(self._rows):
+                module_vx = vx + rotation_x * omega
+                module_vy = vy + rotation_y * omega
+                speed = math.hypot(module_vx, module_vy)
+                angle = math.atan2(module_vy, module_vx)
+                speeds[i] = speed
+                angles[i] = angle
+                last_angles[i] = angle
+                if speed > top_speed:
+                    top_speed = speed
+
+            if top_speed > self.max_speed:
+                scale = self.max_speed / top_speed
+                for i in range(self.module_count):
+                    speeds[i] *= scale
+
+        if current_angles is None:
+            return
+
+        for i in range(self.module_count):
+            current_angle = current_angles[i]
+            delta = math.remainder(angles[i] - current_angle, TWO_PI)
+            if abs(delta) > HALF_PI:
+                speeds[i] = -speeds[i]
+                angles[i] = math.remainder(angles[i] + math.pi, TWO_PI)
+                delta = math.remainder(angles[i] - current_angle, TWO_PI)
+            if cosine_scale:
+                speeds[i] *= math.cos(delta)
+
+    def to_module_states_batch(self, chassis_speeds):
+        """
+        Converts many chassis speed samples at once (for trajectory preprocessing). Not optimized, since
+        there is no current module angle to optimize against.
+
+        :param chassis_speeds (array): N x 3 array of (vx, vy, omega) samples.
+
+        :return tuple: N x modules arrays of module speeds (desaturated per sample) and module angles in radians.
+        """
+        chassis_speeds = np.asarray(chassis_speeds, dtype=float).reshape(-1, 3)
+        velocities = (chassis_speeds @ self.matrix.T).reshape(len(chassis_speeds), self.module_count, 2)
+        speeds = np.hypot(velocities[..., 0], velocities[..., 1])
+        angles = np.arctan2(velocities[..., 1], velocities[..., 0])
+
+        top_speeds = speeds.max(axis=1, keepdims=True)
+        scale = np.where(top_speeds > self.max_speed, self.max_speed / np.maximum(top_speeds, 1e-12), 1.0)
+        return speeds * scale, angles
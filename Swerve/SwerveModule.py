@@ -1,75 +1,249 @@
-import moteus
-import moteus_pi3hat
-from wpimath.controller import PIDController
 from wpimath.geometry import Rotation2d
 from wpimath.kinematics import SwerveModuleState
 from wpimath.kinematics import SwerveModulePosition
-from wpimath.geometry import Rotation2d
-import math
+import time
 from Swerve.SwerveMotor import SwerveMotor
-from Utils.Constants import DRIVE_MOTOR_GEAR_RATIO, WHEEL_DIAMETER
+from Swerve.SteerController import SteerController
+from Swerve.ModuleModel import ModuleModel
+from Utils.RobotProfile import RobotProfile
 
+# What a module is asked to do in the next SwerveDrive.sync_all(), see SwerveModule.set_target().
+QUERY = "query"
+TARGET = "target"
+STOP = "stop"
+RESET_DRIVE = "reset_drive"
 
-class SwerveModule:
-    def __init__(self, drive_id: int, steer_id: int, transport):
-        self.drive = SwerveMotor(drive_id, transport)
-        self.steer = SwerveMotor(steer_id, transport)
 
-        # Initial position and state
+class SwerveModule:
+    def __init__(self, drive_id: int, steer_id: int, transport, profile: RobotProfile = None, steer_offset: float = 0.0,
+                 clock=time.monotonic, feedforward=None, fast_path: bool = False):
+        """
+        Constructs a swerve module.
+
+        :param drive_id (int): Moteus id of the drive motor.
+        :param steer_id (int): Moteus id of the steer motor.
+        :param transport (moteus.Transport): The transport both motors are on, for query() and stop(). The drive batches through its own.
+        :param profile (RobotProfile): The robot the module belongs to, for its conversion factors and motor limits. RobotProfile.default() if not given.
+        :param steer_offset (float): The steer servo position when the wheel points forward, in module revolutions.
+        :param clock (function): Gives the current time in seconds, passed on to both motors.
+        :param feedforward (FeedforwardTable): The characterized drive feedforward of this module. From the drive gains of the profile if not given.
+        :param fast_path (bool): Reuse command frames and the module position object every tick instead of allocating new ones (see SwerveDrive).
+        """
+        if profile is None:
+            profile = RobotProfile.default()
+        self.drive = SwerveMotor(drive_id, transport, profile.accel_limit, profile.velocity_limit, profile.watchdog_timeout, clock=clock,
+                                 reuse_frames=fast_path)
+        self.steer = SwerveMotor(steer_id, transport, profile.steer_accel_limit, profile.steer_velocity_limit, profile.watchdog_timeout, clock=clock,
+                                 reuse_frames=fast_path)
+
+        # Conversion factors from the profile, so nothing is recomputed per tick.
+        self.meters_per_drive_rev = profile.meters_per_drive_rev
+        self.drive_revs_per_meter = profile.drive_revs_per_meter
+        self.steer_controller = SteerController(steer_offset)
+        self.model = ModuleModel.from_profile(profile, feedforward, clock)
+
+        self.transport = transport
+        self.fast_path = fast_path
+
+        # Measured and desired state as plain floats, so a tick allocates no wpimath objects. See state and desired_state.
+        self.speed = 0.0  # m/s
+        self.angle = 0.0  # radians
+        self.desired_speed = 0.0  # m/s
+        self.desired_angle = 0.0  # radians
         self.swerve_module_position = SwerveModulePosition(0.0, Rotation2d())
-        self.state = SwerveModuleState(0.0, Rotation2d())
+        self._position_angle = 0.0  # the angle of swerve_module_position, in radians
 
-    async def getPosition(self) -> SwerveModulePosition:
-        drive_position = await self.drive.position()  # revolutions
-        steer_position = await self.steer.position()  # revolutions
+        # The intent for the next sync, set by set_target(), set_state(), request_stop() and request_drive_reset().
+        self.intent = QUERY
+        self.intent_speed = 0.0  # m/s
+        self.intent_angle = 0.0  # radians
 
-        angle = Rotation2d.fromRotations(steer_position)
-        distance = (drive_position / DRIVE_MOTOR_GEAR_RATIO) * WHEEL_DIAMETER * math.pi
+    @property
+    def state(self) -> SwerveModuleState:
+        """
+        The measured module state, built from speed and angle on every access.
+        """
+        return SwerveModuleState(self.speed, Rotation2d(self.angle))
 
-        self.swerve_module_position = SwerveModulePosition(distance, angle)
-        return self.swerve_module_position
+    @property
+    def desired_state(self) -> SwerveModuleState:
+        """
+        The last module state that was commanded, built from desired_speed and desired_angle on every access.
+        """
+        return SwerveModuleState(self.desired_speed, Rotation2d(self.desired_angle))
+
+    def getPosition(self) -> SwerveModulePosition:
+        """
+        Gives the module position from the telemetry snapshots. Does not go to the bus.
+
+        On the fast path, the same SwerveModulePosition is updated in place every time (and its Rotation2d only
+        replaced when the angle changed), so keep a copy if it has to outlive the next call.
+        """
+        drive_position = self.model.wheel_position(self.drive.snapshot.position, self.steer_controller.position)  # revolutions
+        angle = self.steer_controller.angle()
+        distance = drive_position * self.meters_per_drive_rev
+
+        if not self.fast_path:
+            self.swerve_module_position = SwerveModulePosition(distance, Rotation2d(angle))
+            return self.swerve_module_position
+
+        position = self.swerve_module_position
+        position.distance = distance
+        if angle != self._position_angle:
+            position.angle = Rotation2d(angle)
+            self._position_angle = angle
+        return position
     
-    async def get_states(self) -> SwerveModuleState:
-        self.state.angle = await Rotation2d.fromRotations(await self.steer.position)  # revolutions
-        self.state.speed = await (await self.drive.velocity() / DRIVE_MOTOR_GEAR_RATIO * WHEEL_DIAMETER * math.pi)   # revolutions per second
+    def get_states(self) -> SwerveModuleState:
+        """
+        Gives the measured module state from the telemetry snapshots. Does not go to the bus.
+        """
         return self.state
-    
-    async def set_states(self, desired_state: SwerveModuleState, transport: moteus.Transport):
-        current_angle: Rotation2d = await Rotation2d.fromRotations(await self.steer.position)
 
-        desired_state = desired_state.optimize(current_angle)
+    def is_stale(self, now: float = None) -> bool:
+        """
+        Checks whether the telemetry of either motor is older than its max_staleness.
+        """
+        return self.drive.is_stale(now) or self.steer.is_stale(now)
 
-        angle_to_set = desired_state.angle.degrees()/ 360.0  # Convert degrees to revolutions
-        await self.steer.setAngle(angle_to_set, transport)
+    def make_query_commands(self) -> list:
+        """
+        Builds query-only commands for both motors, used to refresh the telemetry snapshots.
+        """
+        return [self.steer.make_query_command(), self.drive.make_query_command()]
 
-        velocity_to_set = desired_state.speed / (WHEEL_DIAMETER * math.pi) * DRIVE_MOTOR_GEAR_RATIO
-        await self.drive.setVelocity(velocity_to_set, transport)
+    def set_target(self, speed: float, angle_rad: float) -> None:
+        """
+        Asks for an already optimized module speed and angle in the next sync. Does not go to the bus.
 
-        self.state = desired_state
+        :param speed (float): The wheel speed in meters per second.
+        :param angle_rad (float): The module angle in radians.
+        """
+        self.intent = TARGET
+        self.intent_speed = speed
+        self.intent_angle = angle_rad
 
-    async def reset_drive_positions(self):
-        await self.drive.setPosition(0.0)
+    def set_state(self, desired_state: SwerveModuleState) -> None:
+        """
+        Asks for a desired module state in the next sync, optimized against the last measured angle. Does not go to the bus.
 
-    # Sets the speed and angle of the swerve module (in motor revolutions)
-    async def set(self, speed: float, angle_deg: float, transport: moteus.Transport) -> None:
+        :param desired_state (SwerveModuleState): The state to drive at. Not changed, it is optimized as a copy.
         """
-        Sets the speed and angle of the swerve module.
+        state = SwerveModuleState(desired_state.speed, desired_state.angle)
+        state.optimize(Rotation2d(self.angle))
+        self.set_target(state.speed, state.angle.radians())
 
-        :param speed (float): The speed of the swerve module in revolutions per second.
-        :param angle_deg (float): The angle of the swerve module in degrees.
-        
-        :return list: A list containing the results of setting the speed and angle.
+    def request_stop(self) -> None:
         """
+        Asks for both motors to be stopped in the next sync. Does not go to the bus.
+        """
+        self.intent = STOP
 
-        # Set angle natively takes degrees 
-        await self.steer.setAngle(angle_deg, transport)
-        await self.drive.setVelocity(speed, transport)
+    def request_drive_reset(self) -> None:
+        """
+        Asks for the drive position to be zeroed in the next sync. Does not go to the bus.
+        """
+        self.intent = RESET_DRIVE
 
-    # Stops the swerve module
-    async def stop(self):
+    def add_intent_commands(self, commands: list, commandable: bool = True) -> None:
         """
-        Stops the swerve module by stopping both the drive and steer motors.
+        Appends the commands of the current intent to a cycle's commands and goes back to querying, so an intent is only sent once.
+
+        :param commands (list): The commands of the cycle, appended to.
+        :param commandable (bool): False if the module may not move (e.g. stopped by the fault manager), which turns a target into a stop.
+        """
+        intent = self.intent
+        self.intent = QUERY
+        if intent == TARGET and commandable:
+            self.add_commands(commands, self.intent_speed, self.intent_angle)
+        elif intent == TARGET or intent == STOP:
+            commands.extend(self.make_stop_commands())
+        elif intent == RESET_DRIVE:
+            commands.extend(self.make_reset_drive_position_commands())
+        else:
+            commands.append(self.steer.make_query_command())
+            commands.append(self.drive.make_query_command())
+
+    def make_commands(self, speed: float, angle_rad: float) -> list:
+        """
+        Builds the steer and drive commands for an already optimized module speed and angle without sending them.
+
+        :param speed (float): The wheel speed in meters per second.
+        :param angle_rad (float): The module angle in radians.
+
+        :return list: The steer and drive moteus commands, in that order (repeated commands may be query-only or left out).
+        """
+        commands = []
+        self.add_commands(commands, speed, angle_rad)
+        return commands
+
+    def add_commands(self, commands: list, speed: float, angle_rad: float) -> None:
+        """
+        The same as make_commands(), but appends to a cycle's commands instead of building a list of its own.
+        """
+        angle_to_set = self.steer_controller.target_for(angle_rad)  # The nearest motor position for the angle, in revolutions
+        # Coupling compensation against the measured steer velocity (module rev/s, the steer servo applies its gearing),
+        # and feedforward torque, in the same drive frame.
+        velocity_to_set = self.model.drive_velocity(speed * self.drive_revs_per_meter, self.steer.snapshot.velocity)
+        feedforward_torque = self.model.feedforward_torque(velocity_to_set)
+
+        self.desired_speed = speed
+        self.desired_angle = angle_rad
+        steer_command = self.steer.make_position_command(angle_to_set)
+        drive_command = self.drive.make_velocity_command(velocity_to_set, feedforward_torque)
+        # A motor whose command was suppressed with suppression="skip" has no command this tick.
+        if steer_command is not None:
+            commands.append(steer_command)
+        if drive_command is not None:
+            commands.append(drive_command)
+
+    def update_from_results(self, results_by_id: dict) -> None:
+        """
+        Updates the telemetry snapshots and measured module state from the query replies of a transport cycle.
+
+        :param results_by_id (dict): Query results of a cycle, keyed by motor id.
+        """
+        steer_result = results_by_id.get(self.steer.motor.id)
+        if steer_result is not None:
+            self.steer.update_snapshot(steer_result)
+            self.steer_controller.update(self.steer.snapshot.position)
+            self.angle = self.steer_controller.angle()
+
+        drive_result = results_by_id.get(self.drive.motor.id)
+        if drive_result is not None:
+            self.drive.update_snapshot(drive_result)
+            self.speed = self.model.wheel_velocity(self.drive.snapshot.velocity, self.steer.snapshot.velocity) * self.meters_per_drive_rev
+
+    def make_stop_commands(self) -> list:
+        """
+        Builds stop commands for both motors without sending them.
         """
+        self.steer_controller.reset_target()
+        self.model.reset()
+        return [self.drive.make_stop_command(), self.steer.make_stop_command()]
 
-        await self.drive.stop()
-        await self.steer.stop()
+    def make_reset_drive_position_commands(self) -> list:
+        """
+        Builds a command that zeroes the drive motor position without sending it.
+        """
+        return [self.drive.make_reset_position_command(0.0)]
+
+    async def query(self) -> SwerveModuleState:
+        """
+        Queries both motors on their own, in one transport cycle, and updates the measured state.
+
+        Only for tools. While driving, the drive queries every module in its one cycle per tick.
+
+        :return SwerveModuleState: The measured state.
+        """
+        results = await self.transport.cycle(self.make_query_commands())
+        self.update_from_results({result.id: result for result in results})
+        return self.state
+
+    async def stop(self) -> SwerveModuleState:
+        """
+        Stops both motors on their own, in one transport cycle. Only for tools, the drive stops every module in one cycle.
+        """
+        results = await self.transport.cycle(self.make_stop_commands())
+        self.update_from_results({result.id: result for result in results})
+        return self.state
@@ -1,222 +1,369 @@
 import moteus
-import moteus_pi3hat
 import asyncio
 import math
+import struct
+import time
+import Utils.Constants as Constants
+
+_F32 = struct.Struct("<f")
+# Distinct float32 values of (position, velocity, feedforward_torque, accel_limit, velocity_limit, watchdog_timeout),
+# only used to find where moteus puts each field in an encoded position mode frame.
+_TEMPLATE_VALUES = (12345.5, 2345.25, 345.125, 4567.75, 5678.125, 678.375)
+
+
+def _close(a: float, b: float, epsilon: float) -> bool:
+    # nan (no target) only matches nan.
+    if a != a or b != b:
+        return a != a and b != b
+    return abs(a - b) <= epsilon
+
+
+class MotorSnapshot:
+    """
+    The last known state of a motor, filled in from the query replies of a transport cycle.
+
+    Reading a snapshot never goes to the bus. timestamp is the time.monotonic() time of the reply,
+    and is 0.0 until the first reply has been received.
+    """
+
+    __slots__ = ("position", "velocity", "torque", "fault", "mode", "temperature", "voltage", "timestamp")
+
+    position: float  # revolutions
+    velocity: float  # rev/s
+    torque: float  # Nm
+    fault: int
+    mode: int  # moteus.Mode, None until the first reply
+    temperature: float  # degrees C
+    voltage: float  # volts
+    timestamp: float
+
+    def __init__(self):
+        self.position = math.nan
+        self.velocity = math.nan
+        self.torque = math.nan
+        self.fault = 0
+        self.mode = None
+        self.temperature = math.nan
+        self.voltage = math.nan
+        self.timestamp = 0.0
+
+    def __repr__(self) -> str:
+        return "MotorSnapshot(" + ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__) + ")"
+
+    def age(self, now: float = None) -> float:
+        """
+        Gives how long ago the snapshot was last updated.
+
+        :param now (float): The current time.monotonic() time. Read from the clock if not given.
+
+        :return float: The age of the snapshot in seconds.
+        """
+        if now is None:
+            now = time.monotonic()
+        return now - self.timestamp
+
+
+class PositionFrame:
+    """
+    A position mode command encoded once by moteus, whose float fields are patched in place for every
+    command instead of encoding a new frame (and a new moteus.Command) each time.
+
+    Every command still gets its data as a new bytes object, because a transport (or a replay
+    recording) may keep the data of a frame it was given.
+    """
+
+    def __init__(self, command, offsets: tuple):
+        """
+        :param command (moteus.Command): The encoded template command, reused for every frame.
+        :param offsets (tuple): The byte offset of each field of _TEMPLATE_VALUES in the frame, None for a field the frame leaves out.
+        """
+        self.command = command
+        self.buffer = bytearray(command.data)
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, motor: moteus.Controller, with_torque: bool) -> "PositionFrame":
+        """
+        Encodes the template frame of a motor, with or without a feedforward torque.
+
+        :return PositionFrame: The frame, or None if moteus does not encode every field as a float32 of its own (e.g. another resolution).
+        """
+        position, velocity, torque, accel_limit, velocity_limit, watchdog_timeout = _TEMPLATE_VALUES
+        command = motor.make_position(position=position, velocity=velocity, feedforward_torque=torque if with_torque else None,
+                                      accel_limit=accel_limit, velocity_limit=velocity_limit,
+                                      watchdog_timeout=watchdog_timeout, query=True)
+        data = bytes(command.data)
+        offsets = []
+        for index, value in enumerate(_TEMPLATE_VALUES):
+            if index == 2 and not with_torque:
+                offsets.append(None)
+                continue
+            packed = _F32.pack(value)
+            if data.count(packed) != 1:
+                return None
+            offsets.append(data.index(packed))
+        return cls(command, tuple(offsets))
+
+    def encode(self, position: float, velocity: float, torque: float, accel_limit: float, velocity_limit: float,
+               watchdog_timeout: float):
+        """
+        Gives the template command with these values, the same bytes moteus would encode.
+
+        :return moteus.Command: The reused command object.
+        """
+        buffer = self.buffer
+        offsets = self.offsets
+        pack_into = _F32.pack_into
+        pack_into(buffer, offsets[0], position)
+        pack_into(buffer, offsets[1], velocity)
+        if offsets[2] is not None:
+            pack_into(buffer, offsets[2], torque)
+        pack_into(buffer, offsets[3], accel_limit)
+        pack_into(buffer, offsets[4], velocity_limit)
+        pack_into(buffer, offsets[5], watchdog_timeout)
+        self.command.data = bytes(buffer)
+        return self.command
+
 
 """
 A swerve motor class
 
-Defines all the functions required for motor movement using the moteus library.
+Builds the moteus commands of one motor with the make_*_command() methods, which the drive batches
+with the commands of every other motor into one transport cycle, and keeps the telemetry snapshot
+of the motor from the replies.
 """
 class SwerveMotor:
     def __init__(self,
                  motorID: int,
-                 transport: moteus_pi3hat.Pi3HatRouter,
+                 transport: moteus.Transport,
                  accel_limit: float=20.0,
                  velocity_limit: float=20.0,
-                 watchdog_timeout: float=0.5):
+                 watchdog_timeout: float=0.5,
+                 max_staleness: float=0.1,
+                 suppression: str=Constants.COMMAND_SUPPRESSION,
+                 clock=time.monotonic,
+                 reuse_frames: bool=False):
         """
         Constructs a swerve motor instance.
 
         :param motorID (int): Moteus controller ID.
-        :param transport (Pi3HatRouter): Transport object.
+        :param transport (moteus.Transport): Transport object (a Pi3HatRouter on the robot).
         :param accel_limit (float): Acceleration limit in rev/s².
         :param velocity_limit (float): Velocity limit in rev/s.
         :param watchdog_timeout (float): Timeout before function stops running (if you don't know how this param works, better not touch it).
+        :param max_staleness (float): How old the telemetry snapshot can get in seconds before it is considered stale.
+        :param suppression (str): What to do with a position mode command that repeats the last one: "query" sends a query-only frame instead, "skip" sends nothing, "off" sends it anyway.
+        :param clock (function): Gives the current time in seconds, for snapshot timestamps and command refreshes.
+        :param reuse_frames (bool): Reuse one query command and patch position mode frames in place (see PositionFrame), instead of building new ones per command.
         """
 
         # Set the local properties to be accessible from within the class.
         self.accel_limit = accel_limit
         self.velocity_limit = velocity_limit
         self.watchdog_timeout = watchdog_timeout
+        self.max_staleness = max_staleness
+        self.clock = clock
         self.motor = moteus.Controller(id=motorID, transport=transport)
-
-    @property
-    async def position(self):
+        self.snapshot = MotorSnapshot()
+
+        # The last position mode command that was actually sent, as (position, velocity, feedforward_torque,
+        # accel_limit, velocity_limit, watchdog_timeout), and when. None when the next command must be sent in full.
+        self.suppression = suppression
+        self.refresh_period = watchdog_timeout * Constants.COMMAND_REFRESH_FRACTION
+        self._last_command = None
+        self._last_command_time = 0.0
+        self._full_frame_size = 0
+        self.reset_command_stats()
+
+        # Without torque, with torque. None where moteus could not be patched, which falls back to make_position().
+        self._frames = (PositionFrame.build(self.motor, False), PositionFrame.build(self.motor, True)) if reuse_frames else (None, None)
+        self._query_command = self.motor.make_query() if reuse_frames else None
+
+    def reset_command_stats(self) -> None:
         """
-        Gives the current absolute motor position (relative to position 0).
-
-        :return float: The current absolute motor position in revolutions.
+        Clears the counts of sent and suppressed commands.
         """
+        self.commands_sent = 0
+        self.commands_downgraded = 0  # sent as a query-only frame
+        self.commands_skipped = 0  # not sent at all
+        self.bytes_saved = 0
 
-        # Query the motor for its current state
-        result = await self.motor.set_position(position=math.nan, query=True)
-
-        print(f"Motor {self.motor.id} position register is of type {type(result.values[moteus.Register.POSITION])}")
-
-        # Extract the position from the result
-        return result.values[moteus.Register.POSITION]
-
-    @property
-    async def velocity(self) -> float:
+    def invalidate_command_cache(self) -> None:
         """
-        Gives the current velocity
-
-        :return float: The current velocity of the motor in rev/s.
+        Makes the next position mode command go out in full, e.g. after the motor left position mode.
         """
+        self._last_command = None
 
-        # Query the motor for its current state
-        result = await self.motor.set_position(position=math.nan, query=True)
+    def update_snapshot(self, result) -> None:
+        """
+        Fills the telemetry snapshot from the query reply of this motor.
 
-        # Extract the position from the result
-        return result.values[moteus.Register.VELOCITY]
-    
-    @property
-    async def values(self) -> list:
+        :param result (moteus.Result): The reply of this motor from a transport cycle.
         """
-        Gives a list of properties exposed by the moteus library for reading or writing.
-        The full list can be found here:
-        https://github.com/mjbots/moteus/blob/main/lib/python/moteus/moteus.py#L149 (class code)
-        https://github.com/mjbots/moteus/blob/main/docs/reference.md#a2b-registers (descriptors)
-        
-        :returns [any]: A list of Register object properties
+        values = result.values
+        snapshot = self.snapshot
+        snapshot.position = values.get(moteus.Register.POSITION, snapshot.position)
+        snapshot.velocity = values.get(moteus.Register.VELOCITY, snapshot.velocity)
+        snapshot.torque = values.get(moteus.Register.TORQUE, snapshot.torque)
+        snapshot.fault = values.get(moteus.Register.FAULT, snapshot.fault)
+        snapshot.mode = values.get(moteus.Register.MODE, snapshot.mode)
+        snapshot.temperature = values.get(moteus.Register.TEMPERATURE, snapshot.temperature)
+        snapshot.voltage = values.get(moteus.Register.VOLTAGE, snapshot.voltage)
+        snapshot.timestamp = self.clock()
+
+        if snapshot.mode is not None and snapshot.mode != moteus.Mode.POSITION:
+            # Stopped, faulted or timed out: repeating the last target through a query would not move it again.
+            self._last_command = None
+
+    def is_stale(self, now: float = None) -> bool:
         """
-        result = await self.motor.set_position(query=True)
+        Checks whether the telemetry snapshot is older than max_staleness.
 
-        return result.values
+        :param now (float): The current time.monotonic() time. Read from the clock if not given.
 
-    async def setAngle(self, angle_deg: float, transport: moteus.Transport) -> bool:
+        :return bool: True if the snapshot is too old to be trusted, False otherwise.
         """
-        A position mode function.
-        
-        Move to a target angle in degrees.
-        Returns boolean and retrived position after rotation
-
-        NOTE: If the wait_time parameter is not set, set_position will not fully run unless you manually implement asyncio.sleep().
-        It is better if you implement this yourself IF you have more than 1 motor.
-
-        :param angle_deg (float): An angle in degrees to move to. Will be converted to revolutions. Motor will move  to this angle relative to its current position, and with a max speed of what is set in self.velocity_limit in rev/s. It will reach this max speed in self.accel_limit in rev/s².
-        :param transport (moteus.Transport): The transport object to use for communication. Should be the same transport used in every motor.
+        return self.snapshot.age(self.clock() if now is None else now) > self.max_staleness
 
-        :return bool: True if the angle was set successfully, False otherwise.
+    def make_query_command(self):
         """
+        Builds (but does not send) a query-only command, used to refresh the telemetry snapshot.
 
-        try:
-            angle_rev = angle_deg / 360.0
+        :return moteus.Command: The command to pass to transport.cycle().
+        """
+        if self._query_command is not None:
+            return self._query_command
+        return self.motor.make_query()
 
-            # degAngle = await self.position * 360
+    async def query(self) -> MotorSnapshot:
+        """
+        Queries the motor on its own, in a transport cycle of one frame, and updates the telemetry snapshot.
 
-            # if degAngle == None:
-            #     raise TypeError(
-            #         "Degree angle in setAngle function returned as type None")
+        Only for tools and startup. While driving, batch make_query_command() or the commands of every
+        motor into one cycle instead (see SwerveDrive.sync_all()).
 
-            # adjustedAngle = angle_rev  # temp angle for now, add calculations in later
+        :return MotorSnapshot: The updated snapshot, the same object as self.snapshot.
 
-            await transport.cycle([self.motor.make_position(
-                position=angle_rev,
-                accel_limit=self.accel_limit,
-                velocity_limit=self.velocity_limit,
-                watchdog_timeout=self.watchdog_timeout
-            )])
-
-            return True
-        except Exception as e:
-            print(f"Error caught in setAngle function: {e}")
-            await self.emergency_stop(f"Error caught in setAngle function: {e}")
-            return False
+        :raises RuntimeError: If the motor did not reply.
+        """
+        result = await self.motor.execute(self.make_query_command())
+        if result is None:
+            raise RuntimeError(f"Motor {self.motor.id} did not reply to a query")
+        self.update_snapshot(result)
+        return self.snapshot
 
-    async def addToCurrentPos(self, position_val: float, transport: moteus.Transport) -> bool:
+    def make_position_command(self, position_val: float):
         """
-        Move to a position in revolutions relative to current position.
+        Builds (but does not send) a position mode command to an absolute position in revolutions.
 
-        NOTE: If the wait_time parameter is not set, set_position will not fully run unless you manually implement asyncio.sleep().
-        It is better if you implement this yourself IF you have more than 1 motor.
+        The command also requests a query reply so that the state of the motor comes back in the same cycle.
+        Use this to batch several motors into a single transport.cycle() call.
 
-        :param position_val (float): The position target to move to in revolutions. This will be added to the current position of the motor, not set as an absolute position.
-        :param transport (moteus.Transport): The transport object to use for communication. Should be the same transport used in every motor.
+        :param position_val (float): The position target to move to in revolutions.
 
-        :return bool: True if the position was set successfully, False otherwise.
+        :return moteus.Command: The command to pass to transport.cycle(). See make_position_mode_command() for when it is suppressed.
         """
-        try:
-            await transport.cycle([self.motor.make_position(
-                position=(position_val + self.position),
-                accel_limit=self.accel_limit,
-                velocity_limit=self.velocity_limit,
-                watchdog_timeout=self.watchdog_timeout)
-            ])
-
-            return True
-        except Exception as e:
-            print(f"Error caught in addToCurrentPosition function: {e}")
-            await self.emergency_stop(f"Error caught in addToCurrentPosition function: {e}")
-            return False
+        return self.make_position_mode_command(position_val, math.nan)
 
-    async def setPosition(self, position_val: float, transport: moteus.Transport ) -> bool:
+    def make_velocity_command(self, velocity_val: float, feedforward_torque: float = None):
         """
-        A position mode function.
+        Builds (but does not send) a velocity control mode command in revolutions/sec.
 
-        Move to an absolute position in revolutions.
+        The command also requests a query reply so that the state of the motor comes back in the same cycle.
+        Use this to batch several motors into a single transport.cycle() call.
 
-        NOTE: If the wait_time parameter is not set, set_position will not fully run unless you manually implement asyncio.sleep().
-        It is better if you implement this yourself IF you have more than 1 motor that you want to run.
+        :param velocity_val (float): The velocity target in revolutions per second.
+        :param feedforward_torque (float): Torque to add to the moteus PID output, in Nm. None for none.
 
-        :param position_val (float): The position target to move to in revolutions.
-        :param transport (moteus.Transport): The transport object to use for communication.
-
-        :return bool: True if the position was set successfully, False otherwise.
+        :return moteus.Command: The command to pass to transport.cycle(). See make_position_mode_command() for when it is suppressed.
         """
-        try:
-            await transport.cycle([self.motor.make_position(
-                position=position_val,
-                accel_limit=self.accel_limit,
-                velocity_limit=self.velocity_limit,
-                watchdog_timeout=self.watchdog_timeout)
-            ])
+        return self.make_position_mode_command(math.nan, velocity_val, feedforward_torque=feedforward_torque)
 
-            return True
-        except Exception as e:
-            print(f"Error caught in setPos function: {e}")
-            await self.emergency_stop(f"Error caught in setPos function: {e}")
-            return False
-
-    async def setVelocity(self, velocity_val: float, transport: moteus.Transport) -> bool:
+    def make_position_mode_command(self, position_val: float, velocity_val: float, now: float = None,
+                                   feedforward_torque: float = None):
         """
-        A velocity control mode function.
-
-        Sets the velocity of the motor in revolutions/sec.
+        Builds (but does not send) a position mode command, unless it repeats the last one that was sent.
 
-        NOTE: If the wait_time parameter is not set, set_position will not fully run unless you manually implement asyncio.sleep().
-        It is better if you implement this yourself IF you have more than 1 motor that you want to run.
+        A command whose position, velocity and feedforward torque are within COMMAND_POSITION_EPSILON,
+        COMMAND_VELOCITY_EPSILON and COMMAND_TORQUE_EPSILON of the last one sent (with the same limits) is suppressed: it becomes a query-only frame, or with
+        suppression="skip" nothing at all. The full command is still sent again every refresh_period, well
+        before the moteus watchdog_timeout runs out.
 
-        
-        :param velocity_val The velocity target in revolutions per second.
+        :param position_val (float): The position target in revolutions, nan for none.
+        :param velocity_val (float): The velocity target in revolutions per second.
+        :param now (float): The current time.monotonic() time. Read from the clock if not given.
+        :param feedforward_torque (float): Torque to add to the moteus PID output, in Nm. None to leave it out of the frame.
 
-        :return bool: True if the velocity was set successfully, False otherwise.
+        :return moteus.Command: The command to pass to transport.cycle(), or None if it was skipped.
         """
-
-        try:
-            await transport.cycle([self.motor.make_position(
-                position=math.nan,
+        if now is None:
+            now = self.clock()
+
+        torque = math.nan if feedforward_torque is None else feedforward_torque
+        command = (position_val, velocity_val, torque, self.accel_limit, self.velocity_limit, self.watchdog_timeout)
+        last = self._last_command
+        if (self.suppression != "off" and last is not None
+                and now - self._last_command_time < self.refresh_period
+                and _close(position_val, last[0], Constants.COMMAND_POSITION_EPSILON)
+                and _close(velocity_val, last[1], Constants.COMMAND_VELOCITY_EPSILON)
+                and _close(torque, last[2], Constants.COMMAND_TORQUE_EPSILON)
+                and command[3:] == last[3:]):
+            if self.suppression == "skip":
+                self.commands_skipped += 1
+                self.bytes_saved += self._full_frame_size
+                return None
+            query = self.make_query_command()
+            self.commands_downgraded += 1
+            self.bytes_saved += self._full_frame_size - len(query.data)
+            return query
+
+        frame = self._frames[feedforward_torque is not None]
+        if frame is not None:
+            full = frame.encode(position_val, velocity_val, torque, self.accel_limit, self.velocity_limit, self.watchdog_timeout)
+        else:
+            full = self.motor.make_position(
+                position=position_val,
                 velocity=velocity_val,
+                feedforward_torque=feedforward_torque,
                 accel_limit=self.accel_limit,
                 velocity_limit=self.velocity_limit,
-                watchdog_timeout=self.watchdog_timeout)
-            ])
-
-            return True
-        except Exception as e:
-            print(f"Error caught in setVelocity function: {e}")
-            await self.emergency_stop(f"Error caught in setVelocity function: {e}")
-            return False
+                watchdog_timeout=self.watchdog_timeout,
+                query=True)
+        self._last_command = command
+        self._last_command_time = now
+        self._full_frame_size = len(full.data)
+        self.commands_sent += 1
+        return full
+
+    def make_stop_command(self):
+        """
+        Builds (but does not send) a stop command, which also clears outstanding faults.
 
-    async def stop(self) -> None:
+        :return moteus.Command: The command to pass to transport.cycle().
         """
-        Stop the motor and clears all outstanding faults.
+        self._last_command = None
+        return self.motor.make_stop(query=True)
+
+    def make_reset_position_command(self, position_val: float = 0.0):
         """
-        await self.motor.set_stop()
+        Builds (but does not send) a command that sets the current output position to exactly position_val, without moving the motor.
 
-    async def emergency_stop(self, error_message: str) -> None:
+        :param position_val (float): The position the motor should now report, in revolutions.
+
+        :return moteus.Command: The command to pass to transport.cycle().
         """
-        Stops the motor, clears all outstanding faults.
-        Exits out of the program with a critical error.
+        self._last_command = None
+        return self.motor.make_set_output_exact(position=position_val, query=True)
 
-        :params error_message (any): An error message to be displayed before quitting the program.
+    async def stop(self) -> MotorSnapshot:
         """
-        await self.motor.set_stop()
+        Stops the motor on its own, in a transport cycle of one frame, which also clears outstanding faults.
 
-        if error_message is not None:
-            print(f"A critical error has occurred and the program needs to quit. Error message: {error_message}")
-        else:
-            print("An unknown error has occurred and the program needs to quit.")
+        Only for tools. The drive stops every motor in one cycle with make_stop_command().
 
-        exit(1)
\ No newline at end of file
+        :return MotorSnapshot: The updated snapshot, or the last one if the motor did not reply.
+        """
+        result = await self.motor.execute(self.make_stop_command())
+        if result is not None:
+            self.update_snapshot(result)
+        return self.snapshot
@@ -0,0 +1,366 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import numpy as np
+import Utils.Constants as Constants
+
+"""
+Autonomous paths: loading, precomputed sample tables with a disk cache, and a holonomic follower.
+
+A path (waypoints plus constraints, see load_path()) is turned into a time-parameterized
+trajectory ahead of time, and resampled into a table with one row per control loop tick.
+The table is cached on disk under a hash of the path, constraints and module geometry, so it is only
+generated again when the path or robot changes, and generation runs in an executor so it never stalls startup.
+At runtime, following the path costs a table lookup and one interpolation per tick.
+"""
+
+# Bump this when the way tables are generated changes, so old cache files are not used.
+GENERATOR_VERSION = 1
+
+# The columns of a sample table. Positions and velocities are in field coordinates.
+TABLE_COLUMNS = ("t", "x", "y", "heading", "vx", "vy", "omega")
+T, X, Y, HEADING, VX, VY, OMEGA = range(len(TABLE_COLUMNS))
+
+DEFAULT_CONSTRAINTS = {
+    "max_velocity": 2.0,  # meters per second
+    "max_acceleration": 1.5,  # meters per second squared
+    "start_velocity": 0.0,
+    "end_velocity": 0.0,
+    "reversed": False,
+}
+
+
+def load_path(path: str) -> dict:
+    """
+    Loads a path file.
+
+    A path file is JSON like:
+        {
+            "waypoints": [
+                {"x": 0.0, "y": 0.0, "tangent": 0.0, "heading": 0.0},
+                {"x": 2.0, "y": 1.0, "tangent": 30.0},
+                {"x": 4.0, "y": 0.0, "tangent": 0.0, "heading": 90.0}
+            ],
+            "constraints": {"max_velocity": 2.0, "max_acceleration": 1.5}
+        }
+    x and y are in meters. tangent is the direction of travel through the waypoint and heading is
+    the direction the robot faces there, both in degrees. Waypoints without a heading are
+    interpolated between the ones that have one. Missing constraints use DEFAULT_CONSTRAINTS.
+
+    :param path (str): The path file.
+
+    :return dict: The path, with every waypoint field and constraint filled in.
+    """
+    with open(path) as file:
+        spec = json.load(file)
+
+    waypoints = spec.get("waypoints", [])
+    if len(waypoints) < 2:
+        raise ValueError(f"{path} needs at least two waypoints")
+
+    return {
+        "waypoints": [
+            {
+                "x": float(waypoint["x"]),
+                "y": float(waypoint["y"]),
+                "tangent": float(waypoint.get("tangent", 0.0)),
+                "heading": None if waypoint.get("heading") is None else float(waypoint["heading"]),
+            }
+            for waypoint in waypoints
+        ],
+        "constraints": {**DEFAULT_CONSTRAINTS, **spec.get("constraints", {})},
+    }
+
+
+def module_geometry(translations=None) -> list:
+    """
+    Gives module positions as plain (x, y) pairs in meters, for the trajectory constraint and the cache key.
+
+    :param translations (list): The position of each module relative to the robot center, as Translation2d or (x, y).
+        The modules of Utils/Constants.py if not given.
+    """
+    if translations is None:
+        translations = (Constants.FRONT_LEFT, Constants.FRONT_RIGHT, Constants.BACK_LEFT, Constants.BACK_RIGHT)
+    return [[float(t.x), float(t.y)] if hasattr(t, "x") else [float(t[0]), float(t[1])] for t in translations]
+
+
+def path_key(spec: dict, period: float, translations=None) -> str:
+    """
+    Gives the cache key of a path: a hash of its waypoints, constraints, the sample period, the module
+    geometry it is constrained for and the generator version.
+    """
+    canonical = json.dumps({"spec": spec, "period": period, "modules": module_geometry(translations),
+                            "version": GENERATOR_VERSION}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+class TrajectoryTable:
+    """
+    A trajectory resampled at a fixed period, so sampling it is an index computation and one interpolation.
+    """
+
+    def __init__(self, samples: np.ndarray):
+        """
+        :param samples (np.ndarray): N x len(TABLE_COLUMNS) rows, evenly spaced in time starting at t = 0.
+        """
+        self.samples = samples
+        self.period = float(samples[1, T] - samples[0, T]) if len(samples) > 1 else Constants.LOOP_PERIOD
+        self.duration = float(samples[-1, T])
+        self._rows = samples.tolist()
+        self._last = len(self._rows) - 1
+
+    def sample(self, t: float):
+        """
+        Gives the reference at a time along the trajectory, clamped to its start and end.
+
+        :param t (float): Seconds since the start of the trajectory.
+
+        :return tuple: (x, y, heading, vx, vy, omega) in meters, radians, m/s and rad/s, in field coordinates.
+        """
+        if t <= 0.0:
+            row = self._rows[0]
+            return row[X], row[Y], row[HEADING], row[VX], row[VY], row[OMEGA]
+        if t >= self.duration:
+            row = self._rows[self._last]
+            return row[X], row[Y], row[HEADING], row[VX], row[VY], row[OMEGA]
+
+        position = t / self.period
+        index = min(int(position), self._last - 1)
+        fraction = position - index
+        a = self._rows[index]
+        b = self._rows[index + 1]
+        return (
+            a[X] + (b[X] - a[X]) * fraction,
+            a[Y] + (b[Y] - a[Y]) * fraction,
+            a[HEADING] + (b[HEADING] - a[HEADING]) * fraction,
+            a[VX] + (b[VX] - a[VX]) * fraction,
+            a[VY] + (b[VY] - a[VY]) * fraction,
+            a[OMEGA] + (b[OMEGA] - a[OMEGA]) * fraction,
+        )
+
+
+def generate_table(spec: dict, period: float = Constants.LOOP_PERIOD, translations=None) -> TrajectoryTable:
+    """
+    Generates the sample table of a path. Slow compared to a tick, use load_table() or load_trajectory() instead.
+
+    :param spec (dict): A path from load_path().
+    :param period (float): The time between samples, in seconds.
+    :param translations (list): The module positions of the robot (e.g. RobotProfile.translations). The modules of Utils/Constants.py if not given.
+    """
+    # Imported here so following a cached path does not need the trajectory generator.
+    from wpimath.geometry import Pose2d, Rotation2d, Translation2d
+    from wpimath.kinematics import SwerveDrive4Kinematics
+    from wpimath.trajectory import TrajectoryConfig, TrajectoryGenerator
+
+    constraints = spec["constraints"]
+    config = TrajectoryConfig(constraints["max_velocity"], constraints["max_acceleration"])
+    config.setKinematics(SwerveDrive4Kinematics(*[Translation2d(x, y) for x, y in module_geometry(translations)]))
+    config.setStartVelocity(constraints["start_velocity"])
+    config.setEndVelocity(constraints["end_velocity"])
+    config.setReversed(constraints["reversed"])
+
+    waypoints = spec["waypoints"]
+    trajectory = TrajectoryGenerator.generateTrajectory(
+        [Pose2d(w["x"], w["y"], Rotation2d.fromDegrees(w["tangent"])) for w in waypoints], config)
+
+    count = int(math.ceil(trajectory.totalTime() / period)) + 1
+    samples = np.zeros((count, len(TABLE_COLUMNS)))
+    for i in range(count):
+        state = trajectory.sample(min(i * period, trajectory.totalTime()))
+        direction = state.pose.rotation()
+        samples[i, T] = i * period
+        samples[i, X] = state.pose.X()
+        samples[i, Y] = state.pose.Y()
+        samples[i, VX] = state.velocity * direction.cos()
+        samples[i, VY] = state.velocity * direction.sin()
+
+    # The robot heading is independent of the direction of travel: interpolate it by distance
+    # along the path between the waypoints that give one.
+    steps = np.hypot(np.diff(samples[:, X]), np.diff(samples[:, Y]))
+    distance = np.concatenate(([0.0], np.cumsum(steps)))
+    waypoint_distances = []
+    waypoint_headings = []
+    search_from = 0
+    for waypoint in waypoints:
+        gaps = np.hypot(samples[search_from:, X] - waypoint["x"], samples[search_from:, Y] - waypoint["y"])
+        nearest = search_from + int(np.argmin(gaps))
+        search_from = nearest
+        if waypoint["heading"] is not None:
+            waypoint_distances.append(distance[nearest])
+            waypoint_headings.append(math.radians(waypoint["heading"]))
+
+    if waypoint_headings:
+        headings = np.unwrap(np.array(waypoint_headings))
+        samples[:, HEADING] = np.interp(distance, waypoint_distances, headings)
+        if len(samples) > 1:
+            samples[:, OMEGA] = np.gradient(samples[:, HEADING], period)
+
+    return TrajectoryTable(samples)
+
+
+def load_table(spec: dict, period: float = Constants.LOOP_PERIOD,
+               cache_dir: str = Constants.TRAJECTORY_CACHE_DIR, translations=None) -> TrajectoryTable:
+    """
+    Gives the sample table of a path from the cache, generating and caching it if the path or robot geometry has changed.
+
+    :param spec (dict): A path from load_path().
+    :param period (float): The time between samples, in seconds.
+    :param cache_dir (str): The directory of cached tables.
+    :param translations (list): The module positions of the robot. The modules of Utils/Constants.py if not given.
+    """
+    cache_path = os.path.join(cache_dir, f"{path_key(spec, period, translations)}.npy")
+    if os.path.exists(cache_path):
+        return TrajectoryTable(np.load(cache_path))
+
+    table = generate_table(spec, period, translations)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first, so an interrupted write never leaves a broken cache entry.
+    temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        np.save(file, table.samples)
+    os.replace(temporary_path, cache_path)
+    return table
+
+
+async def load_trajectory(path: str, period: float = Constants.LOOP_PERIOD,
+                          cache_dir: str = Constants.TRAJECTORY_CACHE_DIR, executor=None, translations=None) -> TrajectoryTable:
+    """
+    Loads a path file and gives its sample table, loading or generating it in an executor so the event loop keeps running.
+
+    Example usage:
+        task = asyncio.ensure_future(load_trajectory("paths/example.json"))
+        ...  # startup continues
+        table = await task
+
+    :param path (str): The path file.
+    :param period (float): The time between samples, in seconds.
+    :param cache_dir (str): The directory of cached tables.
+    :param executor (concurrent.futures.Executor): Where to generate the table. The default executor if not given.
+    :param translations (list): The module positions of the robot the path is driven with. The modules of Utils/Constants.py if not given.
+    """
+    loop = asyncio.get_running_loop()
+    spec = await loop.run_in_executor(executor, load_path, path)
+    # Plain pairs, so the table can also be generated in a process pool.
+    return await loop.run_in_executor(executor, load_table, spec, period, cache_dir, module_geometry(translations))
+
+
+class HolonomicFollower:
+    """
+    Follows a trajectory table with the swerve drive: the table's velocities as feedforward, plus
+    proportional correction of the position and heading error against the estimated pose.
+
+    Example usage:
+        follower = HolonomicFollower(swerve_drive, table)
+        follower.start(time.monotonic())
+        while not follower.is_finished():
+            await follower.follow(dt, time.monotonic())  # every tick, instead of set_drive_speeds()
+    """
+
+    def __init__(self, swerve_drive, table: TrajectoryTable, translation_kp: float = None, rotation_kp: float = None):
+        """
+        :param swerve_drive (SwerveDrive): The drive to follow the trajectory with.
+        :param table (TrajectoryTable): The trajectory to follow.
+        :param translation_kp (float): Meters per second of correction per meter of position error. From the drive's profile if not given.
+        :param rotation_kp (float): Radians per second of correction per radian of heading error. From the drive's profile if not given.
+        """
+        self.swerve_drive = swerve_drive
+        self.table = table
+        profile = swerve_drive.profile
+        self.translation_kp = profile.trajectory_translation_kp if translation_kp is None else translation_kp
+        self.rotation_kp = profile.trajectory_rotation_kp if rotation_kp is None else rotation_kp
+        self.start_time = None
+        self.elapsed = 0.0
+        self.last_speeds = (0.0, 0.0, 0.0)  # The last (forward, left, omega) commanded.
+
+    def start(self, now: float) -> None:
+        """
+        Starts following the trajectory from its beginning.
+
+        :param now (float): The current time.monotonic() time.
+        """
+        self.start_time = now
+        self.elapsed = 0.0
+
+    def is_finished(self) -> bool:
+        return self.start_time is not None and self.elapsed >= self.table.duration
+
+    async def follow(self, dt: float, now: float) -> None:
+        """
+        Drives towards the reference at the current time along the trajectory, for one tick.
+
+        :param dt (float): The loop period, in seconds.
+        :param now (float): The current time.monotonic() time.
+        """
+        if self.start_time is None:
+            self.start(now)
+        self.elapsed = now - self.start_time
+
+        x, y, heading, vx, vy, omega = self.table.sample(self.elapsed)
+        pose = self.swerve_drive.get_pose()
+        robot_heading = pose.rotation().radians()
+
+        field_vx = vx + self.translation_kp * (x - pose.X())
+        field_vy = vy + self.translation_kp * (y - pose.Y())
+        omega += self.rotation_kp * math.remainder(heading - robot_heading, 2.0 * math.pi)
+
+        # Field to robot coordinates.
+        cos_heading = math.cos(robot_heading)
+        sin_heading = math.sin(robot_heading)
+        forward = field_vx * cos_heading + field_vy * sin_heading
+        left = -field_vx * sin_heading + field_vy * cos_heading
+
+        self.last_speeds = (forward, left, omega)
+        await self.swerve_drive.set_drive_speeds(forward, left, omega, False, dt)
+
+
+class PathThenTeleop:
+    """
+    The tick of main.py: with a path, holds still until its trajectory is ready, follows it, and then hands
+    over to the joystick. Without one it is the joystick tick. A replay runs the same tick, so a run recorded with
+    a path replays through the same follower.
+
+    Example usage:
+        drive_tick = PathThenTeleop(swerve_drive, has_path=True)
+        drive_tick.start(table)  # once the trajectory is ready
+        await drive_tick.tick(dt)  # every tick
+    """
+
+    def __init__(self, swerve_drive, has_path: bool = False):
+        """
+        :param swerve_drive (SwerveDrive): The drive to run.
+        :param has_path (bool): Whether a trajectory will be given to start(). The drive holds still until it is.
+        """
+        self.swerve_drive = swerve_drive
+        self.waiting = has_path
+        self.follower = None
+
+    def start(self, table: TrajectoryTable) -> None:
+        """
+        Follows a trajectory from the next tick on.
+
+        :param table (TrajectoryTable): The trajectory to follow.
+        """
+        self.follower = HolonomicFollower(self.swerve_drive, table)
+        self.waiting = False
+
+    async def tick(self, dt: float) -> None:
+        """
+        Runs one tick of the drive, up to and including swerve_drive_periodic().
+
+        :param dt (float): The time since the last tick in seconds.
+        """
+        swerve_drive = self.swerve_drive
+        if self.follower is not None:
+            await self.follower.follow(dt, swerve_drive.clock())
+            if self.follower.is_finished():
+                # Hand over to the joystick from the speed the path ended at, ramping from there.
+                swerve_drive.setpoint_generator.reset(*self.follower.last_speeds)
+                swerve_drive.heading_controller.reset()  # The path turned the robot, hold the heading it ended at.
+                self.follower = None
+        elif self.waiting:
+            await swerve_drive.set_drive_speeds(0.0, 0.0, 0.0, False, dt)
+        else:
+            await swerve_drive.teleop_periodic(dt)
+        await swerve_drive.swerve_drive_periodic()
@@ -4,14 +4,163 @@ import wpimath.kinematics
 
 # === Drivetrain / Module Constants ===
 
-DRIVE_MOTOR_GEAR_RATIO = 0
-STEER_MOTOR_GEAR_RATIO = 0
-WHEEL_DIAMETER = 0
+DRIVE_MOTOR_GEAR_RATIO = 6.75
+# Not applied in code: the steer servos are configured with motor_position.rotor_to_output_ratio = 1 / STEER_MOTOR_GEAR_RATIO,
+# so their positions and velocities are already in module revolutions.
+STEER_MOTOR_GEAR_RATIO = 150.0 / 7.0
+WHEEL_DIAMETER = 0.1016  # meters (4 in)
 
-ROBOT_WIDTH = 0.0
+ROBOT_WIDTH = 0.6  # meters, distance between the left and right modules
 SWERVE_MODULE_OFFSET = ROBOT_WIDTH / 2.0
 
-MAX_SPEED = 0.0
+MAX_SPEED = 4.5  # meters per second
+
+# Drive motor revolutions per module revolution with the wheel held still (see Swerve/ModuleModel.py). 0.0 for none.
+COUPLING_RATIO = 0.0
+
+# === CAN Bus Layout ===
+
+# Pi3Hat bus number -> moteus ids on that bus (drive, steer of one module per bus)
+SERVO_BUS_MAP = {
+    1: [11, 12],
+    2: [13, 14],
+    3: [15, 16],
+    4: [17, 18],
+}
+
+# The moteus register map version the code is written against, and the oldest firmware (major << 16 | minor << 8 | micro) it supports.
+REGISTER_MAP_VERSION = 5
+MIN_FIRMWARE_VERSION = 0x010000
+DISCOVERY_ATTEMPTS = 3  # cycles to wait for every servo to reply at startup
+CONFIG_READ_ATTEMPTS = 20  # diagnostic read cycles to wait for every servo to answer a conf get (see SwerveDrive.verify_servo_config())
+
+# Calibrated steer offsets (from SwerveDrive.calibrate_steer_offsets()), overriding the offsets of the robot profile.
+STEER_OFFSET_PATH = "calibration/steer_offsets.json"
+
+# === Command Suppression ===
+
+# A position mode command this close to the last one sent is not sent again (see SwerveMotor.make_position_mode_command).
+COMMAND_SUPPRESSION = "query"  # "query" (send a query-only frame instead), "skip" (send nothing) or "off"
+COMMAND_POSITION_EPSILON = 1e-4  # revolutions
+COMMAND_VELOCITY_EPSILON = 1e-3  # rev/s
+COMMAND_TORQUE_EPSILON = 1e-3  # Nm of feedforward torque
+COMMAND_REFRESH_FRACTION = 0.5  # resend in full after this fraction of the motor's watchdog_timeout
+
+# === Control Loop ===
+
+LOOP_RATE_HZ = 250.0
+LOOP_PERIOD = 1.0 / LOOP_RATE_HZ
+
+# === Fast Path ===
+
+# Reuse command frames, module positions and buffers every tick instead of allocating (see SwerveDrive, hotpath_benchmark.py).
+FAST_PATH = False
+# With the fast path, main.py freezes the garbage collector after startup and collects the young generations
+# every this many ticks in the slack after a tick instead (see ControlLoop).
+GC_COLLECT_PERIOD = 250
+
+# === Drive Feedforward ===
+
+# Linear drive feedforward, torque = kS * sign(v) + kV * v + kA * a, used by modules without a characterized table.
+DRIVE_KS = 0.0  # Nm
+DRIVE_KV = 0.0  # Nm per rev/s
+DRIVE_KA = 0.0  # Nm per rev/s²
+FEEDFORWARD_TABLE_POINTS = 41  # entries of a feedforward table, from -velocity_limit to velocity_limit
+FEEDFORWARD_MIN_SAMPLES = 20  # logged samples a table entry needs to be characterized from the log
+# Characterized feedforward tables (from characterize.py), overriding the gains of the robot profile.
+FEEDFORWARD_PATH = "calibration/feedforward.json"
+
+# === Characterization ===
+
+# Sweeps of characterize.py sweep (see Swerve/Characterization.py). Drive velocities are in motor rev/s, steer in module rev/s.
+SWEEP_DRIVE_RAMP_RATE = 2.0  # rev/s², quasistatic ramp
+SWEEP_DRIVE_MAX_VELOCITY = 10.0  # rev/s, top of the quasistatic ramp
+SWEEP_DRIVE_STEP_VELOCITY = 6.0  # rev/s, dynamic step
+SWEEP_STEER_RAMP_RATE = 0.5  # rev/s²
+SWEEP_STEER_MAX_VELOCITY = 2.0  # rev/s
+SWEEP_STEER_STEP_VELOCITY = 1.5  # rev/s
+SWEEP_STEP_DURATION = 1.0  # seconds a dynamic step is held
+SWEEP_REST_DURATION = 1.0  # seconds at rest before every sweep
+SWEEP_SATURATION = 0.9  # a motor is at its top speed once it stays below this fraction of the commanded velocity
+TUNING_MARGIN = 0.8  # fitted limits are this fraction of what the motors reached
+TUNING_WATCHDOG_PERIODS = 50  # watchdog_timeout in 99th percentile loop periods
+TUNING_MIN_WATCHDOG = 0.05  # seconds
+
+# === Diagnostics ===
+
+# Health checks and live table of swerve_diag.py (see Swerve/Diagnostics.py).
+DIAG_RATE_HZ = 100.0  # query rate of the live table
+DIAG_LATENCY_CYCLES = 200  # query cycles per bus for the latency measurement
+DIAG_REST_DURATION = 0.5  # seconds the encoders are watched at rest
+DIAG_ENCODER_NOISE = 0.002  # revolutions a motor at rest may wander
+DIAG_REST_VELOCITY = 0.05  # rev/s a motor at rest may report
+DIAG_STEER_ANGLES = (90.0, 180.0, 270.0, 0.0)  # degrees the steer sweep visits, from forward
+DIAG_STEER_TOLERANCE = 0.01  # module revolutions (3.6°) the steer has to settle within
+DIAG_STEER_TIMEOUT = 1.0  # seconds allowed to reach each angle
+DIAG_DRIVE_SPEED = 0.5  # m/s of the drive spin
+DIAG_DRIVE_DURATION = 1.0  # seconds of the drive spin
+DIAG_DRIVE_TOLERANCE = 0.15  # fraction the measured drive speed may be off by once it settled
+
+# === Chassis Limits ===
+
+CHASSIS_ACCEL_LIMIT = 4.0  # m/s²
+CHASSIS_JERK_LIMIT = 40.0  # m/s³
+CHASSIS_ANGULAR_ACCEL_LIMIT = 12.0  # rad/s²
+CHASSIS_ANGULAR_JERK_LIMIT = 120.0  # rad/s³
+
+# === Faults ===
+
+FAULT_RETRY_BUDGET = 3  # bad ticks within FAULT_WINDOW_TICKS a module is retried for before it is stopped
+FAULT_WINDOW_TICKS = 50  # ticks over which bad ticks are counted against the retry budget
+FAULT_ESCALATION_TICKS = 25  # bad ticks a stopped module can have before every module is stopped
+FAULT_RECOVERY_TICKS = 25  # clean ticks in a row before a stopped module drives again
+MAX_MOTOR_TEMPERATURE = 70.0  # degrees C, moteus controller temperature
+MIN_BUS_VOLTAGE = 10.0  # volts
+
+# === Telemetry ===
+
+TELEMETRY_PATH = "telemetry/latest.bin"
+TELEMETRY_CAPACITY = int(LOOP_RATE_HZ * 60 * 5)  # 5 minutes of ticks
+
+# === Processes ===
+
+RT_CPU = 3  # the core the servo I/O process is pinned to, ideally isolated with isolcpus=3 on the kernel command line
+RT_PRIORITY = 80  # SCHED_FIFO priority of the servo I/O process
+INPUT_RING_CAPACITY = 16
+POSE_RING_CAPACITY = 16
+TELEMETRY_RING_CAPACITY = int(LOOP_RATE_HZ * 2)  # 2 seconds of ticks for the estimation and logging processes to catch up on
+ESTIMATION_PERIOD = 0.01  # seconds between odometry updates of the estimation process
+LOGGING_PERIOD = 0.05  # seconds between telemetry copies of the logging process
+
+# === Profiling ===
+
+PROFILING_ENABLED = False  # can also be turned on while running, with swerve_metrics.py enable
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 5805
+
+# === Autonomous ===
+
+TRAJECTORY_CACHE_DIR = "paths/cache"
+TRAJECTORY_TRANSLATION_KP = 2.0  # m/s per meter of position error
+TRAJECTORY_ROTATION_KP = 3.0  # rad/s per radian of heading error
+
+# === Controller ===
+
+CONTROLLER_RATE_HZ = 100.0
+CONTROLLER_DEADBAND = 0.08
+CONTROLLER_EXPO = 0.3
+CONTROLLER_TIMEOUT = 0.25  # seconds without new input before commanding zero speed
+RESET_HEADING_BUTTON = 7  # Controller.BUTTON_START: the way the robot faces becomes field forward
+
+# === Field Oriented Drive ===
+
+FIELD_ORIENTED = False  # joystick forward is away from the driver instead of robot forward
+HEADING_HOLD = False  # keep the heading while the turn stick is released
+HEADING_KP = 4.0  # rad/s per radian of heading error
+HEADING_KI = 0.0  # rad/s per radian second of heading error
+HEADING_KD = 0.1  # rad/s per rad/s of turn rate
+HEADING_HOLD_MAX_OMEGA = 3.0  # rad/s, the largest heading hold correction
+HEADING_HOLD_CAPTURE_RATE = 0.2  # rad/s, the heading is captured once the chassis turns slower than this
 
 FRONT_LEFT = Translation2d(SWERVE_MODULE_OFFSET, SWERVE_MODULE_OFFSET)
 FRONT_RIGHT = Translation2d(SWERVE_MODULE_OFFSET, -SWERVE_MODULE_OFFSET)
@@ -0,0 +1,171 @@
+import asyncio
+import gc
+import math
+
+
+class ControlLoop:
+    """
+    Runs a periodic coroutine at a fixed rate, and records how well it keeps that rate.
+
+    Each tick is scheduled against an absolute deadline (start + n * period) on the asyncio
+    loop clock, so a late tick does not push every later tick back. If a tick overruns by
+    more than a whole period, the missed deadlines are skipped instead of bursting to catch up.
+
+    The measured period and jitter (how late the tick started compared to its deadline) of
+    the last `history` ticks are kept in a ring buffer, and can be read at runtime with stats().
+
+    With automatic garbage collection turned off (see Utils/Realtime.py freeze_gc()), gc_period runs a
+    young generation collection every that many ticks, but only in the slack before the next deadline.
+
+    Example usage:
+        async def tick(dt):
+            await swerve_drive.set_drive_speeds(0.0, 0.0, 0.0, dt=dt)
+
+        control_loop = ControlLoop(tick, rate_hz=250.0)
+        await control_loop.run()
+    """
+
+    def __init__(self, callback, rate_hz: float = 250.0, history: int = 1024, gc_period: int = 0):
+        """
+        Constructs a control loop.
+
+        :param callback (coroutine function): Called every tick with the measured time since the last tick in seconds.
+        :param rate_hz (float): The rate to run the callback at, in Hz.
+        :param history (int): How many ticks of timing data to keep in the ring buffer.
+        :param gc_period (int): Collect the young generations after every this many ticks, if the tick left time for it. 0 to never collect.
+        """
+        self.callback = callback
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.history = history
+        self.gc_period = gc_period
+
+        # Preallocated ring buffers, so recording a tick does not allocate.
+        self._periods = [0.0] * history
+        self._jitters = [0.0] * history
+        self._index = 0
+        self._count = 0
+
+        self.ticks = 0
+        self.overruns = 0
+        self.missed_deadlines = 0
+        self.max_period = 0.0
+        self.max_jitter = 0.0
+        self.last_jitter = 0.0
+        self.last_tick_time = 0.0  # how long the previous callback took, in seconds
+        self.gc_collections = 0
+        self.gc_max_pause = 0.0
+        self.running = False
+
+    def _record(self, period: float, jitter: float) -> None:
+        self.last_jitter = jitter
+        self._periods[self._index] = period
+        self._jitters[self._index] = jitter
+        self._index = (self._index + 1) % self.history
+        if self._count < self.history:
+            self._count += 1
+
+        if period > self.max_period:
+            self.max_period = period
+        if jitter > self.max_jitter:
+            self.max_jitter = jitter
+
+    async def _sleep_until(self, loop, deadline: float) -> None:
+        """
+        Sleeps until an absolute time on the loop clock.
+        """
+        future = loop.create_future()
+        handle = loop.call_at(deadline, future.set_result, None)
+        try:
+            await future
+        finally:
+            handle.cancel()
+
+    async def run(self) -> None:
+        """
+        Runs the callback at the configured rate until stop() is called.
+        """
+        loop = asyncio.get_running_loop()
+        self.running = True
+
+        deadline = loop.time()
+        last_start = None
+
+        while self.running:
+            start = loop.time()
+            if last_start is None:
+                dt = self.period
+            else:
+                dt = start - last_start
+                self._record(dt, start - deadline)
+            last_start = start
+
+            await self.callback(dt)
+            self.ticks += 1
+
+            deadline += self.period
+            now = loop.time()
+            self.last_tick_time = now - start
+            if now > deadline:
+                # Overran into the next tick, skip the deadlines we already missed.
+                missed = math.floor((now - deadline) / self.period) + 1
+                self.overruns += 1
+                self.missed_deadlines += missed
+                deadline += missed * self.period
+            elif self.gc_period and self.ticks % self.gc_period == 0:
+                self._collect(loop, deadline)
+
+            await self._sleep_until(loop, deadline)
+
+    def _collect(self, loop, deadline: float) -> None:
+        """
+        Collects generations 0 and 1 in the slack before the deadline. Skipped if the tick left no slack.
+        """
+        start = loop.time()
+        if start >= deadline:
+            return
+        gc.collect(1)
+        pause = loop.time() - start
+        self.gc_collections += 1
+        if pause > self.gc_max_pause:
+            self.gc_max_pause = pause
+
+    def stop(self) -> None:
+        """
+        Stops the loop after the current tick.
+        """
+        self.running = False
+
+    @staticmethod
+    def _percentile(sorted_values: list, fraction: float) -> float:
+        if not sorted_values:
+            return math.nan
+        index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+        return sorted_values[index]
+
+    def stats(self) -> dict:
+        """
+        Gives timing statistics over the ticks in the ring buffer. All times are in seconds.
+
+        :return dict: Period and jitter percentiles, overrun and missed deadline counts.
+        """
+        periods = sorted(self._periods[:self._count])
+        jitters = sorted(self._jitters[:self._count])
+
+        return {
+            "rate_hz": self.rate_hz,
+            "ticks": self.ticks,
+            "samples": self._count,
+            "period_p50": self._percentile(periods, 0.50),
+            "period_p99": self._percentile(periods, 0.99),
+            "period_max": periods[-1] if periods else math.nan,
+            "jitter_p50": self._percentile(jitters, 0.50),
+            "jitter_p99": self._percentile(jitters, 0.99),
+            "jitter_max": jitters[-1] if jitters else math.nan,
+            "period_max_all_time": self.max_period,
+            "jitter_max_all_time": self.max_jitter,
+            "overruns": self.overruns,
+            "missed_deadlines": self.missed_deadlines,
+            "gc_collections": self.gc_collections,
+            "gc_max_pause": self.gc_max_pause,
+        }
@@ -1,4 +1,9 @@
-import pygame
+import threading
+import time
+from collections import namedtuple
+
+# An immutable snapshot of every axis and button, taken at time.monotonic() time `timestamp`.
+ControllerSnapshot = namedtuple("ControllerSnapshot", ["axes", "buttons", "timestamp"])
 
 class Controller:
     """
@@ -18,6 +23,11 @@ class Controller:
         x = controller.get_axis(Controller.LEFT_X)
         if controller.get_button(Controller.BUTTON_A):
             ...
+
+    Reads can also be served by a background reader thread, so the control loop never pumps pygame itself:
+        controller.start()
+        snapshot = controller.get_snapshot()  # never blocks
+        x = snapshot.axes[Controller.LEFT_X]
     """
 
     # Common Xbox/Logitech mappings (may vary by controller)
@@ -40,11 +50,26 @@ class Controller:
     BUTTON_RIGHT_STICK = 9
 
     def __init__(self):
-        pygame.init()
+        # pygame is only imported and initialized on first use (or on the reader thread after start()),
+        # since importing it takes a large part of startup.
+        self._pygame = None
         self.joystick = None
+        self.snapshot = ControllerSnapshot((), (), 0.0)
+        self._reader_thread = None
+        self._running = False
+
+    def _initialize(self):
+        if self._pygame is not None:
+            return
+        import pygame
+        # Only the subsystems the joystick needs, pygame.init() would also start audio, fonts, ...
+        pygame.display.init()  # The event queue that pumps joystick state lives in the display subsystem.
+        pygame.joystick.init()
+        self._pygame = pygame
         self._initialize_joystick()
 
     def _initialize_joystick(self):
+        pygame = self._pygame
         if pygame.joystick.get_count() > 0:
             self.joystick = pygame.joystick.Joystick(0)
             self.joystick.init()
@@ -56,16 +81,108 @@ class Controller:
         else:
             print("No joystick found.")
 
+    def _read_snapshot(self) -> ControllerSnapshot:
+        self._pygame.event.pump()
+        joystick = self.joystick
+        return ControllerSnapshot(
+            tuple(joystick.get_axis(i) for i in range(joystick.get_numaxes())),
+            tuple(joystick.get_button(i) for i in range(joystick.get_numbuttons())),
+            time.monotonic()
+        )
+
+    def _reader(self, rate_hz: float):
+        self._initialize()
+        if self.joystick is None:
+            self._running = False
+            return
+
+        period = 1.0 / rate_hz
+        next_read = time.monotonic()
+        while self._running:
+            # Swapping the reference is atomic, readers always see a whole snapshot.
+            self.snapshot = self._read_snapshot()
+
+            next_read += period
+            delay = next_read - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_read = time.monotonic()
+
+    def start(self, rate_hz: float = 100.0):
+        """
+        Starts a background thread that initializes pygame, then pumps it at its own rate and publishes snapshots.
+
+        Until the first snapshot (or for good, if there is no joystick) the snapshot stays empty and stale.
+
+        :param rate_hz (float): How often to read the joystick, in Hz.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._reader_thread = threading.Thread(target=self._reader, args=(rate_hz,), name="controller-reader", daemon=True)
+        self._reader_thread.start()
+
+    def stop(self):
+        """Stops the background reader thread."""
+        self._running = False
+        if self._reader_thread is not None:
+            self._reader_thread.join()
+            self._reader_thread = None
+
+    def get_snapshot(self) -> ControllerSnapshot:
+        """
+        Get the latest snapshot of all axes and buttons without blocking.
+
+        If the reader thread is not running, the joystick is read right away instead.
+        """
+        if self._running:
+            return self.snapshot
+        self._initialize()
+        if self.joystick is None:
+            return self.snapshot
+        self.snapshot = self._read_snapshot()
+        return self.snapshot
+
     def get_axis(self, axis):
         """Get the value of the specified axis (use named constants)."""
+        if self._running:
+            axes = self.snapshot.axes
+            return axes[axis] if axis < len(axes) else 0.0
+        self._initialize()
         if self.joystick:
-            pygame.event.pump()  # Ensure state is updated
+            self._pygame.event.pump()  # Ensure state is updated
             return self.joystick.get_axis(axis)
         return 0.0
 
     def get_button(self, button):
         """Get the state of the specified button (use named constants)."""
+        if self._running:
+            buttons = self.snapshot.buttons
+            return bool(buttons[button]) if button < len(buttons) else False
+        self._initialize()
         if self.joystick:
-            pygame.event.pump()
+            self._pygame.event.pump()
             return self.joystick.get_button(button)
-        return False
\ No newline at end of file
+        return False
+
+    @staticmethod
+    def shape_axis(value: float, deadband: float, expo: float) -> float:
+        """
+        Applies a deadband and expo curve to an axis value.
+
+        The deadband is rescaled so the output still starts from 0 at its edge and reaches 1 at full stick.
+        Expo blends the linear response with a cubic one (0 = linear, 1 = fully cubic).
+
+        :param value (float): The raw axis value, from -1 to 1.
+        :param deadband (float): Axis values with a magnitude below this are treated as 0.
+        :param expo (float): How much of the cubic curve to blend in, from 0 to 1.
+
+        :return float: The shaped axis value, from -1 to 1.
+        """
+        magnitude = abs(value)
+        if magnitude < deadband:
+            return 0.0
+        scaled = min(1.0, (magnitude - deadband) / (1.0 - deadband))
+        shaped = (1.0 - expo) * scaled + expo * scaled * scaled * scaled
+        return shaped if value > 0 else -shaped
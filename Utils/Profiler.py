@@ -0,0 +1,191 @@
+import asyncio
+import json
+from time import perf_counter_ns
+import Utils.Constants as Constants
+
+"""
+Lightweight timing spans for the drive loop, kept in fixed-size histograms and served over UDP.
+
+Spans are recorded with a start()/stop() pair around a stage:
+
+    start = profiler.start()
+    ...
+    profiler.stop("kinematics", start)
+
+While the profiler is disabled, start() returns 0 and stop() returns right away, so an
+instrumented tick costs two attribute lookups and two calls per span. While it is enabled,
+each span adds one perf_counter_ns() call and a bucket increment: histograms never allocate.
+
+The MetricsServer answers JSON requests on a local UDP port (see swerve_metrics.py), which is
+also how profiling is turned on and off while the robot runs.
+"""
+
+# Durations are bucketed with 4 buckets per power of two (at most 25% wide), from 1 ns to about half an hour.
+_SUB_BUCKETS = 4
+_BUCKET_COUNT = 40 * _SUB_BUCKETS
+
+
+def _bucket(ns: int) -> int:
+    if ns < 2 * _SUB_BUCKETS:
+        return max(ns, 0)
+    shift = ns.bit_length() - 3
+    return min(shift * _SUB_BUCKETS + (ns >> shift), _BUCKET_COUNT - 1)
+
+
+def _bucket_upper(index: int) -> int:
+    if index < 2 * _SUB_BUCKETS:
+        return index
+    shift, mantissa = divmod(index, _SUB_BUCKETS)
+    return ((mantissa + _SUB_BUCKETS + 1) << (shift - 1)) - 1
+
+
+class Histogram:
+    """
+    A fixed-size histogram of durations in nanoseconds.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int) -> None:
+        self.buckets[_bucket(ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, fraction: float) -> int:
+        """
+        Gives a duration that fraction of the recorded durations do not exceed, as the middle of its bucket.
+
+        :return int: The duration in nanoseconds, 0 if nothing was recorded.
+        """
+        if self.count == 0:
+            return 0
+        rank = max(1, int(fraction * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                lower = _bucket_upper(index - 1) + 1 if index else 0
+                return min((lower + _bucket_upper(index)) // 2, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """
+        Gives the count and mean, p50, p90, p99 and max durations, in microseconds.
+        """
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1e3 if self.count else 0.0,
+            "p50_us": self.percentile(0.50) / 1e3,
+            "p90_us": self.percentile(0.90) / 1e3,
+            "p99_us": self.percentile(0.99) / 1e3,
+            "max_us": self.max / 1e3,
+        }
+
+
+class Profiler:
+    # The stages of a tick, in the order they run. Other names get a histogram on first use.
+    STAGES = ("tick", "controller", "set_drive_speeds", "kinematics", "module_commands", "bus_cycle", "odometry")
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.histograms = {stage: Histogram() for stage in self.STAGES}
+
+    def start(self) -> int:
+        """
+        Starts a span.
+
+        :return int: The start time to pass to stop(), or 0 if the profiler is disabled.
+        """
+        return perf_counter_ns() if self.enabled else 0
+
+    def stop(self, stage: str, start: int) -> None:
+        """
+        Ends a span and records its duration under a stage.
+
+        :param stage (str): The stage name, see STAGES.
+        :param start (int): What start() returned.
+        """
+        if not start:
+            return
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram()
+        histogram.record(perf_counter_ns() - start)
+
+    def reset(self) -> None:
+        """
+        Clears every histogram.
+        """
+        self.histograms = {stage: Histogram() for stage in self.histograms}
+
+    def summary(self) -> dict:
+        """
+        Gives whether profiling is enabled, and the summary of every stage that recorded something.
+        """
+        return {
+            "enabled": self.enabled,
+            "stages": {stage: histogram.summary() for stage, histogram in self.histograms.items() if histogram.count},
+        }
+
+
+# The profiler the drive code records into.
+profiler = Profiler(Constants.PROFILING_ENABLED)
+
+
+class MetricsServer(asyncio.DatagramProtocol):
+    """
+    Serves the profiler over UDP. Every request is one datagram with a command, and gets one JSON reply:
+
+        "get"      the summary of every stage (see Profiler.summary())
+        "enable"   turns profiling on
+        "disable"  turns profiling off
+        "reset"    clears the histograms
+
+    Example usage:
+        server = await MetricsServer.start()
+        ...
+        server.close()
+    """
+
+    def __init__(self, metrics_profiler: Profiler = profiler):
+        self.profiler = metrics_profiler
+        self.transport = None
+
+    @classmethod
+    async def start(cls, host: str = Constants.METRICS_HOST, port: int = Constants.METRICS_PORT,
+                    metrics_profiler: Profiler = profiler) -> "MetricsServer":
+        """
+        Starts serving on a UDP port of the running event loop.
+
+        :param host (str): The address to listen on, localhost by default so only the robot itself can attach.
+        :param port (int): The UDP port.
+        """
+        loop = asyncio.get_running_loop()
+        _, server = await loop.create_datagram_endpoint(lambda: cls(metrics_profiler), local_addr=(host, port))
+        return server
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, address) -> None:
+        command = data.decode(errors="replace").strip()
+        if command == "enable":
+            self.profiler.enabled = True
+        elif command == "disable":
+            self.profiler.enabled = False
+        elif command == "reset":
+            self.profiler.reset()
+        elif command != "get":
+            self.transport.sendto(json.dumps({"error": f"unknown command {command!r}"}).encode(), address)
+            return
+        self.transport.sendto(json.dumps(self.profiler.summary()).encode(), address)
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
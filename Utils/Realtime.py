@@ -0,0 +1,60 @@
+import gc
+import os
+import Utils.Constants as Constants
+
+"""
+Real-time scheduling for the servo I/O process.
+
+On the robot, the control process is pinned to one core (ideally kept free of everything else
+with isolcpus= on the kernel command line) and runs under SCHED_FIFO, so the scheduler never
+lets a normal process (the input, estimation or logging process, ssh, ...) delay a tick.
+SCHED_FIFO needs root or CAP_SYS_NICE; without it the process still runs, just with normal priority.
+"""
+
+
+def make_realtime(cpu: int = Constants.RT_CPU, priority: int = Constants.RT_PRIORITY) -> list:
+    """
+    Pins the calling process to one CPU and switches it to SCHED_FIFO, as far as the OS allows.
+
+    :param cpu (int): The CPU to pin to, None to leave the affinity alone.
+    :param priority (int): The SCHED_FIFO priority, from 1 to 99. None to leave the scheduler alone.
+
+    :return list: A message for everything that could not be applied, empty if everything was.
+    """
+    problems = []
+    if cpu is not None:
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except AttributeError:
+            problems.append("CPU affinity is not supported on this OS")
+        except OSError as e:
+            problems.append(f"could not pin to CPU {cpu}: {e}")
+
+    if priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        except AttributeError:
+            problems.append("SCHED_FIFO is not supported on this OS")
+        except OSError as e:
+            problems.append(f"could not switch to SCHED_FIFO priority {priority} (needs root or CAP_SYS_NICE): {e}")
+    return problems
+
+
+def freeze_gc() -> None:
+    """
+    Moves every object alive now (modules, buffers, imported code) out of the garbage collector's view and turns
+    automatic collection off, so a collection can never start in the middle of a tick.
+
+    Whatever the loop still allocates is then only collected by ControlLoop's gc_period, in the slack after a tick.
+    """
+    gc.collect()
+    gc.freeze()
+    gc.disable()
+
+
+def unfreeze_gc() -> None:
+    """
+    Undoes freeze_gc().
+    """
+    gc.unfreeze()
+    gc.enable()
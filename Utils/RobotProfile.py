@@ -0,0 +1,400 @@
+import json
+import math
+import os
+from collections import namedtuple
+from wpimath.geometry import Translation2d
+import wpimath.kinematics
+import Utils.Constants as Constants
+
+"""
+Robot profiles: the geometry, CAN layout, limits and gains of one robot, loaded from a TOML or JSON file.
+
+Everything that is derived from the profile (conversion factors, the bus map, kinematics) is
+computed once when the profile is built, so the drive never does arithmetic on constants per tick.
+Without a profile file, RobotProfile.default() gives the values in Utils/Constants.py.
+
+There is no steer gear ratio: the steer servos are configured with motor_position.rotor_to_output_ratio
+(1 / STEER_MOTOR_GEAR_RATIO), so moteus reports and takes steer positions and velocities in module revolutions.
+A steer_gear_ratio left in an older profile file is ignored.
+
+Example profile (TOML):
+    name = "practice-bot"
+
+    [drivetrain]
+    drive_gear_ratio = 6.75
+    wheel_diameter = 0.1016  # meters
+    max_speed = 4.5  # meters per second
+    coupling_ratio = 0.0  # drive motor revolutions per module revolution
+
+    [limits]
+    accel_limit = 20.0  # rev/s²
+    velocity_limit = 20.0  # rev/s
+    steer_accel_limit = 20.0  # rev/s²
+    steer_velocity_limit = 20.0  # rev/s
+    watchdog_timeout = 0.5  # seconds
+    chassis_accel_limit = 4.0  # m/s²
+    chassis_jerk_limit = 40.0  # m/s³
+    chassis_angular_accel_limit = 12.0  # rad/s²
+    chassis_angular_jerk_limit = 120.0  # rad/s³
+
+    [gains]
+    trajectory_translation_kp = 2.0
+    trajectory_rotation_kp = 3.0
+    heading_kp = 4.0
+    heading_ki = 0.0
+    heading_kd = 0.1
+    drive_ks = 0.0
+    drive_kv = 0.0
+    drive_ka = 0.0
+
+    [teleop]
+    field_oriented = true
+    heading_hold = true
+
+    [[modules]]  # One per module, in front left, front right, back left, back right order.
+    name = "front_left"
+    bus = 1
+    drive_id = 11
+    steer_id = 12
+    x = 0.3  # meters forward of the robot center
+    y = 0.3  # meters left of the robot center
+    steer_offset = 0.0  # degrees the steer motor reads when the wheel points forward
+"""
+
+# The CAN layout and position of one module. steer_offset is in module revolutions, what the steer servo reports.
+ModuleProfile = namedtuple("ModuleProfile", ["name", "bus", "drive_id", "steer_id", "x", "y", "steer_offset"])
+
+MODULE_NAMES = ("front_left", "front_right", "back_left", "back_right")
+
+
+class RobotProfile:
+    def __init__(self,
+                 modules: list,
+                 drive_gear_ratio: float,
+                 wheel_diameter: float,
+                 max_speed: float,
+                 accel_limit: float = 20.0,
+                 velocity_limit: float = 20.0,
+                 steer_accel_limit: float = 20.0,
+                 steer_velocity_limit: float = 20.0,
+                 watchdog_timeout: float = 0.5,
+                 coupling_ratio: float = Constants.COUPLING_RATIO,
+                 chassis_accel_limit: float = Constants.CHASSIS_ACCEL_LIMIT,
+                 chassis_jerk_limit: float = Constants.CHASSIS_JERK_LIMIT,
+                 chassis_angular_accel_limit: float = Constants.CHASSIS_ANGULAR_ACCEL_LIMIT,
+                 chassis_angular_jerk_limit: float = Constants.CHASSIS_ANGULAR_JERK_LIMIT,
+                 trajectory_translation_kp: float = Constants.TRAJECTORY_TRANSLATION_KP,
+                 trajectory_rotation_kp: float = Constants.TRAJECTORY_ROTATION_KP,
+                 heading_kp: float = Constants.HEADING_KP,
+                 heading_ki: float = Constants.HEADING_KI,
+                 heading_kd: float = Constants.HEADING_KD,
+                 drive_ks: float = Constants.DRIVE_KS,
+                 drive_kv: float = Constants.DRIVE_KV,
+                 drive_ka: float = Constants.DRIVE_KA,
+                 field_oriented: bool = Constants.FIELD_ORIENTED,
+                 heading_hold: bool = Constants.HEADING_HOLD,
+                 name: str = "default",
+                 source: str = None):
+        """
+        Constructs a robot profile, validates it and precomputes everything derived from it.
+
+        :param modules (list): A ModuleProfile for each module, in front left, front right, back left, back right order.
+        :param drive_gear_ratio (float): Drive motor revolutions per wheel revolution.
+        :param wheel_diameter (float): Wheel diameter in meters.
+        :param max_speed (float): The fastest a module can drive, in meters per second.
+        :param accel_limit (float): Drive motor acceleration limit in rev/s².
+        :param velocity_limit (float): Drive motor velocity limit in rev/s.
+        :param steer_accel_limit (float): Steer motor acceleration limit in rev/s².
+        :param steer_velocity_limit (float): Steer motor velocity limit in rev/s.
+        :param watchdog_timeout (float): moteus command watchdog timeout in seconds.
+        :param coupling_ratio (float): Drive motor revolutions per module revolution with the wheel held still.
+        :param chassis_accel_limit (float): Linear acceleration limit of the chassis setpoint in m/s².
+        :param chassis_jerk_limit (float): Linear jerk limit of the chassis setpoint in m/s³.
+        :param chassis_angular_accel_limit (float): Angular acceleration limit of the chassis setpoint in rad/s².
+        :param chassis_angular_jerk_limit (float): Angular jerk limit of the chassis setpoint in rad/s³.
+        :param trajectory_translation_kp (float): Path following position gain, in m/s per meter of error.
+        :param trajectory_rotation_kp (float): Path following heading gain, in rad/s per radian of error.
+        :param heading_kp (float): Heading hold gain, in rad/s per radian of error.
+        :param heading_ki (float): Heading hold integral gain, in rad/s per radian second of error.
+        :param heading_kd (float): Heading hold damping, in rad/s per rad/s of turn rate.
+        :param drive_ks (float): Drive feedforward static friction torque, in Nm.
+        :param drive_kv (float): Drive feedforward torque per velocity, in Nm per rev/s.
+        :param drive_ka (float): Drive feedforward torque per acceleration, in Nm per rev/s².
+        :param field_oriented (bool): Whether joystick driving is field oriented.
+        :param heading_hold (bool): Whether joystick driving holds the heading while the turn stick is released.
+        :param name (str): A name for the robot, for logs.
+        :param source (str): The file the profile was loaded from, for error messages.
+
+        :raises ValueError: If any value is out of range, listing every problem found.
+        """
+        self.name = name
+        self.source = source
+        self.modules = list(modules)
+        self.drive_gear_ratio = drive_gear_ratio
+        self.wheel_diameter = wheel_diameter
+        self.max_speed = max_speed
+        self.accel_limit = accel_limit
+        self.velocity_limit = velocity_limit
+        self.steer_accel_limit = steer_accel_limit
+        self.steer_velocity_limit = steer_velocity_limit
+        self.watchdog_timeout = watchdog_timeout
+        self.coupling_ratio = coupling_ratio
+        self.chassis_accel_limit = chassis_accel_limit
+        self.chassis_jerk_limit = chassis_jerk_limit
+        self.chassis_angular_accel_limit = chassis_angular_accel_limit
+        self.chassis_angular_jerk_limit = chassis_angular_jerk_limit
+        self.trajectory_translation_kp = trajectory_translation_kp
+        self.trajectory_rotation_kp = trajectory_rotation_kp
+        self.heading_kp = heading_kp
+        self.heading_ki = heading_ki
+        self.heading_kd = heading_kd
+        self.drive_ks = drive_ks
+        self.drive_kv = drive_kv
+        self.drive_ka = drive_ka
+        self.field_oriented = field_oriented
+        self.heading_hold = heading_hold
+
+        self.validate()
+
+        # Derived values, computed once.
+        self.meters_per_drive_rev = wheel_diameter * math.pi / drive_gear_ratio
+        self.drive_revs_per_meter = 1.0 / self.meters_per_drive_rev
+        self.module_ids = [(module.drive_id, module.steer_id) for module in self.modules]
+        self.servo_bus_map = {}
+        for module in self.modules:
+            self.servo_bus_map.setdefault(module.bus, []).extend([module.drive_id, module.steer_id])
+        self.translations = [Translation2d(module.x, module.y) for module in self.modules]
+        self.kinematics = wpimath.kinematics.SwerveDrive4Kinematics(*self.translations)
+
+    def validate(self) -> None:
+        """
+        Checks every value of the profile.
+
+        :raises ValueError: If any value is out of range, listing every problem found.
+        """
+        problems = []
+        for field in ("drive_gear_ratio", "wheel_diameter", "max_speed",
+                      "accel_limit", "velocity_limit", "steer_accel_limit", "steer_velocity_limit", "watchdog_timeout", "chassis_accel_limit", "chassis_jerk_limit",
+                      "chassis_angular_accel_limit", "chassis_angular_jerk_limit"):
+            value = getattr(self, field)
+            if not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0.0:
+                problems.append(f"{field} must be a positive number, got {value!r}")
+
+        for field in ("trajectory_translation_kp", "trajectory_rotation_kp", "heading_kp", "heading_ki", "heading_kd",
+                      "drive_ks", "drive_kv", "drive_ka"):
+            value = getattr(self, field)
+            if not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0.0:
+                problems.append(f"{field} must be zero or a positive number, got {value!r}")
+
+        if not isinstance(self.coupling_ratio, (int, float)) or not math.isfinite(self.coupling_ratio):
+            problems.append(f"coupling_ratio must be a number, got {self.coupling_ratio!r}")
+
+        for field in ("field_oriented", "heading_hold"):
+            value = getattr(self, field)
+            if not isinstance(value, bool):
+                problems.append(f"{field} must be true or false, got {value!r}")
+
+        if len(self.modules) != 4:
+            problems.append(f"there must be 4 modules, got {len(self.modules)}")
+
+        seen_ids = set()
+        for module in self.modules:
+            for servo_id in (module.drive_id, module.steer_id):
+                if not isinstance(servo_id, int) or not 1 <= servo_id <= 126:
+                    problems.append(f"module {module.name}: servo id must be from 1 to 126, got {servo_id!r}")
+                elif servo_id in seen_ids:
+                    problems.append(f"module {module.name}: servo id {servo_id} is used twice")
+                seen_ids.add(servo_id)
+            if not isinstance(module.bus, int) or not 1 <= module.bus <= 5:
+                problems.append(f"module {module.name}: bus must be from 1 to 5, got {module.bus!r}")
+            if not all(isinstance(value, (int, float)) and math.isfinite(value) for value in (module.x, module.y, module.steer_offset)):
+                problems.append(f"module {module.name}: x, y and steer_offset must be numbers")
+
+        if problems:
+            raise ValueError(f"Invalid robot profile {self.source or self.name}:\n  " + "\n  ".join(problems))
+
+    @classmethod
+    def from_dict(cls, data: dict, source: str = None) -> "RobotProfile":
+        """
+        Builds a profile from the contents of a profile file (see the example at the top of this file).
+        Missing sections and values use the defaults in Utils/Constants.py.
+        """
+        default = cls.default()
+        drivetrain = data.get("drivetrain", {})
+        limits = data.get("limits", {})
+        gains = data.get("gains", {})
+        teleop = data.get("teleop", {})
+
+        modules = []
+        for index, module in enumerate(data.get("modules", [])):
+            name = module.get("name", MODULE_NAMES[index] if index < len(MODULE_NAMES) else f"module_{index}")
+            try:
+                modules.append(ModuleProfile(
+                    name=name,
+                    bus=module["bus"],
+                    drive_id=module["drive_id"],
+                    steer_id=module["steer_id"],
+                    x=float(module["x"]),
+                    y=float(module["y"]),
+                    steer_offset=float(module.get("steer_offset", 0.0)) / 360.0))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid robot profile {source}: module {name} is missing or has a bad {e}") from e
+
+        return cls(
+            modules=modules or default.modules,
+            drive_gear_ratio=drivetrain.get("drive_gear_ratio", default.drive_gear_ratio),
+            wheel_diameter=drivetrain.get("wheel_diameter", default.wheel_diameter),
+            max_speed=drivetrain.get("max_speed", default.max_speed),
+            coupling_ratio=drivetrain.get("coupling_ratio", default.coupling_ratio),
+            accel_limit=limits.get("accel_limit", default.accel_limit),
+            velocity_limit=limits.get("velocity_limit", default.velocity_limit),
+            steer_accel_limit=limits.get("steer_accel_limit", default.steer_accel_limit),
+            steer_velocity_limit=limits.get("steer_velocity_limit", default.steer_velocity_limit),
+            watchdog_timeout=limits.get("watchdog_timeout", default.watchdog_timeout),
+            chassis_accel_limit=limits.get("chassis_accel_limit", default.chassis_accel_limit),
+            chassis_jerk_limit=limits.get("chassis_jerk_limit", default.chassis_jerk_limit),
+            chassis_angular_accel_limit=limits.get("chassis_angular_accel_limit", default.chassis_angular_accel_limit),
+            chassis_angular_jerk_limit=limits.get("chassis_angular_jerk_limit", default.chassis_angular_jerk_limit),
+            trajectory_translation_kp=gains.get("trajectory_translation_kp", default.trajectory_translation_kp),
+            trajectory_rotation_kp=gains.get("trajectory_rotation_kp", default.trajectory_rotation_kp),
+            heading_kp=gains.get("heading_kp", default.heading_kp),
+            heading_ki=gains.get("heading_ki", default.heading_ki),
+            heading_kd=gains.get("heading_kd", default.heading_kd),
+            drive_ks=gains.get("drive_ks", default.drive_ks),
+            drive_kv=gains.get("drive_kv", default.drive_kv),
+            drive_ka=gains.get("drive_ka", default.drive_ka),
+            field_oriented=teleop.get("field_oriented", default.field_oriented),
+            heading_hold=teleop.get("heading_hold", default.heading_hold),
+            name=data.get("name", os.path.splitext(os.path.basename(source))[0] if source else "default"),
+            source=source)
+
+    def to_dict(self) -> dict:
+        """
+        Gives the profile in the layout of a profile file, the inverse of from_dict().
+        """
+        return {
+            "name": self.name,
+            "drivetrain": {
+                "drive_gear_ratio": self.drive_gear_ratio,
+                "wheel_diameter": self.wheel_diameter,
+                "max_speed": self.max_speed,
+                "coupling_ratio": self.coupling_ratio,
+            },
+            "limits": {
+                "accel_limit": self.accel_limit,
+                "velocity_limit": self.velocity_limit,
+                "steer_accel_limit": self.steer_accel_limit,
+                "steer_velocity_limit": self.steer_velocity_limit,
+                "watchdog_timeout": self.watchdog_timeout,
+                "chassis_accel_limit": self.chassis_accel_limit,
+                "chassis_jerk_limit": self.chassis_jerk_limit,
+                "chassis_angular_accel_limit": self.chassis_angular_accel_limit,
+                "chassis_angular_jerk_limit": self.chassis_angular_jerk_limit,
+            },
+            "gains": {
+                "trajectory_translation_kp": self.trajectory_translation_kp,
+                "trajectory_rotation_kp": self.trajectory_rotation_kp,
+                "heading_kp": self.heading_kp,
+                "heading_ki": self.heading_ki,
+                "heading_kd": self.heading_kd,
+                "drive_ks": self.drive_ks,
+                "drive_kv": self.drive_kv,
+                "drive_ka": self.drive_ka,
+            },
+            "teleop": {
+                "field_oriented": self.field_oriented,
+                "heading_hold": self.heading_hold,
+            },
+            "modules": [
+                {
+                    "name": module.name,
+                    "bus": module.bus,
+                    "drive_id": module.drive_id,
+                    "steer_id": module.steer_id,
+                    "x": module.x,
+                    "y": module.y,
+                    "steer_offset": module.steer_offset * 360.0,
+                }
+                for module in self.modules
+            ],
+        }
+
+    @classmethod
+    def default(cls) -> "RobotProfile":
+        """
+        Gives the profile described by Utils/Constants.py.
+        """
+        translations = (Constants.FRONT_LEFT, Constants.FRONT_RIGHT, Constants.BACK_LEFT, Constants.BACK_RIGHT)
+        modules = [
+            ModuleProfile(name, bus, servo_ids[0], servo_ids[1], translation.x, translation.y, 0.0)
+            for name, translation, (bus, servo_ids) in zip(MODULE_NAMES, translations, sorted(Constants.SERVO_BUS_MAP.items()))
+        ]
+        return cls(
+            modules=modules,
+            drive_gear_ratio=Constants.DRIVE_MOTOR_GEAR_RATIO,
+            wheel_diameter=Constants.WHEEL_DIAMETER,
+            max_speed=Constants.MAX_SPEED)
+
+
+def load_profile(path: str) -> RobotProfile:
+    """
+    Loads a robot profile from a .toml or .json file.
+
+    :param path (str): The profile file.
+
+    :raises ValueError: If the profile is invalid.
+    """
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ValueError(f"Loading {path} needs Python 3.11 or the tomli package (pip install -r requirements.txt), "
+                                 f"or use a .json profile") from None
+        with open(path, "rb") as file:
+            data = tomllib.load(file)
+    else:
+        with open(path) as file:
+            data = json.load(file)
+
+    return RobotProfile.from_dict(data, source=path)
+
+
+def _toml_value(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return json.dumps(value)
+    return repr(value)
+
+
+def save_profile(profile: RobotProfile, path: str) -> None:
+    """
+    Saves a robot profile to a .toml or .json file, the inverse of load_profile(). Comments of an existing file are not kept.
+
+    :param profile (RobotProfile): The profile to save.
+    :param path (str): The profile file, replaced in one step so it is never left half written.
+    """
+    data = profile.to_dict()
+    if path.endswith(".toml"):
+        lines = [f"name = {_toml_value(data.pop('name'))}"]
+        modules = data.pop("modules")
+        for section, values in data.items():
+            lines.append(f"\n[{section}]")
+            lines.extend(f"{key} = {_toml_value(value)}" for key, value in values.items())
+        for module in modules:
+            lines.append("\n[[modules]]")
+            lines.extend(f"{key} = {_toml_value(value)}" for key, value in module.items())
+        text = "\n".join(lines) + "\n"
+    else:
+        text = json.dumps(data, indent=4) + "\n"
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as file:
+        file.write(text)
+    os.replace(temporary_path, path)
@@ -0,0 +1,60 @@
+import time
+from Utils.Controller import Controller, ControllerSnapshot
+
+class ScriptedController:
+    """
+    A stand-in for Controller that plays back a scripted joystick trace instead of reading pygame.
+
+    The trace is a function of the time since start() (in seconds) that returns the
+    (LEFT_X, LEFT_Y, RIGHT_X) axis values. Useful with a simulated transport for benchmarks.
+    Every change of those values (a step of the trace) is counted, with the time of the snapshot
+    it was first read in, so a benchmark can time the response to it.
+
+    Example usage:
+        controller = ScriptedController(lambda t: (1.0 if t > 1.0 else 0.0, 0.0, 0.0))
+        swerve_drive = SwerveDrive(transport=transport, controller=controller)
+    """
+
+    def __init__(self, trace, clock=time.monotonic):
+        """
+        :param trace (function): Maps the time since start() to (LEFT_X, LEFT_Y, RIGHT_X).
+        :param clock (function): Gives the current time in seconds.
+        """
+        self.trace = trace
+        self.clock = clock
+        self.start_time = None
+        self.last_values = None
+        self.changed_at = None  # the clock of the snapshot the trace values last changed in
+        self.changes = 0
+
+    def start(self, rate_hz: float = None):
+        """Starts the trace. rate_hz is accepted for compatibility with Controller.start() and ignored."""
+        self.start_time = self.clock()
+
+    def stop(self):
+        pass
+
+    def get_snapshot(self) -> ControllerSnapshot:
+        now = self.clock()
+        if self.start_time is None:
+            self.start_time = now
+
+        values = self.trace(now - self.start_time)
+        if values != self.last_values:
+            if self.last_values is not None:
+                self.changed_at = now
+                self.changes += 1
+            self.last_values = values
+
+        left_x, left_y, right_x = values
+        axes = [0.0] * 6
+        axes[Controller.LEFT_X] = left_x
+        axes[Controller.LEFT_Y] = left_y
+        axes[Controller.RIGHT_X] = right_x
+        return ControllerSnapshot(tuple(axes), (0,) * 10, now)
+
+    def get_axis(self, axis):
+        return self.get_snapshot().axes[axis]
+
+    def get_button(self, button):
+        return False
@@ -0,0 +1,151 @@
+import struct
+from multiprocessing import shared_memory
+
+"""
+Fixed-size record ring buffers in shared memory, for passing data between processes without pickling.
+
+One process writes, any number of processes read. The layout is the same as a telemetry file
+(see Utils/TelemetryRecorder.py): a 64 byte header with the number of records written so far,
+followed by `capacity` records of one struct. The writer packs a record into its slot and only
+then bumps the count, and a reader checks the count again after copying a record out, so a
+record that was overwritten while it was being read is dropped instead of returned torn.
+
+Example usage:
+    ring = SharedRing.create("swerve-setpoints", struct.Struct("<ddd"), capacity=16)  # in the writer
+    ring.write(1.0, 0.0, 0.5)
+
+    ring = SharedRing.attach("swerve-setpoints", struct.Struct("<ddd"))  # in a reader
+    latest = ring.latest()  # (1.0, 0.0, 0.5), or None before the first write
+    records, cursor = ring.read_new(cursor)  # everything written since cursor
+"""
+
+MAGIC = b"SWRG"
+VERSION = 1
+HEADER_SIZE = 64
+HEADER_STRUCT = struct.Struct("<4sIQQQ")  # magic, version, capacity, record size, count
+COUNT_STRUCT = struct.Struct("<Q")
+COUNT_OFFSET = 24
+
+
+class SharedRing:
+    def __init__(self, memory: shared_memory.SharedMemory, record_struct: struct.Struct, owner: bool):
+        """
+        Wraps a shared memory block holding a ring. Use create() or attach() instead.
+        """
+        self.memory = memory
+        self.buffer = memory.buf
+        self.record_struct = record_struct
+        self.owner = owner
+
+        magic, version, capacity, record_size, _ = HEADER_STRUCT.unpack_from(self.buffer, 0)
+        if record_size != record_struct.size:
+            raise ValueError(f"Shared ring {memory.name} holds {record_size} byte records, not {record_struct.size}")
+        self.capacity = capacity
+
+    @classmethod
+    def size(cls, record_struct: struct.Struct, capacity: int) -> int:
+        """
+        Gives how many bytes a ring takes, header included.
+        """
+        return HEADER_SIZE + capacity * record_struct.size
+
+    @classmethod
+    def create(cls, name: str, record_struct: struct.Struct, capacity: int, magic: bytes = MAGIC) -> "SharedRing":
+        """
+        Creates a new, empty ring. The creator unlinks it in close().
+
+        :param name (str): The shared memory name the other processes attach by.
+        :param record_struct (struct.Struct): The layout of one record.
+        :param capacity (int): How many records the ring holds before the oldest are overwritten.
+        :param magic (bytes): 4 bytes identifying what the ring holds, see TelemetryRecorder.MAGIC.
+        """
+        memory = shared_memory.SharedMemory(name=name, create=True, size=cls.size(record_struct, capacity))
+        HEADER_STRUCT.pack_into(memory.buf, 0, magic, VERSION, capacity, record_struct.size, 0)
+        return cls(memory, record_struct, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, record_struct: struct.Struct) -> "SharedRing":
+        """
+        Attaches to a ring created by another process.
+
+        :raises FileNotFoundError: If there is no ring with that name.
+        :raises ValueError: If the ring holds records of another size.
+        """
+        memory = shared_memory.SharedMemory(name=name)
+        return cls(memory, record_struct, owner=False)
+
+    @property
+    def count(self) -> int:
+        """
+        How many records were written in total.
+        """
+        return COUNT_STRUCT.unpack_from(self.buffer, COUNT_OFFSET)[0]
+
+    def write(self, *values) -> None:
+        """
+        Writes one record, overwriting the oldest one if the ring is full. Only one process may write.
+        """
+        count = self.count
+        self.record_struct.pack_into(self.buffer, HEADER_SIZE + (count % self.capacity) * self.record_struct.size, *values)
+        COUNT_STRUCT.pack_into(self.buffer, COUNT_OFFSET, count + 1)
+
+    def _read(self, index: int):
+        # Copies record `index` out, or gives None if it was (or may have been) overwritten.
+        record = self.record_struct.unpack_from(self.buffer, HEADER_SIZE + (index % self.capacity) * self.record_struct.size)
+        if self.count - index >= self.capacity:
+            return None
+        return record
+
+    def latest(self):
+        """
+        Gives the last record written.
+
+        :return tuple: The values of the record, or None if nothing was written yet.
+        """
+        while True:
+            count = self.count
+            if count == 0:
+                return None
+            record = self._read(count - 1)
+            if record is not None:
+                return record
+
+    def read_new(self, cursor: int, limit: int = None) -> tuple:
+        """
+        Gives the records written since cursor, oldest first. Records that were overwritten before
+        they could be read are skipped.
+
+        :param cursor (int): The count after the last record already read, 0 to start from the oldest one.
+        :param limit (int): Read at most this many records.
+
+        :return tuple: A list of the records (tuples of values), and the cursor to pass next time.
+        """
+        count = self.count
+        cursor = max(cursor, count - self.capacity)
+        if limit is not None:
+            count = min(count, cursor + limit)
+        records = []
+        for index in range(cursor, count):
+            record = self._read(index)
+            if record is not None:
+                records.append(record)
+        return records, count
+
+    def read_raw(self, index: int):
+        """
+        Gives the bytes of record `index`, or None if it was overwritten. For copying records without unpacking them.
+        """
+        offset = HEADER_SIZE + (index % self.capacity) * self.record_struct.size
+        data = bytes(self.buffer[offset:offset + self.record_struct.size])
+        if self.count - index >= self.capacity:
+            return None
+        return data
+
+    def close(self) -> None:
+        """
+        Detaches from the ring, and removes it if this process created it.
+        """
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
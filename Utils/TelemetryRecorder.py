@@ -0,0 +1,235 @@
+import mmap
+import os
+import struct
+import sys
+import numpy as np
+
+"""
+High-rate binary telemetry, recorded into a fixed-schema ring buffer in a memory-mapped file.
+
+Every tick packs one record in place with a precompiled struct, so there is no per-tick
+allocation of buffers and no per-tick write() call: the kernel writes the dirty pages back in large blocks on its own schedule,
+which keeps the SD card from being worn out by many small writes. When the ring is full the
+oldest records are overwritten.
+
+File layout: a 64 byte header (see HEADER_DTYPE), followed by `capacity` records of RECORD_DTYPE.
+"""
+
+MAGIC = b"SWTL"
+VERSION = 1
+MODULE_COUNT = 4
+MOTOR_COUNT = 2 * MODULE_COUNT
+HEADER_SIZE = 64
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("capacity", "<u8"),
+    ("record_size", "<u8"),
+    ("count", "<u8"),  # Records written in total, the next one goes to count % capacity.
+])
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),  # time.monotonic() seconds
+    ("dt", "<f4"),  # measured loop period, seconds
+    ("jitter", "<f4"),  # how late the tick started, seconds
+    ("tick_time", "<f4"),  # how long the previous tick's work took, seconds
+    ("command_speed", "<f4", (MODULE_COUNT,)),  # m/s
+    ("command_angle", "<f4", (MODULE_COUNT,)),  # radians
+    ("motor_position", "<f4", (MOTOR_COUNT,)),  # revolutions, drive then steer motor of each module
+    ("motor_velocity", "<f4", (MOTOR_COUNT,)),  # rev/s
+    ("motor_torque", "<f4", (MOTOR_COUNT,)),  # Nm
+    ("motor_temperature", "<f4", (MOTOR_COUNT,)),  # degrees C
+    ("motor_fault", "<u1", (MOTOR_COUNT,)),  # moteus fault code
+    ("yaw", "<f4"),  # radians
+])
+
+# The same layout as HEADER_DTYPE and RECORD_DTYPE, for writing without going through NumPy.
+HEADER_STRUCT = struct.Struct("<4sIQQQ")
+COUNT_STRUCT = struct.Struct("<Q")
+COUNT_OFFSET = HEADER_DTYPE.fields["count"][1]
+RECORD_STRUCT = struct.Struct(
+    f"<dfff{MODULE_COUNT}f{MODULE_COUNT}f{MOTOR_COUNT}f{MOTOR_COUNT}f{MOTOR_COUNT}f{MOTOR_COUNT}f{MOTOR_COUNT}Bf")
+assert RECORD_STRUCT.size == RECORD_DTYPE.itemsize
+
+
+class TelemetryRecorder:
+    """
+    Records one fixed-size record per control tick into a memory-mapped ring file.
+
+    Records are packed with RECORD_STRUCT rather than through NumPy views, since building
+    views on every tick costs far more than the packing itself.
+
+    Example usage:
+        recorder = TelemetryRecorder("telemetry/match.bin", capacity=250 * 60 * 5)
+        ...
+        recorder.record_drive(swerve_drive, dt)  # every tick
+        ...
+        recorder.close()
+    """
+
+    def __init__(self, path: str, capacity: int = 250 * 60 * 5, buffer=None):
+        """
+        Creates (or overwrites) a telemetry file and maps it into memory.
+
+        :param path (str): The file to record into. Ignored if buffer is given.
+        :param capacity (int): How many records the ring holds before it wraps. The default is 5 minutes at 250 Hz.
+        :param buffer (memoryview): A writable buffer of HEADER_SIZE + capacity records to record into instead of a file,
+            e.g. the buffer of a SharedRing, so other processes can read the ticks as they are recorded.
+        """
+        self.path = path
+        self.capacity = capacity
+        self._file = None
+
+        if buffer is not None:
+            self._map = buffer
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            # Size the whole file up front, so recording never grows it.
+            with open(path, "wb") as file:
+                file.truncate(HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+
+            self._file = open(path, "r+b")
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        HEADER_STRUCT.pack_into(self._map, 0, MAGIC, VERSION, capacity, RECORD_DTYPE.itemsize, 0)
+        self.count = 0
+
+        # One preallocated list of every value in a record, in RECORD_STRUCT order.
+        self._values = [0.0] * (4 + 2 * MODULE_COUNT + 5 * MOTOR_COUNT + 1)
+        self._values[-1 - MOTOR_COUNT:-1] = [0] * MOTOR_COUNT
+
+    def record_drive(self, swerve_drive, dt: float, jitter: float = 0.0, tick_time: float = 0.0, timestamp: float = None) -> None:
+        """
+        Records the commanded states, motor snapshots and heading of a SwerveDrive for this tick.
+
+        :param swerve_drive (SwerveDrive): The drive to record.
+        :param dt (float): The measured loop period, in seconds.
+        :param jitter (float): How late the tick started, in seconds.
+        :param tick_time (float): How long the previous tick's work took, in seconds.
+        :param timestamp (float): The time of the record. The time of the heading reply if not given.
+        """
+        values = self._values
+        values[0] = swerve_drive.yaw_timestamp if timestamp is None else timestamp
+        values[1] = dt
+        values[2] = jitter
+        values[3] = tick_time
+        values[-1] = swerve_drive.yaw
+
+        speed_index = 4
+        angle_index = speed_index + MODULE_COUNT
+        position_index = angle_index + MODULE_COUNT
+        velocity_index = position_index + MOTOR_COUNT
+        torque_index = velocity_index + MOTOR_COUNT
+        temperature_index = torque_index + MOTOR_COUNT
+        fault_index = temperature_index + MOTOR_COUNT
+
+        for i, module in enumerate(swerve_drive.modules):
+            values[speed_index + i] = module.desired_speed
+            values[angle_index + i] = module.desired_angle
+
+            for j, motor in ((2 * i, module.drive), (2 * i + 1, module.steer)):
+                snapshot = motor.snapshot
+                values[position_index + j] = snapshot.position
+                values[velocity_index + j] = snapshot.velocity
+                values[torque_index + j] = snapshot.torque
+                values[temperature_index + j] = snapshot.temperature
+                values[fault_index + j] = snapshot.fault
+
+        offset = HEADER_SIZE + (self.count % self.capacity) * RECORD_STRUCT.size
+        RECORD_STRUCT.pack_into(self._map, offset, *values)
+
+        self.count += 1
+        COUNT_STRUCT.pack_into(self._map, COUNT_OFFSET, self.count)
+
+    def record_raw(self, data: bytes) -> None:
+        """
+        Records a record that is already packed, e.g. copied from a shared telemetry ring.
+
+        :param data (bytes): One record of RECORD_STRUCT.
+        """
+        offset = HEADER_SIZE + (self.count % self.capacity) * RECORD_STRUCT.size
+        self._map[offset:offset + RECORD_STRUCT.size] = data
+
+        self.count += 1
+        COUNT_STRUCT.pack_into(self._map, COUNT_OFFSET, self.count)
+
+    def flush(self) -> None:
+        """
+        Asks the kernel to write the mapped pages to disk now. Not needed per tick.
+        """
+        if self._file is not None:
+            self._map.flush()
+
+    def close(self) -> None:
+        """
+        Flushes and unmaps the file.
+        """
+        if self._file is None:
+            return  # The buffer belongs to its owner.
+        self.flush()
+        self._map.close()
+        self._file.close()
+
+
+class TelemetryReader:
+    """
+    Reads a telemetry file written by TelemetryRecorder, after (or during) a run.
+
+    Example usage:
+        records = TelemetryReader("telemetry/match.bin").to_numpy()
+        print(records["motor_velocity"][:, 0])
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+        if header["magic"] != MAGIC:
+            raise ValueError(f"{path} is not a telemetry file")
+        if header["version"] != VERSION or header["record_size"] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path} was written with an incompatible telemetry schema")
+
+        self.capacity = int(header["capacity"])
+        self.count = int(header["count"])
+
+    def to_numpy(self) -> np.ndarray:
+        """
+        Gives the recorded ticks, oldest first, as a structured array of RECORD_DTYPE.
+        """
+        records = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(self.capacity,))
+        if self.count <= self.capacity:
+            return np.array(records[:self.count])
+
+        start = self.count % self.capacity
+        return np.concatenate((records[start:], records[:start]))
+
+    def to_csv(self, csv_path: str) -> None:
+        """
+        Exports the recorded ticks to a CSV file, with one column per value (e.g. motor_velocity_3).
+        """
+        records = self.to_numpy()
+
+        columns = []
+        names = []
+        for name in RECORD_DTYPE.names:
+            field = records[name]
+            if field.ndim == 1:
+                columns.append(field.astype(float))
+                names.append(name)
+            else:
+                for i in range(field.shape[1]):
+                    columns.append(field[:, i].astype(float))
+                    names.append(f"{name}_{i}")
+
+        table = np.column_stack(columns) if columns else np.empty((0, 0))
+        np.savetxt(csv_path, table, delimiter=",", header=",".join(names), comments="", fmt="%.9g")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m Utils.TelemetryRecorder <telemetry file> <csv file>")
+        sys.exit(1)
+
+    TelemetryReader(sys.argv[1]).to_csv(sys.argv[2])
@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+import numpy as np
+import Utils.Constants as Constants
+from Swerve.Characterization import SweepLog, fit_sweeps, run_sweeps, tuned_profile
+from Swerve.ModuleModel import characterize, load_feedforward, save_feedforward
+from Utils.RobotProfile import RobotProfile, load_profile, save_profile
+from Utils.TelemetryRecorder import TelemetryReader
+
+"""
+Characterizes the drivetrain: runs scripted sweeps of every servo, and fits the motor limits, drive
+feedforward and chassis limits of the robot profile from them (see Swerve/Characterization.py).
+
+The usual session, with about 3 m of clear floor in front of and behind the robot:
+    python characterize.py sweep --profile profiles/practice.toml --output sweeps/practice.npz
+    python characterize.py tune sweeps/practice.npz --profile profiles/practice.toml --output profiles/practice.toml
+Add --sim to the sweep to try it on a simulated transport, which runs faster than real time.
+
+Per-module feedforward tables (for Swerve/ModuleModel.py) can also be fitted from telemetry recorded
+while driving, and are written to calibration/feedforward.json, which main.py loads at startup:
+    python characterize.py fit "telemetry/*.bin"
+
+Commands:
+    sweep  run the sweep program and save its telemetry
+    tune   fit a sweep log and print (or write) the tuned profile
+    fit    fit feedforward tables from telemetry files
+"""
+
+
+def fit(paths: list, profile: RobotProfile, output: str) -> int:
+    """
+    Fits the feedforward table of every drive motor from telemetry files and saves them.
+
+    :return int: How many tables were fitted.
+    """
+    records = [TelemetryReader(path).to_numpy() for path in paths]
+    tables = load_feedforward(output)
+    fitted = 0
+    for index, module in enumerate(profile.modules):
+        logs = []
+        for log in records:
+            drive = 2 * index  # telemetry has the drive then the steer motor of each module
+            healthy = log["motor_fault"][:, drive] == 0
+            logs.append((log["motor_velocity"][healthy, drive], log["motor_torque"][healthy, drive], log["timestamp"][healthy]))
+        try:
+            table, (ks, kv, ka) = characterize(logs, max_velocity=profile.velocity_limit)
+        except ValueError as e:
+            print(f"{module.name} (drive {module.drive_id}): not fitted, {e}")
+            continue
+
+        tables[module.drive_id] = table
+        fitted += 1
+        samples = sum(len(velocity) for velocity, _, _ in logs)
+        print(f"{module.name} (drive {module.drive_id}): kS={ks:.4f} Nm  kV={kv:.5f} Nm/(rev/s)  kA={ka:.5f} Nm/(rev/s²)  "
+              f"from {samples} samples, max torque {np.max(np.abs(table.torques)):.3f} Nm")
+
+    if fitted:
+        save_feedforward(output, tables)
+        print(f"Saved {fitted} feedforward tables to {output}")
+    return fitted
+
+
+async def sweep(profile: RobotProfile, output: str, simulate: bool) -> None:
+    """
+    Runs the default sweep program on every servo and saves the telemetry.
+    """
+    from Swerve.SwerveDrive import SwerveDrive
+    from Utils.ScriptedController import ScriptedController
+
+    if simulate:
+        from Swerve.Replay import TickClock
+        from Swerve.SimTransport import SimTransport
+
+        # The simulated servos follow a clock that only moves when the sweep waits, so the sweep runs as fast as it can.
+        clock = TickClock(0.0)
+
+        async def sleep(seconds):
+            clock.set(clock() + seconds)
+
+        transport = SimTransport.from_profile(profile, clock=clock)
+    else:
+        import moteus_pi3hat  # Only importable on the Pi.
+        clock = time.monotonic
+        sleep = asyncio.sleep
+        transport = moteus_pi3hat.Pi3HatRouter(servo_bus_map=profile.servo_bus_map)
+
+    swerve_drive = SwerveDrive(transport=transport, controller=ScriptedController(lambda t: (0.0, 0.0, 0.0), clock=clock),
+                               profile=profile, steer_offset_path=None if simulate else Constants.STEER_OFFSET_PATH,
+                               feedforward_path=None, clock=clock)
+    await swerve_drive.initialize_modules()
+
+    start = time.perf_counter()
+    log = await run_sweeps(swerve_drive, sleep=sleep)
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    log.save(output)
+    print(f"Recorded {log.count} ticks of {len(log.program)} sweeps in {time.perf_counter() - start:.1f} s to {output}")
+
+
+def tune(path: str, profile: RobotProfile, output: str = None) -> RobotProfile:
+    """
+    Fits a sweep log, prints the fit of every motor and the tuned values, and saves the tuned profile if output is given.
+    """
+    fit = fit_sweeps(SweepLog.load(path))
+    print(f"{'motor':>6}{'kS Nm':>10}{'kV Nm/(rev/s)':>16}{'kA Nm/(rev/s²)':>16}{'top rev/s':>12}{'max rev/s²':>12}  samples")
+    for motor_id, motor in fit["motors"].items():
+        top = f"{motor['max_velocity']:.2f}" + ("" if motor["saturated"] else "+")
+        print(f"{motor_id:>6}{motor['ks']:>10.4f}{motor['kv']:>16.5f}{motor['ka']:>16.5f}{top:>12}{motor['max_accel']:>12.1f}  {motor['samples']}")
+    print("(+: the motor kept up with the whole ramp, so its top speed is higher and its velocity limit is kept)")
+
+    tuned = tuned_profile(profile, fit)
+    before, after = profile.to_dict(), tuned.to_dict()
+    for section in ("drivetrain", "limits", "gains"):
+        for key, value in after[section].items():
+            if value != before[section][key]:
+                print(f"{section}.{key}: {before[section][key]:.6g} -> {value:.6g}")
+
+    if output:
+        save_profile(tuned, output)
+        print(f"Saved the tuned profile to {output}")
+    return tuned
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Characterize the drivetrain and tune the robot profile.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sweep_parser = subparsers.add_parser("sweep", help="Run the sweep program on every servo and save its telemetry")
+    sweep_parser.add_argument("--profile", help="Robot profile, the values in Utils/Constants.py if not given")
+    sweep_parser.add_argument("--output", default=time.strftime("sweeps/%Y%m%d-%H%M%S.npz"), help="Sweep log to write")
+    sweep_parser.add_argument("--sim", action="store_true", help="Sweep a simulated transport instead of the Pi3Hat")
+    sweep_parser.add_argument("--yes", action="store_true", help="Do not ask before the robot starts moving")
+
+    tune_parser = subparsers.add_parser("tune", help="Fit a sweep log and tune the robot profile")
+    tune_parser.add_argument("log", help="Sweep log written by sweep")
+    tune_parser.add_argument("--profile", help="Robot profile the sweep was run with, the values in Utils/Constants.py if not given")
+    tune_parser.add_argument("--output", help="Profile file to write the tuned profile to (comments are not kept). Only printed if not given")
+
+    fit_parser = subparsers.add_parser("fit", help="Fit feedforward tables from telemetry files")
+    fit_parser.add_argument("logs", nargs="+", help="Telemetry files, or glob patterns of them")
+    fit_parser.add_argument("--profile", help="Robot profile, for the drive ids and velocity limit. The values in Utils/Constants.py if not given")
+    fit_parser.add_argument("--output", default=Constants.FEEDFORWARD_PATH, help="Feedforward file to write")
+    args = parser.parse_args()
+
+    profile = load_profile(args.profile) if args.profile else RobotProfile.default()
+    if args.command == "sweep":
+        if not args.sim and not args.yes:
+            input("The robot will drive about 3 m forward and back, and spin every module. Press enter when it is clear, Ctrl+C to cancel. ")
+        asyncio.run(sweep(profile, args.output, args.sim))
+    elif args.command == "tune":
+        tune(args.log, profile, args.output)
+    elif args.command == "fit":
+        paths = sorted({path for pattern in args.logs for path in (glob.glob(pattern) or [pattern])})
+        sys.exit(0 if fit(paths, profile, args.output) else 1)
+
+
+if __name__ == "__main__":
+    main()
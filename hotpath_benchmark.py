@@ -0,0 +1,182 @@
+import argparse
+import asyncio
+import gc
+import math
+import sys
+import time
+import tracemalloc
+import Utils.Constants as Constants
+from Swerve.Replay import TickClock
+from Swerve.SimTransport import SimTransport
+from Swerve.SwerveDrive import SwerveDrive
+from Utils.Realtime import freeze_gc, unfreeze_gc
+from Utils.RobotProfile import RobotProfile, load_profile
+from Utils.ScriptedController import ScriptedController
+
+"""
+Allocation benchmark of one drive tick (teleop_periodic() and swerve_drive_periodic()), with and without the fast path.
+
+Drives a figure eight on the simulated transport, on a clock that moves one loop period per tick, so both
+modes see the same trace and the timings only measure the code. The two modes run in alternating rounds,
+so a change in machine load during the run shows up in both instead of in whichever ran second. For each mode it reports:
+    tick time       p50, p99 and max of the tick, timed without tracemalloc
+    drive time      the same without the time spent in the simulated transport (which simulates the servos,
+                    encodes their replies and has moteus parse them), so only the drive's own code
+    transient       peak bytes a tick allocates above what was alive when it started (tracemalloc)
+    retained        blocks still alive after a round that were not before it, per tick
+    gc              collections during the timed ticks, and the longest pause
+With the fast path the garbage collector is frozen during its rounds, as main.py --fast-path does, and the
+young generations are collected every GC_COLLECT_PERIOD ticks between ticks (not counted in the tick time).
+
+Example:
+    python hotpath_benchmark.py --ticks 5000
+"""
+
+
+def figure8(t: float) -> tuple:
+    return math.sin(t), math.sin(2.0 * t), 0.5
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return math.nan
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class ModeRun:
+    """
+    One drive on the simulated transport, and the measurements of its ticks over every round.
+    """
+
+    def __init__(self, profile: RobotProfile, fast_path: bool):
+        self.fast_path = fast_path
+        self.clock = TickClock(0.0)
+        self.transport = SimTransport.from_profile(profile, clock=self.clock)
+        self.swerve_drive = SwerveDrive(transport=self.transport, controller=ScriptedController(figure8, clock=self.clock),
+                                        profile=profile, steer_offset_path=None, feedforward_path=None, clock=self.clock,
+                                        fast_path=fast_path)
+        self.tick_times = []
+        self.drive_times = []
+        self.transient = []
+        self.retained_blocks = 0
+        self.gc_pauses = []
+
+        # Time spent in the transport, per tick.
+        self.transport_time = 0.0
+        sim_cycle = self.transport.cycle
+
+        async def timed_cycle(commands, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await sim_cycle(commands, **kwargs)
+            finally:
+                self.transport_time += time.perf_counter() - start
+        self.transport.cycle = timed_cycle
+
+    async def tick(self) -> None:
+        self.clock.set(self.clock() + Constants.LOOP_PERIOD)
+        await self.swerve_drive.teleop_periodic(Constants.LOOP_PERIOD)
+        await self.swerve_drive.swerve_drive_periodic()
+
+    async def run_round(self, ticks: int) -> None:
+        # Garbage collections and their pauses, through the collector's own callbacks.
+        pauses = []
+        started = [0.0]
+
+        def on_gc(phase, info):
+            if phase == "start":
+                started[0] = time.perf_counter()
+            else:
+                pauses.append(time.perf_counter() - started[0])
+
+        if self.fast_path:
+            freeze_gc()
+        gc.callbacks.append(on_gc)
+        blocks_before = sys.getallocatedblocks()
+        try:
+            for index in range(1, ticks + 1):
+                self.transport_time = 0.0
+                start = time.perf_counter()
+                await self.tick()
+                elapsed = time.perf_counter() - start
+                self.tick_times.append(elapsed)
+                self.drive_times.append(elapsed - self.transport_time)
+                if self.fast_path and index % Constants.GC_COLLECT_PERIOD == 0:
+                    gc.collect(1)
+            # Let the collector take what is garbage, so only what the ticks really kept counts as retained.
+            # In the fast path these are the collections run between ticks, in standard mode the ones that interrupted a tick.
+            self.gc_pauses.extend(pauses)
+            gc.collect(1)
+            self.retained_blocks += sys.getallocatedblocks() - blocks_before
+        finally:
+            gc.callbacks.remove(on_gc)
+            if self.fast_path:
+                unfreeze_gc()
+
+    async def measure_transient(self, ticks: int) -> None:
+        # A separate pass under tracemalloc, which slows every allocation down too much to time the rounds.
+        tracemalloc.start()
+        try:
+            for _ in range(ticks):
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                await self.tick()
+                self.transient.append(tracemalloc.get_traced_memory()[1] - current)
+        finally:
+            tracemalloc.stop()
+
+    def report(self) -> dict:
+        return {
+            "mode": "fast path" if self.fast_path else "standard",
+            "tick_p50_us": percentile(self.tick_times, 0.50) * 1e6,
+            "tick_p99_us": percentile(self.tick_times, 0.99) * 1e6,
+            "tick_max_us": max(self.tick_times) * 1e6,
+            "drive_p50_us": percentile(self.drive_times, 0.50) * 1e6,
+            "drive_p99_us": percentile(self.drive_times, 0.99) * 1e6,
+            "drive_max_us": max(self.drive_times) * 1e6,
+            "transient_bytes_p50": percentile(self.transient, 0.50),
+            "transient_bytes_max": max(self.transient),
+            "retained_blocks_per_tick": self.retained_blocks / len(self.tick_times),
+            "gc_collections": len(self.gc_pauses),
+            "gc_max_pause_us": max(self.gc_pauses) * 1e6 if self.gc_pauses else 0.0,
+        }
+
+
+async def run_benchmark(profile: RobotProfile, ticks: int, warmup: int, rounds: int) -> list:
+    runs = [ModeRun(profile, fast_path) for fast_path in (False, True)]
+    for run in runs:
+        await run.swerve_drive.initialize_modules()
+        for _ in range(warmup):
+            await run.tick()
+
+    round_ticks = max(1, ticks // rounds)
+    for index in range(rounds):
+        # Which mode goes first alternates too.
+        for run in (runs if index % 2 == 0 else runs[::-1]):
+            await run.run_round(round_ticks)
+
+    for run in runs:
+        await run.measure_transient(min(ticks, 1000))
+    return [run.report() for run in runs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the allocations of a drive tick, with and without the fast path.")
+    parser.add_argument("--profile", help="Robot profile, the values in Utils/Constants.py if not given")
+    parser.add_argument("--ticks", type=int, default=5000, help="Ticks to time in each mode")
+    parser.add_argument("--warmup", type=int, default=500, help="Ticks to run before timing, so caches and the pose estimator history fill up")
+    parser.add_argument("--rounds", type=int, default=10, help="How many alternating rounds to split the timed ticks of each mode into")
+    args = parser.parse_args()
+
+    profile = load_profile(args.profile) if args.profile else RobotProfile.default()
+    reports = asyncio.run(run_benchmark(profile, args.ticks, args.warmup, args.rounds))
+    print(f"{'':<26}" + "".join(f"{report['mode']:>14}" for report in reports))
+    for key in reports[0]:
+        if key == "mode":
+            continue
+        print(f"{key:<26}" + "".join(f"{report[key]:>14.1f}" for report in reports))
+
+
+if __name__ == "__main__":
+    main()
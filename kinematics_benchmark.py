@@ -0,0 +1,95 @@
+import argparse
+import math
+import random
+import time
+import numpy as np
+import wpimath.kinematics
+from wpimath.geometry import Rotation2d
+import Utils.Constants as Constants
+from Swerve.SwerveKinematics import SwerveKinematics
+
+"""
+Checks the fast kinematics (Swerve/SwerveKinematics.py) against wpimath, then times both per tick and in a batch.
+
+Example:
+    python kinematics_benchmark.py --samples 2000 --iterations 20000
+"""
+
+MODULE_TRANSLATIONS = [Constants.FRONT_LEFT, Constants.FRONT_RIGHT, Constants.BACK_LEFT, Constants.BACK_RIGHT]
+
+
+def wpimath_tick(kinematics, vx, vy, omega, current_angles, dt):
+    speeds = wpimath.kinematics.ChassisSpeeds.discretize(wpimath.kinematics.ChassisSpeeds(vx, vy, omega), dt)
+    states = kinematics.toSwerveModuleStates(speeds)
+    states = wpimath.kinematics.SwerveDrive4Kinematics.desaturateWheelSpeeds(states, Constants.MAX_SPEED)
+    for state, current_angle in zip(states, current_angles):
+        state.optimize(current_angle)
+        state.cosineScale(current_angle)
+    return states
+
+
+def fast_tick(kinematics, vx, vy, omega, current_angles, dt):
+    vx, vy, omega = kinematics.discretize(vx, vy, omega, dt)
+    return kinematics.to_module_states(vx, vy, omega, current_angles)
+
+
+def check_parity(samples: int, tolerance: float = 1e-9) -> float:
+    """
+    Compares both implementations on random chassis speeds and module angles.
+
+    :return float: The largest difference found, in meters per second (speeds) or radians (angles).
+    """
+    rng = random.Random(0)
+    reference = wpimath.kinematics.SwerveDrive4Kinematics(*MODULE_TRANSLATIONS)
+    fast = SwerveKinematics(MODULE_TRANSLATIONS, Constants.MAX_SPEED)
+
+    worst = 0.0
+    for _ in range(samples):
+        vx, vy, omega = (rng.uniform(-6.0, 6.0), rng.uniform(-6.0, 6.0), rng.uniform(-10.0, 10.0))
+        current = [rng.uniform(-math.pi, math.pi) for _ in range(4)]
+
+        expected = wpimath_tick(reference, vx, vy, omega, [Rotation2d(a) for a in current], Constants.LOOP_PERIOD)
+        speeds, angles = fast_tick(fast, vx, vy, omega, current, Constants.LOOP_PERIOD)
+
+        for state, speed, angle in zip(expected, speeds, angles):
+            angle_error = abs(math.remainder(state.angle.radians() - angle, 2.0 * math.pi))
+            worst = max(worst, abs(state.speed - speed), angle_error)
+
+    if worst > tolerance:
+        raise AssertionError(f"NumPy kinematics differs from wpimath by {worst}")
+    return worst
+
+
+def time_per_tick(function, kinematics, current_angles, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        function(kinematics, 1.5, -0.5 + i * 1e-6, 2.0, current_angles, Constants.LOOP_PERIOD)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check NumPy swerve kinematics against wpimath and time both.")
+    parser.add_argument("--samples", type=int, default=2000, help="Random samples for the parity check")
+    parser.add_argument("--iterations", type=int, default=20000, help="Ticks to time each implementation over")
+    parser.add_argument("--batch", type=int, default=10000, help="Chassis speed samples for the batched timing")
+    args = parser.parse_args()
+
+    worst = check_parity(args.samples)
+    print(f"parity: OK over {args.samples} samples, max difference {worst:.3g}")
+
+    reference = wpimath.kinematics.SwerveDrive4Kinematics(*MODULE_TRANSLATIONS)
+    fast = SwerveKinematics(MODULE_TRANSLATIONS, Constants.MAX_SPEED)
+    wpimath_time = time_per_tick(wpimath_tick, reference, [Rotation2d(0.1)] * 4, args.iterations)
+    fast_time = time_per_tick(fast_tick, fast, [0.1] * 4, args.iterations)
+    print(f"wpimath per tick: {wpimath_time * 1e6:.1f} us")
+    print(f"fast per tick:    {fast_time * 1e6:.1f} us")
+
+    samples = np.random.default_rng(0).uniform(-4.0, 4.0, size=(args.batch, 3))
+    start = time.perf_counter()
+    fast.to_module_states_batch(samples)
+    batch_time = time.perf_counter() - start
+    print(f"numpy batch of {args.batch}: {batch_time * 1e3:.2f} ms ({batch_time / args.batch * 1e6:.3f} us per sample)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,146 @@
+import time
+STARTUP_START = time.perf_counter()
+
+import argparse
 import asyncio
 from Swerve.SwerveDrive import SwerveDrive
+from Swerve.Trajectory import PathThenTeleop, load_trajectory
+from Utils.ControlLoop import ControlLoop
+from Utils.Controller import Controller
+from Utils.RobotProfile import RobotProfile, load_profile
+from Utils.TelemetryRecorder import TelemetryRecorder
+from Utils.Profiler import MetricsServer, profiler
+from Utils.Realtime import freeze_gc, unfreeze_gc
+import Utils.Constants as Constants
+
+IMPORT_TIME = time.perf_counter() - STARTUP_START
+
+async def main(swerve_drive: SwerveDrive = None, path: str = None, metrics_port: int = Constants.METRICS_PORT, replay_recorder=None,
+               config_transport=None):
+    # Load (or generate) the autonomous path in the background while the modules start up.
+    trajectory_task = None
+    if path:
+        trajectory_task = asyncio.ensure_future(load_trajectory(path, translations=swerve_drive.profile.translations))
+    drive_tick = PathThenTeleop(swerve_drive, has_path=trajectory_task is not None)
 
-async def main(swerve_drive: SwerveDrive = None):
     await swerve_drive.initialize_modules()
-    speeds = [0.0, 0.0, 0.0]
-    while True:
-        speeds = await swerve_drive.getControllerSpeeds()
-        await swerve_drive.set_drive_speeds(speeds[0], speeds[1], speeds[2], False)
+    if replay_recorder is not None:
+        replay_recorder.record_drive(swerve_drive, has_path=trajectory_task is not None)
+
+    if config_transport is not None:
+        phase_start = time.perf_counter()
+        await swerve_drive.verify_servo_config(config_transport)
+        swerve_drive.startup_timings["verify config"] = time.perf_counter() - phase_start
+
+    phase_start = time.perf_counter()
+    recorder = TelemetryRecorder(Constants.TELEMETRY_PATH, Constants.TELEMETRY_CAPACITY)
+    swerve_drive.startup_timings["telemetry recorder"] = time.perf_counter() - phase_start
+
+    # Per-stage timings for swerve_metrics.py. Profiling itself stays off until it is enabled.
+    metrics_server = await MetricsServer.start(port=metrics_port) if metrics_port else None
+
+    timings = ", ".join(f"{phase} {seconds * 1000.0:.1f} ms" for phase, seconds in swerve_drive.startup_timings.items())
+    print(f"Ready to drive {(time.perf_counter() - STARTUP_START) * 1000.0:.1f} ms after start ({timings})")
+
+    async def tick(dt):
+        nonlocal trajectory_task
+        span = profiler.start()
+        if replay_recorder is not None:
+            swerve_drive.clock.set(time.monotonic())
+            replay_recorder.record_tick(swerve_drive.clock(), dt)
+
+        # Hold still until the path is ready, then follow it before handing over to the joystick.
+        if trajectory_task is not None and trajectory_task.done():
+            table = trajectory_task.result()
+            trajectory_task = None
+            if replay_recorder is not None:
+                replay_recorder.record_path(table)
+            drive_tick.start(table)
+
+        await drive_tick.tick(dt)
+        recorder.record_drive(swerve_drive, dt, control_loop.last_jitter, control_loop.last_tick_time)
+        profiler.stop("tick", span)
+
+    gc_period = 0
+    if swerve_drive.fast_path:
+        # Everything built so far lives for the whole run, keep the collector off it and out of the ticks.
+        freeze_gc()
+        gc_period = Constants.GC_COLLECT_PERIOD
+    control_loop = ControlLoop(tick, Constants.LOOP_RATE_HZ, gc_period=gc_period)
+    try:
+        await control_loop.run()
+    finally:
+        if swerve_drive.fast_path:
+            unfreeze_gc()
+        recorder.close()
+        if replay_recorder is not None:
+            replay_recorder.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        print(f"Control loop stats: {control_loop.stats()}")
+        print(f"Fault stats: {swerve_drive.fault_manager.stats()}")
+        print(f"Command stats: {swerve_drive.command_stats()}")
+        print(f"Bus stats: {swerve_drive.dispatcher.stats()}")
 
         
     
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the swerve drive.")
+    parser.add_argument("--path", help="Path file (see paths/example.json) to follow autonomously before joystick control")
+    parser.add_argument("--profile", help="Robot profile (see profiles/swerve-2025.toml), the values in Utils/Constants.py if not given")
+    parser.add_argument("--record", help="Replay log to record the run into (see replay.py), e.g. replays/match.replay")
+    parser.add_argument("--metrics-port", type=int, default=Constants.METRICS_PORT, help="UDP port for swerve_metrics.py, 0 to not serve metrics")
+    parser.add_argument("--sim", action="store_true", help="Drive a simulated transport instead of the Pi3Hat")
+    parser.add_argument("--fast-path", action="store_true", help="Reuse frames and buffers every tick and freeze the garbage collector after startup (see hotpath_benchmark.py)")
+    parser.add_argument("--processes", action="store_true", help="Run input, control, estimation and logging as separate processes (see Swerve/DriveProcesses.py)")
+    parser.add_argument("--rt-cpu", type=int, default=Constants.RT_CPU, help="With --processes, the CPU to pin the control process to, -1 to not pin it")
+    parser.add_argument("--rt-priority", type=int, default=Constants.RT_PRIORITY, help="With --processes, the SCHED_FIFO priority of the control process, 0 to not use SCHED_FIFO")
+    args = parser.parse_args()
+
+    if args.processes:
+        if args.path or args.record:
+            parser.error("--path and --record are not supported with --processes")
+        from Swerve.DriveProcesses import run_processes
+        run_processes(args.profile, args.sim, args.rt_cpu if args.rt_cpu >= 0 else None,
+                      args.rt_priority if args.rt_priority > 0 else None, args.metrics_port,
+                      fast_path=args.fast_path or Constants.FAST_PATH)
+        exit(0)
+
     # Initialize SwerveDrive instance
-    swerve_drive = SwerveDrive()
+    phase_start = time.perf_counter()
+    profile = load_profile(args.profile) if args.profile else RobotProfile.default()
+    if args.sim:
+        from Swerve.SimTransport import SimTransport
+        transport = SimTransport.from_profile(profile)
+    else:
+        import moteus_pi3hat  # Only importable on the Pi.
+        transport = moteus_pi3hat.Pi3HatRouter(servo_bus_map=profile.servo_bus_map)
+    # The simulated servos have no diagnostic stream. Read below any recorder, so a replay does not expect it.
+    config_transport = None if args.sim else transport
+    controller = Controller()
+    clock = time.monotonic
+
+    replay_recorder = None
+    if args.record:
+        # Record every controller read and bus cycle, on a clock that only moves once per tick so a replay can match it exactly.
+        from Swerve.Replay import ReplayRecorder, RecordingController, RecordingTransport, TickClock
+        replay_recorder = ReplayRecorder(args.record)
+        transport = RecordingTransport(transport, replay_recorder)
+        controller = RecordingController(controller, replay_recorder)
+        clock = TickClock()
+
+    swerve_drive = SwerveDrive(transport=transport, controller=controller, profile=profile,
+                               steer_offset_path=None if args.sim else Constants.STEER_OFFSET_PATH, clock=clock,
+                               feedforward_path=None if args.sim else Constants.FEEDFORWARD_PATH,
+                               fast_path=args.fast_path or Constants.FAST_PATH)
+    swerve_drive.startup_timings["imports"] = IMPORT_TIME
+    swerve_drive.startup_timings["construct drive"] = time.perf_counter() - phase_start
     try:
-        asyncio.run(main(swerve_drive))
+        asyncio.run(main(swerve_drive, args.path, args.metrics_port, replay_recorder, config_transport))
     except KeyboardInterrupt:
         print("Program interrupted by user. Stopping all modules.")
         asyncio.run(swerve_drive.stop())
         exit(0)
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-        asyncio.run(swerve_drive.stop()) 
\ No newline at end of file
+        asyncio.run(swerve_drive.stop()) 
@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import glob
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from Swerve.Replay import ReplayLog, ReplayMismatch, replay
+
+"""
+Replays recorded runs (main.py --record) through the current drive code, as fast as it can,
+and checks that every command frame it sends is the same as in the recording.
+
+Any change to the control code that changes what goes to the motors shows up as a mismatch,
+naming the first tick and servo that differ. Exits with 1 if any log did not match.
+
+Example:
+    python replay.py "replays/*.replay" --jobs 8
+"""
+
+
+def replay_one(path: str) -> tuple:
+    """
+    Replays one log.
+
+    :return tuple: (path, ticks replayed, recorded seconds, replay seconds, error message or None).
+    """
+    start = time.perf_counter()
+    try:
+        log = ReplayLog(path)
+        recorded = log.ticks[-1][0] - log.ticks[0][0] if log.ticks else 0.0
+        ticks = asyncio.run(replay(path))
+    except (ReplayMismatch, ValueError, OSError) as e:
+        return path, 0, 0.0, time.perf_counter() - start, str(e)
+    return path, ticks, recorded, time.perf_counter() - start, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded runs and check the commands match bit for bit.")
+    parser.add_argument("logs", nargs="+", help="Replay logs, or glob patterns of them")
+    parser.add_argument("--jobs", type=int, default=1, help="How many logs to replay at the same time, in separate processes")
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in args.logs for path in (glob.glob(pattern) or [pattern])})
+    start = time.perf_counter()
+    if args.jobs > 1:
+        with ProcessPoolExecutor(args.jobs) as executor:
+            outcomes = list(executor.map(replay_one, paths))
+    else:
+        outcomes = [replay_one(path) for path in paths]
+
+    failed = 0
+    for path, ticks, recorded, elapsed, error in outcomes:
+        if error is None:
+            print(f"OK        {path}: {ticks} ticks, {recorded:.1f} s recorded in {elapsed:.2f} s ({recorded / max(elapsed, 1e-9):.0f}x real time)")
+        else:
+            failed += 1
+            print(f"MISMATCH  {path}: {error}")
+    print(f"{len(paths) - failed} of {len(paths)} logs matched in {time.perf_counter() - start:.2f} s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
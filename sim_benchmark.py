@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import math
+import time
+import Utils.Constants as Constants
+from Swerve.SwerveDrive import SwerveDrive
+from Swerve.SimTransport import SimTransport
+from Utils.ControlLoop import ControlLoop
+from Utils.ScriptedController import ScriptedController
+
+"""
+Closed-loop benchmark of the drive against the simulated transport. Runs on any machine, no Pi3Hat needed.
+
+Drives a scripted joystick trace through SwerveDrive (the teleop tick of main.py, setpoint ramp included)
+and reports control cycles per second, transport round-trip latency and, for the step trace, the
+command-to-response time of the simulated modules: from the joystick step until the measured speed of every
+module is within RESPONSE_TOLERANCE of the speed it is finally commanded, once the setpoint ramp has settled.
+
+Example:
+    python sim_benchmark.py --rate 250 --duration 5 --trace step --latency 0.0005
+"""
+
+MODULES = [(11, 12), (13, 14), (15, 16), (17, 18)]
+
+# Traces that hold the stick still between steps, so every step gets a response time.
+STEP_TRACES = ("step",)
+
+RESPONSE_TOLERANCE = 0.1  # fraction of the final commanded wheel speed
+RESPONSE_MIN_TOLERANCE = 0.02  # m/s, for steps to (or near) a stop
+
+TRACES = {
+    # Full forward for two seconds every four, long enough for the wheels to settle after each step.
+    "step": lambda t: (1.0 if int(t / 2.0) % 2 == 1 else 0.0, 0.0, 0.0),
+    # Slow sweep of the left stick, with some rotation.
+    "sine": lambda t: (math.sin(t), math.cos(t), 0.3 * math.sin(0.5 * t)),
+    # Figure eight while spinning.
+    "figure8": lambda t: (math.sin(t), math.sin(2.0 * t), 0.5),
+}
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return math.nan
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+async def run_benchmark(rate_hz: float, duration: float, trace: str, latency: float, frame_time: float) -> dict:
+    transport = SimTransport(
+        Constants.SERVO_BUS_MAP,
+        modules=MODULES,
+        bus_latency={bus: latency for bus in Constants.SERVO_BUS_MAP},
+        frame_time=frame_time)
+    controller = ScriptedController(TRACES[trace])
+    swerve_drive = SwerveDrive(transport=transport, controller=controller, steer_offset_path=None, feedforward_path=None)
+    await swerve_drive.initialize_modules()
+
+    # Time every transport cycle.
+    cycle_latencies = []
+    sim_cycle = transport.cycle
+
+    async def timed_cycle(commands, **kwargs):
+        start = time.perf_counter()
+        results = await sim_cycle(commands, **kwargs)
+        cycle_latencies.append(time.perf_counter() - start)
+        return results
+    transport.cycle = timed_cycle
+
+    # Command-to-response: time from a step of the joystick trace until every module turns at the wheel speed
+    # the step finally commands. A step that is followed by the next before it settles gets no time.
+    response_times = []
+    measure_response = trace in STEP_TRACES
+    pending = {"step": 0}
+    generator = swerve_drive.setpoint_generator
+
+    async def tick(dt):
+        await swerve_drive.teleop_periodic(dt)
+        await swerve_drive.swerve_drive_periodic()
+        if not measure_response or controller.changes == pending["step"]:
+            return
+
+        # The wheel speeds are only final once the setpoint ramp has reached the stick, which leaves it with no acceleration.
+        if generator.ax != 0.0 or generator.ay != 0.0 or generator.alpha != 0.0:
+            return
+        for module in swerve_drive.modules:
+            final_speed = abs(module.desired_speed)
+            if abs(abs(module.speed) - final_speed) > max(RESPONSE_TOLERANCE * final_speed, RESPONSE_MIN_TOLERANCE):
+                return
+        response_times.append(time.monotonic() - controller.changed_at)
+        pending["step"] = controller.changes
+
+    start = time.perf_counter()
+    control_loop = None
+    if rate_hz > 0:
+        control_loop = ControlLoop(tick, rate_hz)
+        asyncio.get_running_loop().call_later(duration, control_loop.stop)
+        await control_loop.run()
+    else:
+        # Free-running, as fast as the code allows.
+        last = start
+        while time.perf_counter() - start < duration:
+            now = time.perf_counter()
+            await tick(now - last if now > last else Constants.LOOP_PERIOD)
+            last = now
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "trace": trace,
+        "cycles_per_second": transport.cycles / elapsed,
+        "cycle_latency_p50_ms": percentile(cycle_latencies, 0.50) * 1e3,
+        "cycle_latency_p99_ms": percentile(cycle_latencies, 0.99) * 1e3,
+    }
+    if measure_response:
+        report["steps"] = controller.changes
+        report["responses"] = len(response_times)
+        report["response_time_p50_ms"] = percentile(response_times, 0.50) * 1e3
+        report["response_time_max_ms"] = max(response_times) * 1e3 if response_times else math.nan
+    if control_loop is not None:
+        report["loop"] = control_loop.stats()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the swerve drive against a simulated transport.")
+    parser.add_argument("--rate", type=float, default=Constants.LOOP_RATE_HZ, help="Control loop rate in Hz, 0 to free-run")
+    parser.add_argument("--duration", type=float, default=5.0, help="How long to run, in seconds")
+    parser.add_argument("--trace", choices=sorted(TRACES), default="step", help="Scripted joystick trace to drive")
+    parser.add_argument("--latency", type=float, default=0.0005, help="Simulated CAN latency per bus per cycle, in seconds")
+    parser.add_argument("--frame-time", type=float, default=0.0001, help="Extra simulated latency per frame on a bus, in seconds")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args.rate, args.duration, args.trace, args.latency, args.frame_time))
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
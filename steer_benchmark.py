@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import math
+import Utils.Constants as Constants
+from Swerve.SwerveKinematics import SwerveKinematics
+from Swerve.SwerveModule import SwerveModule
+from Swerve.SimTransport import SimTransport
+
+"""
+Steer settle time benchmark of one simulated swerve module. Runs on any machine, no Pi3Hat needed.
+
+Sweeps the module around through directions that cross the +-180 degree seam, and
+measures how long the wheel takes to settle on each new direction, once with the module angle
+sent as an absolute steer position (the old behavior) and once with the nearest equivalent steer
+position from the SteerController. Runs on a simulated clock, so results are repeatable.
+
+Example:
+    python steer_benchmark.py --tolerance 1.0
+"""
+
+BUS_MAP = {1: [11, 12]}
+
+# Directions to drive in, in degrees. Each one is held for one step. Steps of 45 degrees are never
+# flipped by the 90 degree optimization, so sweeping around keeps the wheel crossing the +-180 seam.
+DIRECTIONS = [45.0 * i for i in range(1, 17)] + [45.0 * i for i in range(15, -1, -1)]
+
+
+async def run_mode(mode: str, step_time: float, tolerance_deg: float, rate_hz: float) -> list:
+    """
+    Runs every direction of DIRECTIONS with one steer mapping.
+
+    :param mode (str): "absolute" to send the module angle as an absolute steer position, "nearest" to use the SteerController.
+
+    :return list: The settle time of every step in seconds, or nan if it did not settle within step_time.
+    """
+    now = [0.0]
+    transport = SimTransport(BUS_MAP, clock=lambda: now[0])
+    module = SwerveModule(drive_id=11, steer_id=12, transport=transport)
+    for motor in (module.drive, module.steer):
+        motor.suppression = "off"  # Suppression refreshes on the wall clock, not the simulated one.
+    kinematics = SwerveKinematics([(0.0, 0.0)], Constants.MAX_SPEED)
+    period = 1.0 / rate_hz
+    tolerance = math.radians(tolerance_deg)
+
+    async def tick(commands):
+        now[0] += period
+        results = await transport.cycle(commands)
+        module.update_from_results({result.id: result for result in results})
+
+    await tick(module.make_query_commands())
+
+    settle_times = []
+    for direction in DIRECTIONS:
+        target = math.radians(direction)
+        vx, vy = math.cos(target), math.sin(target)
+        last_outside = 0.0
+        ticks = int(round(step_time / period))
+        for i in range(ticks):
+            speeds, angles = kinematics.to_module_states(vx, vy, 0.0, [module.angle])
+            speed, angle = speeds[0], angles[0]
+            if mode == "absolute":
+                commands = [
+                    module.steer.make_position_command(angle / (2.0 * math.pi) + module.steer_controller.offset),
+                    module.drive.make_velocity_command(speed * module.drive_revs_per_meter),
+                ]
+            else:
+                commands = module.make_commands(speed, angle)
+            await tick(commands)
+
+            # The wheel may point either way, the drive speed is flipped to match.
+            error = abs(math.remainder(module.angle - target, math.pi))
+            if error > tolerance:
+                last_outside = (i + 1) * period
+        settle_times.append(last_outside if last_outside < step_time else math.nan)
+    return settle_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark steer settle time with absolute and nearest steer targets.")
+    parser.add_argument("--rate", type=float, default=Constants.LOOP_RATE_HZ, help="Control loop rate in Hz")
+    parser.add_argument("--step-time", type=float, default=1.5, help="How long each direction is held, in seconds")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="Settled once the wheel stays within this many degrees")
+    args = parser.parse_args()
+
+    for mode in ("absolute", "nearest"):
+        settle_times = asyncio.run(run_mode(mode, args.step_time, args.tolerance, args.rate))
+        settled = [t for t in settle_times if not math.isnan(t)]
+        print(f"{mode}: settle_ms={[round(t * 1e3, 1) for t in settle_times]} "
+              f"mean_ms={sum(settled) / max(len(settled), 1) * 1e3:.1f} max_ms={max(settled, default=math.nan) * 1e3:.1f} "
+              f"unsettled={len(settle_times) - len(settled)}")
+
+
+if __name__ == "__main__":
+    main()
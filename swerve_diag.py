@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import json
+import math
+import moteus
+import sys
+import time
+import Utils.Constants as Constants
+from Swerve.Diagnostics import measure_bus_latency, motor_rows, run_health_checks
+from Utils.RobotProfile import RobotProfile, load_profile
+
+"""
+Pit diagnostics of the swerve drive, through the bus map of the robot profile.
+
+Every command queries all servos on all buses in one cycle (see Swerve/Diagnostics.py):
+    python swerve_diag.py watch                  live table of every servo at 100 Hz
+    python swerve_diag.py check --json           health checks of every module, and bus latency
+    python swerve_diag.py latency                round-trip time of each bus
+
+check moves the wheels (a steer sweep and a short drive spin), put the robot on blocks or use
+--no-motion. It exits with 1 if any module fails, so it can gate a pit checklist. Add --sim to any
+command to run it against the simulated transport.
+"""
+
+
+def _clean(value):
+    # JSON has no nan: report missing readings as null.
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {str(key): _clean(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(item) for item in value]
+    return value
+
+
+def _register_name(register: int) -> str:
+    try:
+        return moteus.Register(register).name.lower()
+    except ValueError:
+        return str(register)
+
+
+def print_json(data) -> None:
+    print(json.dumps(_clean(data), allow_nan=False), flush=True)
+
+
+def print_table(rows: list, rate: float, faults: dict) -> None:
+    lines = [f"{'module':<13}{'role':<7}{'id':>4}{'bus':>5}{'pos rev':>11}{'vel rev/s':>11}{'torque Nm':>11}"
+             f"{'temp °C':>9}{'volts':>8}{'fault':>7}{'mode':>6}{'age ms':>8}"]
+    for row in rows:
+        mode = "-" if row["mode"] is None else str(row["mode"])
+        lines.append(f"{row['module']:<13}{row['role']:<7}{row['id']:>4}{row['bus'] or '-':>5}{row['position']:>11.4f}{row['velocity']:>11.3f}"
+                     f"{row['torque']:>11.3f}{row['temperature']:>9.1f}{row['voltage']:>8.1f}{row['fault']:>7}{mode:>6}{row['age'] * 1000.0:>8.1f}")
+    lines.append(f"{rate:.0f} Hz, faults {faults or 'none'}. Ctrl+C to quit.")
+    # Home the cursor and clear to the end, so the table redraws in place.
+    sys.stdout.write("\x1b[H\x1b[J" + "\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+async def watch(swerve_drive, rate_hz: float, duration: float, as_json: bool) -> None:
+    """
+    Queries every servo at rate_hz and prints the table (or a JSON line) after every cycle.
+    """
+    period = 1.0 / rate_hz
+    start = time.monotonic()
+    next_time = start
+    last_time = start
+    rate = 0.0
+    while duration <= 0.0 or time.monotonic() - start < duration:
+        await swerve_drive.refresh_telemetry(force=True)
+        now = time.monotonic()
+        rate = 0.9 * rate + 0.1 / max(now - last_time, 1e-6)
+        last_time = now
+        if as_json:
+            print_json({"time": now - start, "motors": motor_rows(swerve_drive)})
+        else:
+            counters = swerve_drive.fault_manager.stats()["counters"]
+            print_table(motor_rows(swerve_drive), rate, {name: count for name, count in counters.items() if count})
+        next_time += period
+        await asyncio.sleep(max(0.0, next_time - time.monotonic()))
+
+
+def print_latency(latency: dict) -> None:
+    print(f"{'bus':<5}{'servos':<18}{'replies':>14}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for bus, stats in latency.items():
+        servos = ",".join(str(servo) for servo in stats["servos"]) if bus != "all" else f"{len(stats['servos'])} servos"
+        print(f"{bus:<5}{servos:<18}{stats['replies']:>7}/{stats['expected']:<6}{stats['mean'] * 1000.0:>10.2f}"
+              f"{stats['p50'] * 1000.0:>10.2f}{stats['p99'] * 1000.0:>10.2f}{stats['max'] * 1000.0:>10.2f}")
+
+
+def print_report(report: dict) -> None:
+    for name, module in report.items():
+        print(f"{name:<13}{'PASS' if module['passed'] else 'FAIL'}")
+        for check, result in module.items():
+            if check == "passed":
+                continue
+            print(f"    {check:<12}{'ok' if result['passed'] else 'failed'}")
+            for problem in result["problems"]:
+                print(f"        {problem}")
+
+
+async def run(args, profile: RobotProfile) -> int:
+    from Swerve.SwerveDrive import SwerveDrive
+    from Utils.ScriptedController import ScriptedController
+
+    transport = None
+    if args.sim:
+        from Swerve.SimTransport import SimTransport
+        transport = SimTransport.from_profile(profile)
+    swerve_drive = SwerveDrive(transport=transport, controller=ScriptedController(lambda t: (0.0, 0.0, 0.0)), profile=profile,
+                               steer_offset_path=None if args.sim else Constants.STEER_OFFSET_PATH,
+                               feedforward_path=None if args.sim else Constants.FEEDFORWARD_PATH)
+    await swerve_drive.initialize_modules()
+
+    try:
+        if args.command == "watch":
+            await watch(swerve_drive, args.rate, args.duration, args.json)
+            return 0
+
+        if args.command == "latency":
+            latency = await measure_bus_latency(swerve_drive, args.cycles)
+            if args.json:
+                print_json({"latency": latency})
+            else:
+                print_latency(latency)
+            return 0
+
+        report = await run_health_checks(swerve_drive, motion=not args.no_motion, rate_hz=args.rate)
+        latency = await measure_bus_latency(swerve_drive, args.cycles)
+        passed = all(module["passed"] for module in report.values())
+        if args.json:
+            servos = {servo_id: {_register_name(register): value for register, value in values.items()}
+                      for servo_id, values in swerve_drive.servo_info.items()}
+            print_json({"passed": passed, "profile": profile.name, "servos": servos,
+                        "modules": report, "latency": latency})
+        else:
+            print_report(report)
+            print()
+            print_latency(latency)
+        return 0 if passed else 1
+    finally:
+        await swerve_drive.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pit diagnostics of the swerve drive.")
+    parser.add_argument("command", nargs="?", default="watch", choices=["watch", "check", "latency"])
+    parser.add_argument("--profile", help="Robot profile, the values in Utils/Constants.py if not given")
+    parser.add_argument("--sim", action="store_true", help="Use the simulated transport instead of the Pi3Hat")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of tables (one line per refresh with watch)")
+    parser.add_argument("--rate", type=float, default=Constants.DIAG_RATE_HZ, help="Query rate of watch and the health checks, in Hz")
+    parser.add_argument("--duration", type=float, default=0.0, help="With watch, stop after this many seconds (0 runs until Ctrl+C)")
+    parser.add_argument("--cycles", type=int, default=Constants.DIAG_LATENCY_CYCLES, help="Query cycles per bus for the latency measurement")
+    parser.add_argument("--no-motion", action="store_true", help="With check, only run the checks that do not move the wheels")
+    args = parser.parse_args()
+
+    profile = load_profile(args.profile) if args.profile else RobotProfile.default()
+    try:
+        sys.exit(asyncio.run(run(args, profile)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import json
+import socket
+import time
+import Utils.Constants as Constants
+
+"""
+Attaches to a running main.py and prints the timing of every stage of the drive loop.
+
+Profiling is off until it is enabled, so the usual session is:
+    python swerve_metrics.py enable
+    python swerve_metrics.py show --watch 1
+    python swerve_metrics.py disable
+
+Commands:
+    show     print the percentiles of every stage (the default)
+    enable   start recording spans
+    disable  stop recording spans (near zero overhead)
+    reset    clear the recorded spans
+"""
+
+
+def request(command: str, host: str, port: int, timeout: float) -> dict:
+    """
+    Sends one command to the MetricsServer of the robot and waits for its reply.
+
+    :raises TimeoutError: If the robot does not answer within timeout seconds.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(command.encode(), (host, port))
+        try:
+            data, _ = sock.recvfrom(65536)
+        except socket.timeout:
+            raise TimeoutError(f"No reply from {host}:{port}, is main.py running?") from None
+    return json.loads(data)
+
+
+def print_summary(summary: dict) -> None:
+    print(f"profiling {'enabled' if summary['enabled'] else 'disabled'}")
+    print(f"{'stage':<20}{'count':>10}{'mean us':>10}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'max us':>10}")
+    for stage, stats in summary["stages"].items():
+        print(f"{stage:<20}{stats['count']:>10}{stats['mean_us']:>10.1f}{stats['p50_us']:>10.1f}"
+              f"{stats['p90_us']:>10.1f}{stats['p99_us']:>10.1f}{stats['max_us']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print per-stage drive loop timings of a running robot.")
+    parser.add_argument("command", nargs="?", default="show", choices=["show", "enable", "disable", "reset"])
+    parser.add_argument("--host", default=Constants.METRICS_HOST, help="Address of the robot")
+    parser.add_argument("--port", type=int, default=Constants.METRICS_PORT, help="UDP port of the robot's metrics server")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Seconds to wait for a reply")
+    parser.add_argument("--watch", type=float, default=0.0, help="With show, print again every this many seconds")
+    args = parser.parse_args()
+
+    command = "get" if args.command == "show" else args.command
+    while True:
+        summary = request(command, args.host, args.port, args.timeout)
+        print_summary(summary)
+        if args.command != "show" or args.watch <= 0.0:
+            break
+        time.sleep(args.watch)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+from types import SimpleNamespace
+import pytest
+from Swerve.FaultManager import FaultManager, HEALTHY, RETRYING, DEGRADED, TIMEOUT
+
+"""
+The module state machine of the fault manager (Swerve/FaultManager.py): retries, degradation, escalation and recovery.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+RETRY_BUDGET = 3
+WINDOW_TICKS = 50
+ESCALATION_TICKS = 25
+RECOVERY_TICKS = 25
+
+
+def make_module(steer_id: int, drive_id: int):
+    return SimpleNamespace(steer=SimpleNamespace(motor=SimpleNamespace(id=steer_id)),
+                           drive=SimpleNamespace(motor=SimpleNamespace(id=drive_id)))
+
+
+MODULES = [make_module(12, 11), make_module(14, 13)]
+COMMANDED_IDS = {11, 12, 13, 14}
+CLEAN_REPLY = SimpleNamespace(values={})
+
+
+def tick(manager: FaultManager, module_0_fault: bool) -> None:
+    """
+    One transport cycle: module 1 always replies cleanly, module 0 times out if module_0_fault.
+    """
+    results_by_id = {motor_id: CLEAN_REPLY for motor_id in COMMANDED_IDS}
+    if module_0_fault:
+        del results_by_id[11], results_by_id[12]
+    manager.check_cycle(MODULES, results_by_id, COMMANDED_IDS)
+
+
+@pytest.fixture
+def manager():
+    return FaultManager(len(MODULES), retry_budget=RETRY_BUDGET, window_ticks=WINDOW_TICKS,
+                        escalation_ticks=ESCALATION_TICKS, recovery_ticks=RECOVERY_TICKS)
+
+
+def test_transient_fault_is_retried(manager):
+    for _ in range(RETRY_BUDGET):
+        tick(manager, True)
+        assert manager.states[0] == RETRYING
+        assert manager.should_command(0)
+    tick(manager, False)
+    assert manager.states == [HEALTHY, HEALTHY]
+    assert manager.last_faults[0] == TIMEOUT
+    assert manager.counters["retries"] == RETRY_BUDGET
+    assert manager.counters["degradations"] == 0
+
+
+def test_persistent_fault_degrades_then_escalates(manager):
+    for _ in range(RETRY_BUDGET):
+        tick(manager, True)
+    tick(manager, True)
+    assert manager.states == [DEGRADED, HEALTHY]
+    assert not manager.should_command(0)
+    assert manager.should_command(1)
+
+    for _ in range(ESCALATION_TICKS):
+        tick(manager, True)
+    assert not manager.escalated
+    tick(manager, True)
+    assert manager.escalated
+    assert not manager.should_command(1)
+    assert manager.counters["escalations"] == 1
+
+
+def test_escalation_clears_after_recovery(manager):
+    for _ in range(RETRY_BUDGET + ESCALATION_TICKS + 2):
+        tick(manager, True)
+    assert manager.escalated
+
+    for _ in range(RECOVERY_TICKS - 1):
+        tick(manager, False)
+    assert manager.states[0] == DEGRADED
+    assert manager.escalated
+    tick(manager, False)
+    assert manager.states == [HEALTHY, HEALTHY]
+    assert not manager.escalated
+    assert manager.should_command(0) and manager.should_command(1)
+
+
+def test_fault_while_degraded_restarts_recovery(manager):
+    for _ in range(RETRY_BUDGET + 1):
+        tick(manager, True)
+    for _ in range(RECOVERY_TICKS - 1):
+        tick(manager, False)
+    tick(manager, True)
+    assert manager.states[0] == DEGRADED
+    for _ in range(RECOVERY_TICKS - 1):
+        tick(manager, False)
+        assert manager.states[0] == DEGRADED
+    tick(manager, False)
+    assert manager.states[0] == HEALTHY
+
+
+def test_intermittent_fault_degrades_and_escalates(manager):
+    commanded_ticks = 0
+    for index in range(200):
+        tick(manager, index % 2 == 0)
+        commanded_ticks += manager.should_command(0)
+
+    # Degraded once the window holds more bad ticks than the retry budget, and never commanded again.
+    assert commanded_ticks == 2 * RETRY_BUDGET
+    assert manager.counters["degradations"] == 1
+    assert manager.escalated
+    assert manager.counters["escalations"] == 1
+
+
+def test_sparse_faults_stay_within_budget(manager):
+    for index in range(10 * WINDOW_TICKS):
+        tick(manager, index % (WINDOW_TICKS // RETRY_BUDGET + 1) == 0)
+        assert manager.should_command(0)
+    assert manager.counters["degradations"] == 0
+
+
+def test_recovery_gives_a_fresh_retry_budget(manager):
+    for _ in range(RETRY_BUDGET + 1):
+        tick(manager, True)
+    for _ in range(RECOVERY_TICKS):
+        tick(manager, False)
+    assert manager.states[0] == HEALTHY
+
+    for _ in range(RETRY_BUDGET):
+        tick(manager, True)
+    assert manager.states[0] == RETRYING
@@ -0,0 +1,77 @@
+import math
+import pytest
+from Swerve.HeadingController import HeadingController
+
+"""
+Heading hold (Swerve/HeadingController.py): capturing the target, wraparound at ±180 degrees and handing back to the driver.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+DT = 0.004
+TOLERANCE = 1e-9
+
+
+@pytest.fixture
+def controller():
+    return HeadingController(kp=4.0, ki=0.0, kd=0.0, max_omega=3.0, capture_rate=0.2)
+
+
+def test_driver_turning_passes_through(controller):
+    assert controller.hold(0.5, 2.0, 1.0, DT) == 2.0
+    assert controller.target is None
+
+
+def test_waits_for_the_chassis_to_stop_turning(controller):
+    assert controller.hold(0.0, 1.0, 1.0, DT) == 1.0
+    assert controller.target is None
+    assert controller.hold(0.0, 0.1, 1.2, DT) == pytest.approx(0.0, abs=TOLERANCE)
+    assert controller.target == 1.2
+
+
+def test_turns_back_to_the_target(controller):
+    controller.hold(0.0, 0.0, 0.5, DT)
+    assert controller.hold(0.0, 0.0, 0.6, DT) == pytest.approx(-0.4, abs=TOLERANCE)
+    assert controller.hold(0.0, 0.0, 0.4, DT) == pytest.approx(0.4, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize("target, yaw, expected", [
+    (math.radians(179.0), math.radians(-179.0), -math.radians(2.0)),  # past +180, turn back clockwise
+    (math.radians(-179.0), math.radians(179.0), math.radians(2.0)),
+    (math.radians(10.0), math.radians(10.0) + 4.0 * math.pi, 0.0),  # whole turns of raw yaw
+])
+def test_error_wraps_around(controller, target, yaw, expected):
+    controller.hold(0.0, 0.0, target, DT)
+    assert controller.hold(0.0, 0.0, yaw, DT) == pytest.approx(4.0 * expected, abs=1e-6)
+
+
+def test_correction_is_limited(controller):
+    controller.hold(0.0, 0.0, 0.0, DT)
+    assert controller.hold(0.0, 0.0, 2.0, DT) == -3.0
+    assert controller.hold(0.0, 0.0, -2.0, DT) == 3.0
+
+
+def test_derivative_wraps_around():
+    controller = HeadingController(kp=0.0, ki=0.0, kd=0.1, max_omega=10.0)
+    controller.hold(0.0, 0.0, math.radians(179.9), DT)
+    # Turning 0.2 degrees counterclockwise over +180 is a small rate, not a whole turn backwards.
+    rate = math.radians(0.2) / DT
+    assert controller.hold(0.0, 0.0, math.radians(-179.9), DT) == pytest.approx(-0.1 * rate, abs=1e-6)
+
+
+def test_integral_is_clamped():
+    controller = HeadingController(kp=0.0, ki=1.0, kd=0.0, max_omega=3.0)
+    controller.hold(0.0, 0.0, 0.0, DT)
+    for _ in range(10000):
+        omega = controller.hold(0.0, 0.0, -1.0, DT)
+    assert omega == 3.0
+    assert controller.integral == 3.0
+
+
+def test_turn_input_releases_the_target(controller):
+    controller.hold(0.0, 0.0, 0.5, DT)
+    assert controller.hold(0.3, 1.5, 0.6, DT) == 1.5
+    assert controller.target is None
+    controller.hold(0.0, 0.0, 2.0, DT)
+    assert controller.target == 2.0
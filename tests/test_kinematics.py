@@ -0,0 +1,109 @@
+import math
+import random
+import numpy as np
+import pytest
+import wpimath.kinematics
+from wpimath.geometry import Rotation2d
+import Utils.Constants as Constants
+from Swerve.SwerveKinematics import SwerveKinematics
+
+"""
+Parity of the fast kinematics (Swerve/SwerveKinematics.py) with wpimath's SwerveDrive4Kinematics.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+TRANSLATIONS = [Constants.FRONT_LEFT, Constants.FRONT_RIGHT, Constants.BACK_LEFT, Constants.BACK_RIGHT]
+TOLERANCE = 1e-9
+
+
+def angle_error(a: float, b: float) -> float:
+    return abs(math.remainder(a - b, 2.0 * math.pi))
+
+
+def reference_states(kinematics, vx, vy, omega, current_angles=None, max_speed=Constants.MAX_SPEED):
+    states = kinematics.toSwerveModuleStates(wpimath.kinematics.ChassisSpeeds(vx, vy, omega))
+    states = wpimath.kinematics.SwerveDrive4Kinematics.desaturateWheelSpeeds(states, max_speed)
+    if current_angles is not None:
+        for state, current_angle in zip(states, current_angles):
+            state.optimize(Rotation2d(current_angle))
+            state.cosineScale(Rotation2d(current_angle))
+    return [(state.speed, state.angle.radians()) for state in states]
+
+
+def assert_same(expected, speeds, angles):
+    for (expected_speed, expected_angle), speed, angle in zip(expected, speeds, angles):
+        assert speed == pytest.approx(expected_speed, abs=TOLERANCE)
+        # A module standing still may point either way.
+        if abs(expected_speed) > TOLERANCE:
+            assert angle_error(angle, expected_angle) < TOLERANCE
+
+
+@pytest.fixture
+def kinematics():
+    return wpimath.kinematics.SwerveDrive4Kinematics(*TRANSLATIONS), SwerveKinematics(TRANSLATIONS, Constants.MAX_SPEED)
+
+
+def test_random_speeds_optimized(kinematics):
+    reference, fast = kinematics
+    rng = random.Random(0)
+    for _ in range(2000):
+        vx, vy, omega = rng.uniform(-6.0, 6.0), rng.uniform(-6.0, 6.0), rng.uniform(-10.0, 10.0)
+        current = [rng.uniform(-math.pi, math.pi) for _ in range(4)]
+        speeds, angles = fast.to_module_states(vx, vy, omega, current)
+        assert_same(reference_states(reference, vx, vy, omega, current), speeds, angles)
+
+
+def test_random_speeds_not_optimized(kinematics):
+    reference, fast = kinematics
+    rng = random.Random(1)
+    for _ in range(2000):
+        vx, vy, omega = rng.uniform(-3.0, 3.0), rng.uniform(-3.0, 3.0), rng.uniform(-5.0, 5.0)
+        speeds, angles = fast.to_module_states(vx, vy, omega)
+        assert_same(reference_states(reference, vx, vy, omega), speeds, angles)
+
+
+@pytest.mark.parametrize("vx, vy, omega", [
+    (10.0, 0.0, 0.0),  # translation alone over the top speed
+    (0.0, 0.0, 30.0),  # rotation alone over the top speed
+    (4.0, -3.0, 12.0),  # both, the outer modules saturate first
+    (-20.0, 20.0, -50.0),
+])
+def test_desaturation(kinematics, vx, vy, omega):
+    reference, fast = kinematics
+    speeds, angles = fast.to_module_states(vx, vy, omega)
+    assert max(abs(speed) for speed in speeds) == pytest.approx(Constants.MAX_SPEED, abs=TOLERANCE)
+    assert_same(reference_states(reference, vx, vy, omega), speeds, angles)
+
+
+def test_stand_still_keeps_angles(kinematics):
+    reference, fast = kinematics
+    reference_states(reference, 1.0, 1.0, 2.0)
+    fast.to_module_states(1.0, 1.0, 2.0)
+
+    expected = reference.toSwerveModuleStates(wpimath.kinematics.ChassisSpeeds(0.0, 0.0, 0.0))
+    speeds, angles = fast.to_module_states(0.0, 0.0, 0.0)
+    for state, speed, angle in zip(expected, speeds, angles):
+        assert speed == 0.0
+        assert angle_error(angle, state.angle.radians()) < TOLERANCE
+
+
+def test_discretize(kinematics):
+    _, fast = kinematics
+    rng = random.Random(2)
+    for _ in range(500):
+        vx, vy, omega = rng.uniform(-5.0, 5.0), rng.uniform(-5.0, 5.0), rng.uniform(-10.0, 10.0)
+        expected = wpimath.kinematics.ChassisSpeeds.discretize(wpimath.kinematics.ChassisSpeeds(vx, vy, omega), Constants.LOOP_PERIOD)
+        assert fast.discretize(vx, vy, omega, Constants.LOOP_PERIOD) == pytest.approx((expected.vx, expected.vy, expected.omega), abs=TOLERANCE)
+
+
+def test_batch_matches_per_tick(kinematics):
+    _, fast = kinematics
+    rng = np.random.default_rng(3)
+    samples = rng.uniform(-8.0, 8.0, size=(500, 3))
+    batch_speeds, batch_angles = fast.to_module_states_batch(samples)
+    for (vx, vy, omega), expected_speeds, expected_angles in zip(samples, batch_speeds, batch_angles):
+        speeds, angles = fast.to_module_states(vx, vy, omega)
+        assert speeds == pytest.approx(expected_speeds.tolist(), abs=TOLERANCE)
+        assert angles == pytest.approx(expected_angles.tolist(), abs=TOLERANCE)
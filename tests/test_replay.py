@@ -0,0 +1,102 @@
+import asyncio
+import math
+import pickle
+import pytest
+import Utils.Constants as Constants
+from Swerve.Replay import ReplayLog, ReplayMismatch, ReplayRecorder, RecordingController, RecordingTransport, TickClock, default_tick, replay
+from Swerve.SimTransport import SimTransport
+from Swerve.SwerveDrive import SwerveDrive
+from Swerve.Trajectory import PathThenTeleop, generate_table, load_path
+from Utils.RobotProfile import RobotProfile
+from Utils.ScriptedController import ScriptedController
+
+"""
+Record and replay round trips (Swerve/Replay.py) on the simulated transport: a recorded run replays
+command for command, with and without a path, and a run driven differently does not.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+DT = Constants.LOOP_PERIOD
+PATH_START_TICK = 5  # the tick the trajectory is ready on, as if it was generated in the background
+
+
+def joystick(t: float) -> tuple:
+    return 0.5 * math.sin(t), 0.3, 0.2 * math.cos(2.0 * t)
+
+
+def short_path(tmp_path) -> dict:
+    path_file = tmp_path / "short.json"
+    path_file.write_text('{"waypoints": [{"x": 0.0, "y": 0.0, "tangent": 0.0, "heading": 0.0},'
+                         ' {"x": 0.5, "y": 0.25, "tangent": 0.0, "heading": 30.0}],'
+                         ' "constraints": {"max_velocity": 1.0, "max_acceleration": 2.0}}')
+    return load_path(str(path_file))
+
+
+async def record(log_path: str, ticks: int, table=None) -> None:
+    """
+    Records a run the way main.py --record does, on the simulated transport.
+    """
+    profile = RobotProfile.default()
+    clock = TickClock(100.0)
+    recorder = ReplayRecorder(log_path)
+    swerve_drive = SwerveDrive(transport=RecordingTransport(SimTransport.from_profile(profile, clock=clock), recorder),
+                               controller=RecordingController(ScriptedController(joystick, clock=clock), recorder),
+                               profile=profile, steer_offset_path=None, feedforward_path=None, clock=clock)
+    drive_tick = PathThenTeleop(swerve_drive, has_path=table is not None)
+    await swerve_drive.initialize_modules()
+    recorder.record_drive(swerve_drive, has_path=table is not None)
+    for index in range(ticks):
+        clock.set(clock() + DT)
+        recorder.record_tick(clock(), DT)
+        if table is not None and index == PATH_START_TICK:
+            recorder.record_path(table)
+            drive_tick.start(table)
+        await drive_tick.tick(DT)
+    recorder.close()
+
+
+def test_joystick_run_replays(tmp_path):
+    log_path = str(tmp_path / "joystick.replay")
+    asyncio.run(record(log_path, 300))
+    assert asyncio.run(replay(log_path)) == 300
+    assert asyncio.run(replay(log_path, tick=default_tick)) == 300
+
+
+def test_path_run_replays(tmp_path):
+    table = generate_table(short_path(tmp_path), DT)
+    ticks = PATH_START_TICK + int(table.duration / DT) + 100  # through the handover to the joystick
+    log_path = str(tmp_path / "path.replay")
+    asyncio.run(record(log_path, ticks, table))
+
+    log = ReplayLog(log_path)
+    assert log.has_path()
+    assert list(log.paths) == [PATH_START_TICK]
+    assert asyncio.run(replay(log_path)) == ticks
+
+
+def test_path_run_does_not_replay_as_joystick_run(tmp_path):
+    table = generate_table(short_path(tmp_path), DT)
+    log_path = str(tmp_path / "path.replay")
+    asyncio.run(record(log_path, 50, table))
+    with pytest.raises(ReplayMismatch, match="tick 0"):
+        asyncio.run(replay(log_path, tick=default_tick))
+
+
+def test_cut_off_log_drops_its_last_tick(tmp_path):
+    log_path = str(tmp_path / "joystick.replay")
+    asyncio.run(record(log_path, 100))
+    # Everything up to the end event, as if the robot lost power before the recorder was closed.
+    with open(log_path, "rb") as file:
+        events = []
+        while True:
+            try:
+                events.append(pickle.load(file))
+            except EOFError:
+                break
+    assert events[-1] == ("end",)
+    with open(log_path, "wb") as file:
+        for event in events[:-2]:
+            file.write(pickle.dumps(event, pickle.HIGHEST_PROTOCOL))
+    assert asyncio.run(replay(log_path)) == 99
@@ -0,0 +1,98 @@
+import math
+import pytest
+from Swerve.SetpointGenerator import ChassisSetpointGenerator
+
+"""
+Acceleration and jerk limits of the chassis setpoint generator (Swerve/SetpointGenerator.py).
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+MAX_ACCEL = 4.0
+MAX_JERK = 40.0
+MAX_ANGULAR_ACCEL = 12.0
+MAX_ANGULAR_JERK = 120.0
+DT = 0.004
+TOLERANCE = 1e-9
+
+
+def run(generator: ChassisSetpointGenerator, vx: float, vy: float, omega: float, ticks: int) -> list:
+    setpoints = [(generator.vx, generator.vy, generator.omega)]
+    for _ in range(ticks):
+        generator.update(vx, vy, omega, DT)
+        setpoints.append((generator.vx, generator.vy, generator.omega))
+    return setpoints
+
+
+def differences(values: list) -> list:
+    return [(b - a) / DT for a, b in zip(values, values[1:])]
+
+
+@pytest.fixture
+def generator():
+    return ChassisSetpointGenerator(MAX_ACCEL, MAX_JERK, MAX_ANGULAR_ACCEL, MAX_ANGULAR_JERK)
+
+
+@pytest.mark.parametrize("vx, vy", [(3.0, 0.0), (-2.0, 0.0), (1.5, -2.5), (0.0, 0.2)])
+def test_translation_limits(generator, vx, vy):
+    setpoints = run(generator, vx, vy, 0.0, 2000)
+    speeds = [math.hypot(x, y) for x, y, _ in setpoints]
+    accels = [math.hypot(ax, ay) for ax, ay in zip(differences([x for x, _, _ in setpoints]), differences([y for _, y, _ in setpoints]))]
+    assert max(accels) <= MAX_ACCEL + TOLERANCE
+    assert max(abs(change) for change in differences(accels)) <= MAX_JERK + TOLERANCE
+    # Settles exactly on the target, without overshooting it.
+    assert (generator.vx, generator.vy) == (vx, vy)
+    assert max(speeds) <= math.hypot(vx, vy) + TOLERANCE
+
+
+def test_diagonal_ramps_along_its_direction(generator):
+    for vx, vy, _ in run(generator, 3.0, -1.5, 0.0, 500)[1:]:
+        assert vy / vx == pytest.approx(-0.5, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize("omega", [6.0, -4.0, 0.1])
+def test_rotation_limits(generator, omega):
+    setpoints = run(generator, 0.0, 0.0, omega, 2000)
+    accels = differences([turn for _, _, turn in setpoints])
+    assert max(abs(accel) for accel in accels) <= MAX_ANGULAR_ACCEL + TOLERANCE
+    assert max(abs(change) for change in differences(accels)) <= MAX_ANGULAR_JERK + TOLERANCE
+    assert generator.omega == omega
+    assert max(abs(turn) for _, _, turn in setpoints) <= abs(omega) + TOLERANCE
+
+
+def test_reversal_is_limited(generator):
+    run(generator, 3.0, 0.0, 0.0, 2000)
+    setpoints = run(generator, -3.0, 0.0, 0.0, 2000)
+    accels = differences([x for x, _, _ in setpoints])
+    assert max(abs(accel) for accel in accels) <= MAX_ACCEL + TOLERANCE
+    assert max(abs(change) for change in differences(accels)) <= MAX_JERK + TOLERANCE
+    assert generator.vx == -3.0
+
+
+def test_reaches_full_acceleration(generator):
+    # The time to reach 3 m/s at 4 m/s² with a 40 m/s³ ramp in and out is 3 / 4 + 4 / 40 = 0.85 s.
+    setpoints = run(generator, 3.0, 0.0, 0.0, int(0.85 / DT) + 10)
+    assert max(differences([x for x, _, _ in setpoints])) == pytest.approx(MAX_ACCEL)
+    assert generator.vx == 3.0
+
+
+def test_no_jerk_limit(generator):
+    generator = ChassisSetpointGenerator(MAX_ACCEL, math.inf, MAX_ANGULAR_ACCEL, math.inf)
+    generator.update(3.0, 0.0, 6.0, DT)
+    assert generator.vx == pytest.approx(MAX_ACCEL * DT)
+    assert generator.omega == pytest.approx(MAX_ANGULAR_ACCEL * DT)
+
+
+def test_zero_dt_does_nothing(generator):
+    generator.update(3.0, 1.0, 2.0, 0.0)
+    assert (generator.vx, generator.vy, generator.omega) == (0.0, 0.0, 0.0)
+
+
+def test_reset_starts_from_the_given_speeds(generator):
+    run(generator, 3.0, 0.0, 2.0, 100)
+    generator.reset(1.0, -1.0, 0.5)
+    assert (generator.vx, generator.vy, generator.omega) == (1.0, -1.0, 0.5)
+    assert (generator.ax, generator.ay, generator.alpha) == (0.0, 0.0, 0.0)
+    generator.update(1.0, -1.0, 0.5, DT)
+    assert (generator.vx, generator.vy, generator.omega) == (1.0, -1.0, 0.5)
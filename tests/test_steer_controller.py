@@ -0,0 +1,115 @@
+import math
+import random
+import pytest
+from Swerve.SteerController import SteerController, load_steer_offsets, save_steer_offsets
+
+"""
+Position unwrapping and nearest-target steering of the steer controller (Swerve/SteerController.py).
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+TOLERANCE = 1e-9
+
+
+def degrees(angle: float) -> float:
+    return math.radians(angle)
+
+
+def test_unwraps_a_wrapping_position():
+    controller = SteerController()
+    for raw_position in (0.4, 0.48, -0.47, -0.4):
+        controller.update(raw_position)
+    # Forwards over the wrap at 0.5...
+    assert controller.position == pytest.approx(0.6, abs=TOLERANCE)
+    for raw_position in (-0.47, 0.45):
+        controller.update(raw_position)
+    # ...and back again.
+    assert controller.position == pytest.approx(0.45, abs=TOLERANCE)
+
+
+def test_ignores_whole_turn_jumps_and_nan():
+    controller = SteerController()
+    controller.update(0.25)
+    controller.update(3.25)
+    controller.update(math.nan)
+    controller.update(-1.7)
+    assert controller.position == pytest.approx(0.3, abs=TOLERANCE)
+    assert controller.raw_position == -1.7
+
+
+@pytest.mark.parametrize("offset", [0.0, 0.3, -0.45])
+def test_angle_is_relative_to_the_offset(offset):
+    controller = SteerController(offset)
+    controller.update(offset + 0.25)
+    assert controller.angle() == pytest.approx(math.pi / 2.0, abs=TOLERANCE)
+    controller.update(offset + 0.5)
+    assert abs(controller.angle()) == pytest.approx(math.pi, abs=TOLERANCE)
+
+
+def test_first_target_is_nearest_to_the_measured_position():
+    controller = SteerController(0.1)
+    controller.update(5.1)
+    assert controller.target_for(degrees(90.0)) == pytest.approx(5.35, abs=TOLERANCE)
+
+
+def test_first_target_without_telemetry_is_nearest_to_the_offset():
+    controller = SteerController(0.1)
+    assert controller.target_for(degrees(-90.0)) == pytest.approx(-0.15, abs=TOLERANCE)
+
+
+def test_crossing_180_degrees_takes_the_short_way():
+    controller = SteerController()
+    controller.update(0.0)
+    first = controller.target_for(degrees(179.0))
+    second = controller.target_for(degrees(-179.0))
+    assert second - first == pytest.approx(2.0 / 360.0, abs=TOLERANCE)
+    third = controller.target_for(degrees(179.0))
+    assert third == pytest.approx(first, abs=TOLERANCE)
+
+
+def test_targets_never_move_more_than_half_a_turn():
+    controller = SteerController(0.2)
+    controller.update(0.2)
+    rng = random.Random(0)
+    last = controller.target_for(0.0)
+    for _ in range(2000):
+        angle = rng.uniform(-math.pi, math.pi)
+        target = controller.target_for(angle)
+        assert abs(target - last) <= 0.5 + TOLERANCE
+        assert math.remainder((target - controller.offset) * 2.0 * math.pi - angle, 2.0 * math.pi) == pytest.approx(0.0, abs=TOLERANCE)
+        last = target
+
+
+def test_same_angle_gives_the_same_target():
+    controller = SteerController()
+    controller.update(2.6)
+    target = controller.target_for(1.0)
+    controller.update(2.61)
+    assert controller.target_for(1.0) == target
+
+
+def test_reset_target_starts_again_from_the_measured_position():
+    controller = SteerController()
+    controller.update(0.0)
+    controller.target_for(degrees(170.0))
+    controller.update(-3.0)
+    controller.reset_target()
+    assert controller.target_for(0.0) == pytest.approx(-3.0, abs=TOLERANCE)
+
+
+def test_calibrate():
+    controller = SteerController(0.2)
+    controller.update(2.7)
+    controller.target_for(1.0)
+    assert controller.calibrate() == pytest.approx(-0.3, abs=TOLERANCE)
+    assert controller.angle() == pytest.approx(0.0, abs=TOLERANCE)
+    assert math.isnan(controller.target)
+
+
+def test_offsets_round_trip(tmp_path):
+    path = str(tmp_path / "calibration" / "steer_offsets.json")
+    assert load_steer_offsets(path) == {}
+    save_steer_offsets(path, {16: -0.25, 12: 0.125})
+    assert load_steer_offsets(path) == {12: 0.125, 16: -0.25}